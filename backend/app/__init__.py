@@ -1,36 +1,96 @@
 from flask import Flask, jsonify
 from flask_cors import CORS
+from sqlalchemy.engine import make_url
+from urllib.parse import urlsplit
 from .config import Config
-from .extensions import db, jwt, bcrypt
+from .extensions import db, jwt, cache, hasher, metrics, compression, health, media, jobs, revocations
+from .database import configure_database, collect_metrics as collect_database_metrics
 from .routes.auth_routes import auth_bp
 from .routes.post_routes import post_bp
+from .routes.media_routes import image_bp, media_bp
+from .json_provider import configure_json
+from .logging_config import configure_logging, collect_metrics as collect_logging_metrics
 import logging
+import os
+import weakref
 
-# Configure logging
-logging.basicConfig(level=logging.INFO, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def create_app():
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+# Function to set up Flask-Migrate and the `flask db` commands
+# Alembic takes a noticeable share of the import time, so it is only loaded
+# by the flask CLI and by scripts that run migrations
+def init_migrate(app):
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        Migrate(app, db, directory=MIGRATIONS_DIR)
+    return app.extensions['migrate']
+
+
+# Function to make the app safe to use in a forked worker
+# Pre-fork servers (gunicorn with preload_app, uWSGI without lazy-apps) create
+# the app once and fork it; pooled connections opened before the fork would be
+# shared by every worker. The child drops them without closing them, so the
+# parent's connections stay usable, and opens its own on first use.
+def _register_fork_handler(app):
+    app_ref = weakref.ref(app)
+
+    def after_fork_in_child():
+        forked_app = app_ref()
+        if forked_app is None:
+            return
+        with forked_app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+    os.register_at_fork(after_in_child=after_fork_in_child)
+
+
+def create_app(config_class=Config):
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    configure_json(app)
+
+    # Send all logging through the non-blocking queue (see app/logging_config.py)
+    configure_logging(app)
+    logger.debug("Using database %s", make_url(app.config['SQLALCHEMY_DATABASE_URI']).render_as_string(hide_password=True))
+    logger.debug("JWT access tokens expire after %s", app.config.get('JWT_ACCESS_TOKEN_EXPIRES'))
 
     # Initialize extensions
+    configure_database(app)
     db.init_app(app)
     jwt.init_app(app)
-    bcrypt.init_app(app)
+    revocations.init_app(app)
+    cache.init_app(app)
+    hasher.init_app(app)
+    # Also adds the `flask jobs` commands that run the workers
+    jobs.init_app(app)
+    media.init_app(app)
+    metrics.init_app(app)
+    # After metrics, so its hook runs first and the recorded sizes are the compressed ones
+    compression.init_app(app)
+    # /health, /health/live and /health/ready, answered from a background prober (see app/health.py)
+    health.init_app(app)
+    _register_fork_handler(app)
+
+    # The `flask db` commands only exist when running under the flask CLI
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        init_migrate(app)
 
     # Enable CORS
     CORS(app)
 
-    # Create database tables if they don't exist
-    with app.app_context():
-        try:
-            db.create_all()
-            logger.info("Database tables created successfully")
-        except Exception as e:
-            logger.error(f"Error creating database tables: {e}")
-            logger.info("Continuing with application startup despite database error")
+    # The schema is not created on startup: booting workers must not run DDL
+    # or wait for the database. Run `flask --app main db upgrade` (or
+    # `flask --app main init-db` for a scratch database) before starting them
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the tables and search objects that do not exist yet."""
+        from .schema import create_schema
+        create_schema()
+        logger.info("Database tables created successfully")
 
     # Register error handlers
     @app.errorhandler(404)
@@ -43,25 +103,33 @@ def create_app():
 
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_payload):
-        print(f"DEBUG - Token expired. Header: {jwt_header}, Payload: {jwt_payload}")
-        logger.error(f"Token expired. Payload: {jwt_payload}")
+        logger.info("Token expired for user ID: %s", jwt_payload.get('sub'))
         return jsonify({'error': 'Token has expired', 'details': jwt_payload}), 401
 
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
-        print(f"DEBUG - Invalid token error: {error}")
-        logger.error(f"Invalid token error: {error}")
+        logger.warning("Invalid token error: %s", error)
         return jsonify({'error': f'Invalid token: {error}'}), 401
 
+    # Logged-out tokens; answered from memory (see app/revocation.py)
+    jwt.token_in_blocklist_loader(revocations.is_revoked)
+
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        logger.info("Revoked token used for user ID: %s", jwt_payload.get('sub'))
+        return jsonify({'error': 'Token has been revoked'}), 401
+
     @jwt.unauthorized_loader
     def missing_token_callback(error):
-        print(f"DEBUG - Missing token: {error}")
-        logger.error(f"Missing token: {error}")
+        logger.debug("Missing token: %s", error)
         return jsonify({'error': f'Authorization token is missing: {error}'}), 401
 
     # Register Blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(post_bp, url_prefix='/api/posts')
+    app.register_blueprint(image_bp, url_prefix='/api/images')
+    # Stored images are served at the path of MEDIA_URL, also when it points at a CDN
+    app.register_blueprint(media_bp, url_prefix=urlsplit(app.config.get('MEDIA_URL', '/media')).path.rstrip('/') or '/media')
 
     # Add a debug route to verify JWT tokens
     @app.route('/api/debug/verify-token', methods=['POST'])
@@ -102,22 +170,29 @@ def create_app():
             }
             return jsonify(error_info), 400
 
-    # Health check route
-    @app.route('/health', methods=['GET'])
-    def health_check():
-        try:
-            # Test database connection
-            with app.app_context():
-                from sqlalchemy import text
-                db.session.execute(text('SELECT 1'))
-                db.session.commit()
-            db_status = "connected"
-        except Exception as e:
-            db_status = f"error: {str(e)}"
-        
-        return jsonify({
-            'status': 'ok',
-            'database': db_status
-        }), 200
+    # Cache counters, used to size the cache
+    @app.route('/api/debug/cache-stats', methods=['GET'])
+    def cache_stats():
+        return jsonify(cache.stats()), 200
+
+    # Password hashing queue depth and latency
+    @app.route('/api/debug/hashing-stats', methods=['GET'])
+    def hashing_stats():
+        return jsonify(hasher.stats.as_dict()), 200
+
+    # Create the metric series for every route up front, and report the cache,
+    # compression, password hashing, image, job queue, token revocation,
+    # logging, database health and replica counters alongside them
+    metrics.register_endpoints(app)
+    metrics.add_collector(cache.collect_metrics)
+    metrics.add_collector(compression.collect_metrics)
+    metrics.add_collector(hasher.collect_metrics)
+    metrics.add_collector(media.collect_metrics)
+    metrics.add_collector(jobs.collect_metrics)
+    metrics.add_collector(revocations.collect_metrics)
+    metrics.add_collector(collect_logging_metrics)
+    metrics.add_collector(health.collect_metrics)
+    if app.extensions['replicas']:
+        metrics.add_collector(collect_database_metrics)
 
     return app
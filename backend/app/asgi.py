@@ -0,0 +1,200 @@
+# Async serving path for the read endpoints
+# create_asgi_app wraps the Flask app in an ASGI application for uvicorn or
+# hypercorn (see asgi.py in the backend directory). GET requests for the
+# endpoints in ASYNC_VIEWS are answered on the event loop: their database
+# reads go through SQLAlchemy's AsyncSession on an async driver, so a process
+# can have many of them waiting on PostgreSQL at once. Every other request is
+# passed unchanged to the Flask app through asgiref's WsgiToAsgi, which runs it
+# in a thread.
+#
+# The async views run inside a normal Flask request context, with the app's
+# before/after request hooks, error handlers and JSON provider, and share the
+# statement builders, serializers and cache entries of the sync services, so
+# both paths return the same responses.
+#
+# Needs asgiref and an async driver: asyncpg for PostgreSQL, aiosqlite for
+# SQLite (pip install asgiref asyncpg). ASYNC_DATABASE_URL overrides the URL
+# derived from SQLALCHEMY_DATABASE_URI.
+
+import io
+import logging
+import sys
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from werkzeug.exceptions import HTTPException
+from .database import engine_options, request_replica
+from .extensions import cache, db
+from .routes.auth_routes import async_views as auth_async_views
+from .routes.post_routes import async_views as post_async_views
+
+logger = logging.getLogger(__name__)
+
+ASYNC_VIEWS = {**post_async_views, **auth_async_views}
+
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+# Function to point a database URL at the async driver for its database
+def async_url(url):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver configured for {backend}; set ASYNC_DATABASE_URL")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+
+# Function to translate the engine options for asyncpg, which takes its
+# timeouts as `timeout` and server settings instead of libpq options
+def async_engine_options(config, url):
+    options = engine_options(config, url)
+    connect_args = options.pop('connect_args', {})
+    if make_url(url).get_backend_name() == 'postgresql':
+        asyncpg_args = {'timeout': connect_args.get('connect_timeout', 10)}
+        statement_timeout = config.get('DB_STATEMENT_TIMEOUT', 0)
+        if statement_timeout and not config.get('DB_PGBOUNCER'):
+            asyncpg_args['server_settings'] = {'statement_timeout': str(int(statement_timeout))}
+        if config.get('DB_PGBOUNCER'):
+            # PgBouncer in transaction mode cannot keep prepared statements
+            asyncpg_args['statement_cache_size'] = 0
+        options['connect_args'] = asyncpg_args
+    return options
+
+
+def _environ(scope):
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            value = f'{environ[name]},{value}'
+        environ[name] = value
+    return environ
+
+
+class AsyncReadApp:
+    def __init__(self, app):
+        try:
+            from asgiref.wsgi import WsgiToAsgi
+        except ImportError:
+            raise RuntimeError("The async serving path requires the asgiref package (pip install asgiref)")
+
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.replicas = app.extensions.get('replicas') or []
+
+        config = app.config
+        with app.app_context():
+            # The sync engines' URLs, with relative SQLite paths already resolved
+            urls = {key: db.engines[key].url for key in [None, *self.replicas]}
+        if config.get('ASYNC_DATABASE_URL'):
+            urls[None] = make_url(config['ASYNC_DATABASE_URL'])
+        self.engines = {
+            key: create_async_engine(async_url(url), **async_engine_options(config, url))
+            for key, url in urls.items()
+        }
+        self.sessions = {
+            key: async_sessionmaker(engine, expire_on_commit=False)
+            for key, engine in self.engines.items()
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http' or scope['method'] != 'GET':
+            return await self.wsgi(scope, receive, send)
+
+        environ = _environ(scope)
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            endpoint = None
+        view = ASYNC_VIEWS.get(endpoint)
+        if view is None:
+            return await self.wsgi(scope, receive, send)
+        revocations = self.app.extensions.get('revocations')
+        if revocations is not None and not revocations.ready():
+            # Revoked tokens are not in memory yet, so checking one may wait on
+            # the database; the sync path can block its own thread for that
+            return await self.wsgi(scope, receive, send)
+
+        response = await self._dispatch(environ, view)
+        try:
+            # The same header fixes and body handling (304, HEAD) as under WSGI
+            headers = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                       for name, value in response.get_wsgi_headers(environ).items()]
+            await send({'type': 'http.response.start', 'status': response.status_code, 'headers': headers})
+            for chunk in response.get_app_iter(environ):
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            response.close()
+
+    # Function to run an async view the way Flask runs a sync one: request
+    # hooks, error handlers and teardown included
+    async def _dispatch(self, environ, view):
+        from flask import request
+
+        app = self.app
+        ctx = app.request_context(environ)
+        error = None
+        ctx.push()
+        try:
+            try:
+                rv = app.preprocess_request()
+                if rv is None:
+                    # Stickiness is looked up in the cache, off the event loop if it is Redis
+                    key = await cache.call_async(request_replica, self.replicas) if self.replicas else None
+                    async with self.sessions[key]() as session:
+                        rv = await view(session, **request.view_args)
+            except Exception as e:
+                rv = app.handle_user_exception(e)
+            # The after_request hooks are sync code (the compressed-body cache
+            # does a get and a set); with a shared cache they run in a thread
+            return await cache.call_async(app.finalize_request, rv)
+        except Exception as e:
+            error = e
+            return app.handle_exception(e)
+        finally:
+            ctx.pop(error)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                revocations = self.app.extensions.get('revocations')
+                if revocations is not None:
+                    await revocations.wait_ready()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines.values():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+# Function to create the ASGI application for a Flask app made by create_app
+def create_asgi_app(app):
+    return AsyncReadApp(app)
@@ -0,0 +1,369 @@
+# Read-through cache for service results
+# The Cache extension picks a backend from the app config:
+#   CACHE_TYPE = 'local'  - in-process LRU with per-entry TTL (default)
+#   CACHE_TYPE = 'redis'  - shared Redis backend (needs the `redis` package)
+#   CACHE_TYPE = 'null'   - caching disabled
+#
+# Invalidation is done with namespace versions: cache keys embed the current
+# version of their namespace (e.g. one author's listings), and a write bumps
+# the version so every key built from the old one is never read again.
+#
+# With read replicas, a read right after a write may return the replica's
+# older rows. invalidate() marks the namespaces it bumps as recently written
+# for DB_REPLICA_STICKY_SECONDS, and callers pass a `store` check so results
+# read from a replica within that time are served but not cached.
+#
+# The cache is never required: when the backend fails (Redis down or timing
+# out), reads go to the loader and the error is logged and counted.
+
+import asyncio
+import logging
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Seconds a read may take between getting a namespace's version and storing
+# its result; a version is kept at least this long after its entries expire
+VERSION_GRACE = 60
+# Seconds between two sweeps of the local cache's expired versions
+VERSION_PRUNE_INTERVAL = 60
+
+
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.errors = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'errors': self.errors,
+            }
+
+
+# In-process LRU cache with a TTL on every entry
+class LocalCache:
+    def __init__(self, max_entries=10000, stats=None):
+        self.max_entries = max_entries
+        self.stats = stats or CacheStats()
+        self._entries = OrderedDict()
+        # namespace -> (version, time.monotonic() of the bump). Versions live
+        # outside the LRU: evicting one early would make keys from an older
+        # version readable again. A version is dropped only once every entry
+        # written before its bump has expired (the longest timeout ever set,
+        # plus VERSION_GRACE); the namespace then reads as 0 again, whose
+        # entries are gone by then. Bumps take numbers from one counter for all
+        # namespaces, so a dropped namespace never reuses a version
+        self._versions = {}
+        self._last_version = 0
+        self._max_timeout = 0
+        self._next_prune = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.stats.incr('expirations')
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._max_timeout = max(self._max_timeout, timeout)
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def get_version(self, namespace):
+        # Only bumped namespaces are stored; reading one must not add an entry
+        with self._lock:
+            return self._versions.get(namespace, (0, None))[0]
+
+    def bump_version(self, namespace):
+        now = time.monotonic()
+        with self._lock:
+            self._last_version += 1
+            self._versions[namespace] = (self._last_version, now)
+            if now >= self._next_prune:
+                self._prune_versions(now)
+
+    # Function to drop the versions whose older entries have all expired
+    # Called with the lock held
+    def _prune_versions(self, now):
+        cutoff = now - self._max_timeout - VERSION_GRACE
+        self._versions = {namespace: entry for namespace, entry in self._versions.items() if entry[1] >= cutoff}
+        self._next_prune = now + VERSION_PRUNE_INTERVAL
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+            self._max_timeout = 0
+
+    def size(self):
+        return len(self._entries)
+
+
+# Shared cache backed by Redis, so every worker sees the same invalidations
+class RedisCache:
+    def __init__(self, url, key_prefix='artikulo:', stats=None):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_TYPE 'redis' requires the redis package (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+        self.stats = stats or CacheStats()
+
+    def get(self, key):
+        raw = self.client.get(self.key_prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, timeout):
+        self.client.set(self.key_prefix + key, pickle.dumps(value), ex=max(1, int(timeout)))
+
+    def delete(self, key):
+        self.client.delete(self.key_prefix + key)
+
+    def get_version(self, namespace):
+        key = f'{self.key_prefix}version:{namespace}'
+        version = self.client.get(key)
+        if version is None:
+            # Start from the clock rather than 0 so a version key lost to Redis
+            # eviction cannot resurrect entries written under an older version
+            self.client.set(key, int(time.time() * 1000), nx=True)
+            version = self.client.get(key)
+        return int(version)
+
+    def bump_version(self, namespace):
+        key = f'{self.key_prefix}version:{namespace}'
+        if not self.client.exists(key):
+            self.get_version(namespace)
+        self.client.incr(key)
+
+    def clear(self):
+        for key in self.client.scan_iter(f'{self.key_prefix}*'):
+            self.client.delete(key)
+
+    def size(self):
+        return None
+
+    def evictions(self):
+        # Evictions are done by the Redis server itself
+        return int(self.client.info('stats').get('evicted_keys', 0))
+
+
+# Backend used when caching is turned off
+class NullCache:
+    def __init__(self, stats=None):
+        self.stats = stats or CacheStats()
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def get_version(self, namespace):
+        return 0
+
+    def bump_version(self, namespace):
+        pass
+
+    def clear(self):
+        pass
+
+    def size(self):
+        return 0
+
+
+# Flask extension wrapping the configured backend
+class Cache:
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.default_timeout = 60
+        # Seconds a bumped namespace stays marked as recently written (0: not marked)
+        self.written_timeout = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        cache_type = app.config.get('CACHE_TYPE', 'local')
+        self.default_timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+        # Only replica reads need the marks, so they are set only with replicas
+        self.written_timeout = app.config.get('DB_REPLICA_STICKY_SECONDS', 5) if app.config.get('DB_REPLICA_URLS') else 0
+        stats = CacheStats()
+
+        if cache_type == 'local':
+            self.backend = LocalCache(app.config.get('CACHE_MAX_ENTRIES', 10000), stats=stats)
+        elif cache_type == 'redis':
+            self.backend = RedisCache(
+                app.config['CACHE_REDIS_URL'],
+                key_prefix=app.config.get('CACHE_KEY_PREFIX', 'artikulo:'),
+                stats=stats
+            )
+        elif cache_type == 'null':
+            self.backend = NullCache(stats=stats)
+        else:
+            raise ValueError(f"Unknown CACHE_TYPE: {cache_type}")
+
+        app.extensions['cache'] = self
+
+    # Function to return a cached (result, status_code) pair, or call `loader`
+    # and cache its result. Only successful (200) results are cached, and the
+    # cached object is shared between callers, so it must not be mutated.
+    # `store`, if given, is called after a load and returning False keeps the
+    # result out of the cache.
+    def cached_result(self, key, loader, timeout=None, store=None):
+        try:
+            cached = self.backend.get(key)
+        except Exception as e:
+            # Served without the cache, and not written back to it
+            self._error('get', e)
+            return loader()
+        if cached is not None:
+            self.backend.stats.incr('hits')
+            return cached, 200
+
+        self.backend.stats.incr('misses')
+        result, status_code = loader()
+        if status_code == 200 and (store is None or store()):
+            self.set(key, result, timeout)
+        return result, status_code
+
+    # Same as cached_result, for the async serving path: `loader` is a
+    # coroutine function. Calls to a shared backend are made in a thread (see
+    # call_async), so a slow Redis never holds up the event loop.
+    async def cached_result_async(self, key, loader, timeout=None, store=None):
+        try:
+            cached = await self.call_async(self.backend.get, key)
+        except Exception as e:
+            self._error('get', e)
+            return await loader()
+        if cached is not None:
+            self.backend.stats.incr('hits')
+            return cached, 200
+
+        self.backend.stats.incr('misses')
+        result, status_code = await loader()
+        if status_code == 200 and (store is None or await self.call_async(store)):
+            await self.call_async(self.set, key, result, timeout)
+        return result, status_code
+
+    # Function to call `fn` from the async serving path when it may use the
+    # cache: with a shared backend (a network round trip) it runs in a thread,
+    # with the local or null backend it is called directly
+    async def call_async(self, fn, *args):
+        if self.shared:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    def _error(self, operation, error):
+        self.backend.stats.incr('errors')
+        logger.warning("Cache %s failed: %s", operation, error)
+
+    # Whether every worker process sees the same entries
+    @property
+    def shared(self):
+        return isinstance(self.backend, RedisCache)
+
+    def get(self, key):
+        try:
+            return self.backend.get(key)
+        except Exception as e:
+            self._error('get', e)
+            return None
+
+    def set(self, key, value, timeout=None):
+        try:
+            self.backend.set(key, value, timeout or self.default_timeout)
+        except Exception as e:
+            self._error('set', e)
+
+    def delete(self, key):
+        try:
+            self.backend.delete(key)
+        except Exception as e:
+            self._error('delete', e)
+
+    def version(self, namespace):
+        try:
+            return self.backend.get_version(namespace)
+        except Exception as e:
+            self._error('version', e)
+            # A version nobody else has: keys built from it are never read back
+            return f'x{uuid.uuid4().hex}'
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            try:
+                # Marked before the bump, so no read of the new version misses the mark
+                if self.written_timeout:
+                    self.backend.set(f'written:{namespace}', True, self.written_timeout)
+                self.backend.bump_version(namespace)
+            except Exception as e:
+                # The write is committed; entries of the namespace expire with their timeout
+                self._error('invalidate', e)
+
+    # Whether the namespace was invalidated within the last written_timeout seconds
+    def recently_written(self, namespace):
+        return self.written_timeout > 0 and self.get(f'written:{namespace}') is not None
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        stats = self.backend.stats.as_dict()
+        try:
+            if hasattr(self.backend, 'evictions'):
+                stats['evictions'] = self.backend.evictions()
+            stats['entries'] = self.backend.size()
+        except Exception as e:
+            self._error('stats', e)
+            stats['entries'] = None
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = round(stats['hits'] / lookups, 4) if lookups else None
+        return stats
+
+    # Function to report the cache counters as metrics (see Metrics.add_collector)
+    def collect_metrics(self):
+        stats = self.stats()
+        return [
+            ('cache_hits_total', 'counter', 'Cache lookups answered from the cache.', [('', stats['hits'])]),
+            ('cache_misses_total', 'counter', 'Cache lookups that called the loader.', [('', stats['misses'])]),
+            ('cache_evictions_total', 'counter', 'Entries evicted to stay within the size limit.', [('', stats['evictions'])]),
+            ('cache_expirations_total', 'counter', 'Entries dropped after their timeout.', [('', stats['expirations'])]),
+            ('cache_entries', 'gauge', 'Entries currently cached.', [('', stats['entries'])]),
+            ('cache_errors_total', 'counter', 'Cache backend calls that failed; the loader was used instead.', [('', stats['errors'])]),
+        ]
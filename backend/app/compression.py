@@ -0,0 +1,164 @@
+# Response compression (gzip, and brotli when the package is installed)
+# Compression compresses response bodies in an after_request hook, using the
+# best encoding the client accepts (Accept-Encoding). Only compressible types
+# (COMPRESSION_MIMETYPES) of at least COMPRESSION_MIN_SIZE bytes are
+# compressed; streamed responses are compressed chunk by chunk as they are
+# sent, each chunk flushed so clients still get rows as soon as they are read.
+#
+# Responses with an ETag are compressed once: the compressed body is kept in
+# the cache under the ETag and the encoding, so a hot page costs a cache
+# lookup instead of a compression on every request. A compressed response is
+# a different representation, so it gets its own ETag: the original one with
+# the encoding appended ("<etag>-gzip"); app/conditional.py accepts either
+# when revalidating. On the async serving path the hook runs in a thread when
+# the cache is shared (see app/asgi.py), so these lookups do not block the loop.
+
+import threading
+import zlib
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Encodings in order of preference when the client accepts several equally
+ENCODINGS = ('br', 'gzip')
+
+
+class CompressionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.responses = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cache_hits = 0
+
+    def record(self, encoding, bytes_in, bytes_out, cached=False):
+        with self._lock:
+            self.responses[encoding] = self.responses.get(encoding, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            if cached:
+                self.cache_hits += 1
+
+
+class Compression:
+    def __init__(self, app=None):
+        self.stats = CompressionStats()
+        self.min_size = 1024
+        self.gzip_level = 6
+        self.brotli_quality = 5
+        self.mimetypes = set()
+        self.encodings = ()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.min_size = app.config.get('COMPRESSION_MIN_SIZE', 1024)
+        self.gzip_level = app.config.get('COMPRESSION_GZIP_LEVEL', 6)
+        self.brotli_quality = app.config.get('COMPRESSION_BROTLI_QUALITY', 5)
+        self.mimetypes = set(app.config.get('COMPRESSION_MIMETYPES', ('application/json',)))
+        # brotli stays optional: without the package only gzip is offered
+        self.encodings = tuple(encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None)
+        app.extensions['compression'] = self
+        if app.config.get('COMPRESSION_ENABLED', True):
+            app.after_request(self._after_request)
+
+    # Function to pick the encoding for the current request, or None for identity
+    def negotiate(self):
+        return request.accept_encodings.best_match(self.encodings)
+
+    def _compressor(self, encoding):
+        if encoding == 'br':
+            return brotli.Compressor(quality=self.brotli_quality)
+        return zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        compressor = self._compressor(encoding)
+        return compressor.compress(data) + compressor.flush()
+
+    # Function to compress a stream of chunks on the fly
+    def _compress_stream(self, chunks, encoding):
+        compressor = self._compressor(encoding)
+        bytes_in = bytes_out = 0
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+                if not chunk:
+                    continue
+                if encoding == 'br':
+                    data = compressor.process(chunk) + compressor.flush()
+                else:
+                    data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                bytes_in += len(chunk)
+                bytes_out += len(data)
+                yield data
+            data = compressor.finish() if encoding == 'br' else compressor.flush()
+            bytes_out += len(data)
+            yield data
+        finally:
+            self.stats.record(encoding, bytes_in, bytes_out)
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                close()
+
+    def _after_request(self, response):
+        # A 304 has no body but must list the same Vary as the 200 it stands for
+        if response.mimetype not in self.mimetypes and response.status_code != 304:
+            return response
+        # The body depends on Accept-Encoding from here on, even when it is not compressed
+        response.vary.add('Accept-Encoding')
+
+        if (response.status_code != 200 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or 'no-transform' in response.headers.get('Cache-Control', '')):
+            return response
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+            response.headers['Content-Encoding'] = encoding
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            cache = current_app.extensions['cache']
+            key = f'compressed:{encoding}:{request.path}:{etag}'
+            compressed = cache.get(key)
+            cached = compressed is not None
+            if not cached:
+                compressed = self.compress(body, encoding)
+                cache.set(key, compressed)
+            response.set_etag(f'{etag}-{encoding}')
+        else:
+            cached = False
+            compressed = self.compress(body, encoding)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        self.stats.record(encoding, len(body), len(compressed), cached=cached)
+        return response
+
+    # Function to report the compression counters as metrics (see Metrics.add_collector)
+    def collect_metrics(self):
+        with self.stats._lock:
+            responses = sorted(self.stats.responses.items())
+            bytes_in, bytes_out, cache_hits = self.stats.bytes_in, self.stats.bytes_out, self.stats.cache_hits
+        return [
+            ('http_compressed_responses_total', 'counter', 'Responses compressed, by encoding.',
+             [(f'encoding="{encoding}"', count) for encoding, count in responses]),
+            ('http_compression_input_bytes_total', 'counter', 'Bytes of response bodies before compression.', [('', bytes_in)]),
+            ('http_compression_output_bytes_total', 'counter', 'Bytes of response bodies after compression.', [('', bytes_out)]),
+            ('http_compression_cache_hits_total', 'counter', 'Compressed bodies served from the cache.', [('', cache_hits)]),
+        ]
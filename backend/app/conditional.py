@@ -0,0 +1,69 @@
+# HTTP conditional GET helpers (ETag / Last-Modified / 304 Not Modified)
+# Routes compute validators from a cheap query (or the cache) first, and only
+# build the full JSON body when the client's copy is out of date.
+
+import hashlib
+from datetime import timezone
+from flask import request, jsonify, make_response
+from .compression import ENCODINGS
+
+
+# Function to build a strong ETag value from the parts that identify a representation
+def make_etag(*parts):
+    raw = '|'.join('' if part is None else str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def _as_utc(value):
+    if value is None:
+        return None
+    # Database timestamps are naive UTC; HTTP dates have one-second precision
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+# Function to find which of the representation's ETags the client sent
+# Compressed bodies carry the ETag of the uncompressed one with the encoding
+# appended (see app/compression.py); the client may hold any of them
+def _matching_etag(etag):
+    for candidate in (etag, *(f'{etag}-{encoding}' for encoding in ENCODINGS)):
+        if request.if_none_match.contains(candidate):
+            return candidate
+    return None
+
+
+# Function to check the request's validators against the current ones
+# If-None-Match takes precedence over If-Modified-Since (RFC 9110, 13.2.2)
+def is_not_modified(etag, last_modified=None):
+    if request.if_none_match:
+        return _matching_etag(etag) is not None
+    if request.if_modified_since and last_modified is not None:
+        return _as_utc(last_modified) <= request.if_modified_since
+    return False
+
+
+def _set_validators(response, etag, last_modified, private):
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _as_utc(last_modified)
+    # Let clients and the CDN store the body but revalidate it on every use
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'public, no-cache'
+    return response
+
+
+# Function to build an empty 304 response carrying the current validators
+# The ETag is the one the client holds, so a compressed copy stays current
+def not_modified_response(etag, last_modified=None, private=False):
+    response = make_response('', 304)
+    if request.if_none_match:
+        etag = _matching_etag(etag) or etag
+    return _set_validators(response, etag, last_modified, private)
+
+
+# Function to build a JSON response, adding validators to successful ones
+def conditional_json(result, status_code, etag, last_modified=None, private=False):
+    response = make_response(jsonify(result), status_code)
+    if status_code == 200:
+        _set_validators(response, etag, last_modified, private)
+    return response
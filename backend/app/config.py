@@ -20,27 +20,152 @@ class Config:
 
     # PostgreSQL connection string
     SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-    print(f"Using PostgreSQL database: {DB_HOST}:{DB_PORT}/{DB_NAME}")
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Connection pool, per engine and per worker process (see app/database.py)
+    # A server must allow workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    # DB_POOL_TIMEOUT is how long a request waits for a free connection;
+    # DB_STATEMENT_TIMEOUT (milliseconds, 0 for none) cancels slow statements
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', 10))
+    DB_STATEMENT_TIMEOUT = int(os.getenv('DB_STATEMENT_TIMEOUT', 0))
+    # Connecting through PgBouncer in transaction mode: no pool in the app
+    DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'
+
+    # Read replicas for post and user reads (comma-separated URLs)
+    # After writing, a user reads from the primary for DB_REPLICA_STICKY_SECONDS;
+    # set it above the usual replication lag
+    DB_REPLICA_URLS = [url.strip() for url in os.getenv('DB_REPLICA_URLS', '').split(',') if url.strip()]
+    DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 5))
+
+    # Async serving path (see app/asgi.py); by default the database URL with
+    # its async driver (postgresql+asyncpg, sqlite+aiosqlite)
+    ASYNC_DATABASE_URL = os.getenv('ASYNC_DATABASE_URL') or None
+
     # JWT configuration
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', secrets.token_hex(32)) # fallback, if not found in .env, generate random key of 32 characters
-    print(f"DEBUG - JWT Secret Key first 10 chars: {JWT_SECRET_KEY[:10]}...")
-    print(f"DEBUG - JWT Secret Key length: {len(JWT_SECRET_KEY)}")
-    
+
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(days=1)
-    JWT_BLACKLIST_ENABLED = True
-    JWT_BLACKLIST_TOKEN_CHECKS = ['access']
-    
-    # Print JWT configuration for debugging
-    print("DEBUG - JWT Configuration:")
-    print(f"JWT_ACCESS_TOKEN_EXPIRES: {JWT_ACCESS_TOKEN_EXPIRES}")
-    print(f"JWT_BLACKLIST_ENABLED: {JWT_BLACKLIST_ENABLED}")
+    # Seconds a user's profile is cached for /api/auth/profile?fresh=true
+    IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', 30))
+
+    # Token revocation (see app/revocation.py)
+    # Flask-JWT-Extended 4 checks every token against the blocklist loader
+    # registered in create_app; the JWT_BLACKLIST_* settings of 3.x are gone.
+    # Each worker reads new revocations every REVOCATION_REFRESH_INTERVAL
+    # seconds, so a token logged out through another worker is rejected
+    # within that time; expired revocations are deleted by a job
+    # REVOCATION_PURGE_DELAY seconds after a logout. A worker that has not
+    # refreshed for REVOCATION_STALE_AFTER seconds checks tokens in the database
+    REVOCATION_REFRESH_INTERVAL = float(os.getenv('REVOCATION_REFRESH_INTERVAL', 5))
+    REVOCATION_LOAD_TIMEOUT = float(os.getenv('REVOCATION_LOAD_TIMEOUT', 2))
+    REVOCATION_STALE_AFTER = float(os.getenv('REVOCATION_STALE_AFTER', 3 * REVOCATION_REFRESH_INTERVAL))
+    REVOCATION_PURGE_DELAY = int(os.getenv('REVOCATION_PURGE_DELAY', 3600))
+
+    # JSON encoder for responses: 'orjson' or 'default' (see app/json_provider.py)
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'orjson')
+
+    # Logging (see app/logging_config.py)
+    # LOG_FORMAT is 'json' (one object per line) or 'text'; LOG_SAMPLING keeps a
+    # fraction of INFO/DEBUG records per logger, e.g. "app.routes=0.1,werkzeug=0.01"
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_SAMPLING = os.getenv('LOG_SAMPLING', '')
+    LOG_MAX_MESSAGE_LENGTH = int(os.getenv('LOG_MAX_MESSAGE_LENGTH', 2000))
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
 
     # Supabase configuration for future use
     SUPABASE_URL = os.getenv('SUPABASE_URL', 'https://zqtvmeomsnsiezevmehm.supabase.co')
     SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
+    # Pagination settings for post listings
+    POSTS_PAGE_SIZE = int(os.getenv('POSTS_PAGE_SIZE', 20))
+    POSTS_MAX_PAGE_SIZE = int(os.getenv('POSTS_MAX_PAGE_SIZE', 100))
+
+    SEARCH_PAGE_SIZE = int(os.getenv('SEARCH_PAGE_SIZE', 20))
+
+    # Rows per INSERT statement for POST /api/posts/import
+    IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))
+    # Largest single post accepted by the import, in bytes of JSON
+    IMPORT_MAX_RECORD_SIZE = int(os.getenv('IMPORT_MAX_RECORD_SIZE', 1024 * 1024))
+
+    # Cache settings for post reads ('local', 'redis' or 'null')
+    # The local cache is per process, so keep its timeout short when running
+    # several workers; use 'redis' to share entries and invalidations
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'local')
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 30))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+    CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_KEY_PREFIX = os.getenv('CACHE_KEY_PREFIX', 'artikulo:')
+
+    # Response compression (gzip, and brotli when installed; see app/compression.py)
+    # Bodies smaller than COMPRESSION_MIN_SIZE bytes are sent as they are
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+    COMPRESSION_MIMETYPES = [mimetype.strip() for mimetype in os.getenv(
+        'COMPRESSION_MIMETYPES', 'application/json,application/x-ndjson,text/csv,text/plain').split(',') if mimetype.strip()]
+
+    # Uploaded images (see app/media.py)
+    # Originals and their WebP variants are stored under MEDIA_ROOT and served
+    # under MEDIA_URL, which may be a CDN URL in front of this app; variants
+    # are made by the job workers and need Pillow
+    MEDIA_ROOT = os.getenv('MEDIA_ROOT') or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media')
+    MEDIA_URL = os.getenv('MEDIA_URL', '/media')
+    MEDIA_MAX_UPLOAD_BYTES = int(os.getenv('MEDIA_MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+    MEDIA_VARIANT_WIDTHS = [int(width) for width in os.getenv('MEDIA_VARIANT_WIDTHS', '320,640,1280').split(',') if width.strip()]
+    MEDIA_VARIANT_QUALITY = int(os.getenv('MEDIA_VARIANT_QUALITY', 80))
+    MEDIA_MAX_AGE = int(os.getenv('MEDIA_MAX_AGE', 365 * 24 * 3600))
+
     # Security settings
-    BCRYPT_LOG_ROUNDS = 12  # Higher is more secure but slower
+    BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))  # Higher is more secure but slower; existing hashes are upgraded on login
+
+    # Bulk user provisioning (POST /api/auth/users/bulk); disabled when no token is set
+    PROVISIONING_TOKEN = os.getenv('PROVISIONING_TOKEN')
+    PROVISIONING_MAX_USERS = int(os.getenv('PROVISIONING_MAX_USERS', 10000))
+    # Plain-text passwords are hashed within the request, a quarter second each
+    # at cost 12 on half the hashing pool; keep the request inside the worker timeout
+    PROVISIONING_MAX_PASSWORDS = int(os.getenv('PROVISIONING_MAX_PASSWORDS', 100))
+    PROVISIONING_BATCH_SIZE = int(os.getenv('PROVISIONING_BATCH_SIZE', 1000))
+
+    # Per-request metrics on /metrics (Prometheus text format)
+    # METRICS_SERVER_TIMING adds a Server-Timing header with app and SQL time to every response
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_SERVER_TIMING = os.getenv('METRICS_SERVER_TIMING', 'false').lower() == 'true'
+
+    # Health probes (see app/health.py)
+    # The database is checked every HEALTH_CHECK_INTERVAL seconds in the
+    # background; /health/ready fails when the last check failed or is older
+    # than HEALTH_STALE_AFTER (default three intervals), and, when
+    # HEALTH_MAX_POOL_SATURATION is set (0-1), when that share of the pool is in use
+    HEALTH_CHECK_INTERVAL = float(os.getenv('HEALTH_CHECK_INTERVAL', 5))
+    HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 2))
+    HEALTH_STALE_AFTER = float(os.getenv('HEALTH_STALE_AFTER', 0)) or None
+    HEALTH_MAX_POOL_SATURATION = float(os.getenv('HEALTH_MAX_POOL_SATURATION', 0))
+
+    # Background jobs (see app/jobs.py), run by `flask --app main jobs work`
+    # A failed job is retried after JOBS_BACKOFF_BASE seconds, doubling up to
+    # JOBS_BACKOFF_MAX, until it has run JOBS_MAX_ATTEMPTS times. A job still
+    # running after JOBS_LEASE_SECONDS is taken to have lost its worker and is
+    # queued again; finished jobs are deleted after JOBS_RETENTION_SECONDS
+    JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 5))
+    JOBS_BACKOFF_BASE = float(os.getenv('JOBS_BACKOFF_BASE', 5))
+    JOBS_BACKOFF_MAX = float(os.getenv('JOBS_BACKOFF_MAX', 3600))
+    JOBS_LEASE_SECONDS = float(os.getenv('JOBS_LEASE_SECONDS', 300))
+    JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+    JOBS_RETENTION_SECONDS = int(os.getenv('JOBS_RETENTION_SECONDS', 7 * 24 * 3600))
+
+    # Password hashing pool ('process', 'thread' or 'inline')
+    # HASHING_WORKERS caps concurrent bcrypt calls (default: CPU count) and
+    # HASHING_MAX_PENDING caps queued calls; beyond that auth requests get a 503
+    HASHING_EXECUTOR = os.getenv('HASHING_EXECUTOR', 'process')
+    HASHING_WORKERS = int(os.getenv('HASHING_WORKERS', 0)) or None
+    HASHING_MAX_PENDING = int(os.getenv('HASHING_MAX_PENDING', 32))
+    HASHING_TIMEOUT = float(os.getenv('HASHING_TIMEOUT', 10))
+    HASHING_START_METHOD = os.getenv('HASHING_START_METHOD') or None
@@ -0,0 +1,208 @@
+# Engine configuration and read-replica routing
+# Every engine gets its pool settings from the config (DB_POOL_SIZE,
+# DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+# DB_CONNECT_TIMEOUT, DB_STATEMENT_TIMEOUT). With DB_PGBOUNCER the app keeps no
+# pool of its own and lets PgBouncer pool the server connections.
+#
+# Each URL in DB_REPLICA_URLS becomes a bind ('replica_1', 'replica_2', ...).
+# Service functions decorated with @replica_read send their SELECTs to one of
+# them, picked once per request so all reads of a request see the same
+# replica. Everything else, including every flush, goes to the primary. After
+# a user writes, their reads stay on the primary for DB_REPLICA_STICKY_SECONDS
+# so they see their own writes despite replication lag. Results read from a
+# replica are not cached until that time has passed since the last write to
+# them (see Cache.recently_written), so a replica's older rows are not kept
+# in the cache where the writer would read them.
+
+import functools
+import random
+import threading
+import time
+from contextvars import ContextVar
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+REPLICA_PREFIX = 'replica_'
+
+_replica_reads = ContextVar('replica_reads', default=False)
+
+
+# Function to build the create_engine() options for one database URL
+def engine_options(config, url):
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite':
+        # Flask-SQLAlchemy picks the SQLite pool; there is no server to time out
+        return {}
+
+    options = {}
+    connect_args = {}
+    if url.get_backend_name() == 'postgresql':
+        connect_args['connect_timeout'] = config.get('DB_CONNECT_TIMEOUT', 10)
+
+    if config.get('DB_PGBOUNCER'):
+        # PgBouncer (transaction pooling) shares its server connections between
+        # clients: connections are opened per checkout, and session settings
+        # such as statement_timeout must be set on the role or in PgBouncer
+        options['poolclass'] = NullPool
+    else:
+        options.update(
+            pool_size=config.get('DB_POOL_SIZE', 5),
+            max_overflow=config.get('DB_MAX_OVERFLOW', 10),
+            pool_timeout=config.get('DB_POOL_TIMEOUT', 30),
+            pool_recycle=config.get('DB_POOL_RECYCLE', 1800),
+            pool_pre_ping=config.get('DB_POOL_PRE_PING', True),
+        )
+        statement_timeout = config.get('DB_STATEMENT_TIMEOUT', 0)
+        if statement_timeout and url.get_backend_name() == 'postgresql':
+            connect_args['options'] = f'-c statement_timeout={int(statement_timeout)}'
+
+    if connect_args:
+        options['connect_args'] = connect_args
+    return options
+
+
+# Function to set the engine options and replica binds before db.init_app
+# Options set explicitly in SQLALCHEMY_ENGINE_OPTIONS take precedence
+def configure_database(app):
+    config = app.config
+    config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        **engine_options(config, config['SQLALCHEMY_DATABASE_URI']),
+        **config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    replica_keys = []
+    for number, url in enumerate(config.get('DB_REPLICA_URLS') or [], start=1):
+        key = f'{REPLICA_PREFIX}{number}'
+        binds[key] = {'url': url, **engine_options(config, url)}
+        replica_keys.append(key)
+    config['SQLALCHEMY_BINDS'] = binds
+    app.extensions['replicas'] = replica_keys
+
+
+# Decorator for service functions that only read and may be served by a replica
+def replica_read(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _replica_reads.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+    return wrapper
+
+
+# Users who wrote recently, kept in the cache so every worker sees them, and
+# in this process in case the cache is not shared (or is the null cache)
+class StickyUsers:
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def mark(self, user_id, seconds):
+        with self._lock:
+            if len(self._local) >= self.max_entries:
+                now = time.monotonic()
+                self._local = {key: until for key, until in self._local.items() if until > now}
+            self._local[user_id] = time.monotonic() + seconds
+        current_app.extensions['cache'].set(f'db:primary:{user_id}', True, timeout=seconds)
+
+    def is_sticky(self, user_id):
+        until = self._local.get(user_id)
+        if until is not None and until > time.monotonic():
+            return True
+        return current_app.extensions['cache'].get(f'db:primary:{user_id}') is not None
+
+
+sticky_users = StickyUsers()
+
+
+class ReplicaStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.replica = 0
+        self.primary_sticky = 0
+
+    def incr(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+replica_stats = ReplicaStats()
+
+
+# Function to get the user making the request, if they sent a valid token
+# Public routes do not verify tokens, so one sent to them is checked here
+def _request_user_id():
+    from flask_jwt_extended import get_jwt, verify_jwt_in_request
+    try:
+        return get_jwt().get('sub')
+    except RuntimeError:
+        pass
+    if 'Authorization' not in request.headers:
+        return None
+    try:
+        verify_jwt_in_request(optional=True)
+        return get_jwt().get('sub')
+    except Exception:
+        return None
+
+
+# Function to choose the replica bind for the current request, or None for the primary
+def request_replica(replica_keys):
+    if not has_request_context():
+        return random.choice(replica_keys)
+    if 'db_replica' not in g:
+        user_id = _request_user_id()
+        if user_id is not None and sticky_users.is_sticky(user_id):
+            g.db_replica = None
+            replica_stats.incr('primary_sticky')
+        else:
+            g.db_replica = random.choice(replica_keys)
+            replica_stats.incr('replica')
+    return g.db_replica
+
+
+# Function to tell whether the current request's reads were sent to a replica
+def reading_replica():
+    return has_request_context() and g.get('db_replica') is not None
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and _replica_reads.get() and not self._flushing
+                and not self.info.get('wrote') and getattr(clause, 'is_select', False)):
+            replica_keys = current_app.extensions.get('replicas')
+            if replica_keys:
+                key = request_replica(replica_keys)
+                if key is not None:
+                    return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(session, flush_context):
+    # Later reads in this session must see what it wrote
+    session.info['wrote'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(session):
+    if not session.info.get('wrote') or not has_request_context() or not current_app.extensions.get('replicas'):
+        return
+    user_id = _request_user_id()
+    if user_id is not None:
+        sticky_users.mark(user_id, current_app.config.get('DB_REPLICA_STICKY_SECONDS', 5))
+
+
+# Function to report replica routing as metrics (see Metrics.add_collector)
+def collect_metrics():
+    with replica_stats._lock:
+        return [
+            ('db_replica_requests_total', 'counter', 'Requests whose reads were sent to a replica.', [('', replica_stats.replica)]),
+            ('db_replica_sticky_requests_total', 'counter', 'Requests kept on the primary because the user wrote recently.', [('', replica_stats.primary_sticky)]),
+        ]
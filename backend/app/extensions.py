@@ -4,13 +4,45 @@
 
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
-from flask_bcrypt import Bcrypt
+from .cache import Cache
+from .compression import Compression
+from .database import RoutingSession
+from .hashing import PasswordHasher
+from .jobs import JobQueue
+from .media import Media
+from .health import HealthProber
+from .metrics import Metrics
+from .revocation import Revocations
 
-# SQLAlchemy for database ORM
-db = SQLAlchemy()
+# SQLAlchemy for database ORM; the session sends replica reads to a replica (see app/database.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # JWTManager for handling JSON Web Tokens
 jwt = JWTManager()
 
-# Bcrypt for password hashing
-bcrypt = Bcrypt()
+# Revoked tokens, checked in memory on every authenticated request (see app/revocation.py)
+revocations = Revocations()
+
+# Runs bcrypt in a bounded worker pool instead of the request worker (see app/hashing.py)
+hasher = PasswordHasher()
+
+# Flask-Migrate (Alembic) is not created here: it is only needed by the `flask db`
+# commands, so app.init_migrate sets it up for the CLI instead of every worker
+
+# Cache for read-heavy service results (see app/cache.py)
+cache = Cache()
+
+# Per-request timing, SQL and size metrics, served on /metrics (see app/metrics.py)
+metrics = Metrics()
+
+# gzip/brotli response compression, with compressed bodies kept in the cache (see app/compression.py)
+compression = Compression()
+
+# Liveness/readiness probes fed by a background database prober (see app/health.py)
+health = HealthProber()
+
+# Uploaded images and their resized variants (see app/media.py)
+media = Media()
+
+# Background jobs kept in the database and run by `flask jobs work` (see app/jobs.py)
+jobs = JobQueue()
@@ -0,0 +1,220 @@
+# Password hashing off the request workers
+# bcrypt at a production cost takes hundreds of milliseconds of CPU per call.
+# PasswordHasher runs it in a bounded process pool so a burst of logins cannot
+# occupy every request worker, and rejects work once too much is queued.
+# Hashes use the same format as Flask-Bcrypt ($2b$, UTF-8 passwords), so
+# existing hashes keep working.
+
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import bcrypt as _bcrypt
+
+_cost_pattern = re.compile(r'^\$2[abxy]?\$(\d{2})\$')
+
+
+class HashingBusy(Exception):
+    # Raised when the hashing queue is full or a hash takes too long
+    pass
+
+
+# These run inside the pool; they return their own run time so queue wait and
+# hashing time can be reported separately
+def _hash(password, rounds):
+    started = time.perf_counter()
+    hashed = _bcrypt.hashpw(password.encode('utf-8'), _bcrypt.gensalt(rounds=rounds, prefix=b'2b'))
+    return hashed.decode('utf-8'), time.perf_counter() - started
+
+
+def _check(hashed, password):
+    started = time.perf_counter()
+    try:
+        valid = _bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        # Malformed hash stored for the user
+        valid = False
+    return valid, time.perf_counter() - started
+
+
+class _InlineExecutor:
+    # Runs work in the calling thread (HASHING_EXECUTOR = 'inline')
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True):
+        pass
+
+
+class HashingStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.total_seconds = 0.0
+        self.hash_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'queue_depth': self.pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'avg_latency_ms': round(self.total_seconds / self.completed * 1000, 2) if self.completed else None,
+                'avg_hash_ms': round(self.hash_seconds / self.completed * 1000, 2) if self.completed else None,
+                'max_latency_ms': round(self.max_seconds * 1000, 2),
+            }
+
+
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.rounds = 12
+        self.workers = 1
+        self.max_pending = 16
+        self.timeout = 10
+        self.executor_type = 'process'
+        self.start_method = None
+        self.stats = HashingStats()
+        self._executor = None
+        self._executor_pid = None
+        self._executor_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', 12)
+        self.workers = app.config.get('HASHING_WORKERS') or os.cpu_count() or 1
+        self.max_pending = app.config.get('HASHING_MAX_PENDING', self.workers * 4)
+        self.timeout = app.config.get('HASHING_TIMEOUT', 10)
+        self.executor_type = app.config.get('HASHING_EXECUTOR', 'process')
+        self.start_method = app.config.get('HASHING_START_METHOD')
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        app.extensions['hasher'] = self
+
+    # The pool is created on first use, and again in a forked child, so
+    # pre-fork servers never share pool processes between workers
+    def _get_executor(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            return self._executor
+        with self._executor_lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                if self.executor_type == 'process':
+                    # multiprocessing is imported here, not at startup
+                    import multiprocessing
+                    from concurrent.futures import ProcessPoolExecutor
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method)
+                    )
+                elif self.executor_type == 'thread':
+                    # bcrypt releases the GIL, so threads also run in parallel
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='hashing')
+                else:
+                    self._executor = _InlineExecutor()
+                self._executor_pid = os.getpid()
+        return self._executor
+
+    # Function to submit work to the pool, or raise HashingBusy when too much is
+    # in flight. The slot is held until the work is done, not until the caller
+    # stops waiting: a timed-out bcrypt call still occupies a pool process
+    def _submit(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self.stats._lock:
+                self.stats.rejected += 1
+            raise HashingBusy('Too many password operations in progress')
+
+        started = time.perf_counter()
+        with self.stats._lock:
+            self.stats.pending += 1
+        try:
+            future = self._get_executor().submit(fn, *args)
+        except Exception:
+            self._done(started, None)
+            raise
+        future.add_done_callback(lambda future: self._done(started, future))
+        return future
+
+    def _done(self, started, future):
+        elapsed = time.perf_counter() - started
+        completed = future is not None and not future.cancelled() and future.exception() is None
+        with self.stats._lock:
+            self.stats.pending -= 1
+            if completed:
+                self.stats.completed += 1
+                self.stats.total_seconds += elapsed
+                self.stats.hash_seconds += future.result()[1]
+                self.stats.max_seconds = max(self.stats.max_seconds, elapsed)
+        self._slots.release()
+
+    def _result(self, future):
+        try:
+            return future.result(timeout=self.timeout)[0]
+        except FutureTimeoutError:
+            # Dropped if it has not started yet; a running call keeps its slot until it ends
+            future.cancel()
+            with self.stats._lock:
+                self.stats.timeouts += 1
+            raise HashingBusy('Password operation timed out')
+
+    def _run(self, fn, *args):
+        return self._result(self._submit(fn, *args))
+
+    # Function to report the hashing counters as metrics (see Metrics.add_collector)
+    def collect_metrics(self):
+        stats = self.stats
+        with stats._lock:
+            return [
+                ('password_hashing_queue_depth', 'gauge', 'Password operations running or waiting for the pool.', [('', stats.pending)]),
+                ('password_hashing_completed_total', 'counter', 'Password operations completed.', [('', stats.completed)]),
+                ('password_hashing_rejected_total', 'counter', 'Password operations rejected because the queue was full.', [('', stats.rejected)]),
+                ('password_hashing_timeouts_total', 'counter', 'Password operations that timed out.', [('', stats.timeouts)]),
+                ('password_hashing_seconds_total', 'counter', 'Time from submitting to finishing password operations.', [('', stats.total_seconds)]),
+                ('password_hashing_cpu_seconds_total', 'counter', 'Time spent inside bcrypt.', [('', stats.hash_seconds)]),
+            ]
+
+    # Function to hash a password at the configured cost
+    def hash_password(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    # Function to hash many passwords for bulk jobs
+    # At most half of the pool is used at a time, so logins keep being served;
+    # the hashes take queue slots like any other operation
+    def hash_many(self, passwords):
+        window = max(1, self.workers // 2)
+        hashes = []
+        for start in range(0, len(passwords), window):
+            futures = []
+            try:
+                for password in passwords[start:start + window]:
+                    futures.append(self._submit(_hash, password, self.rounds))
+                for future in futures:
+                    hashes.append(self._result(future))
+            finally:
+                for future in futures:
+                    future.cancel()
+        return hashes
+
+    # Function to check a password against a stored hash
+    def check_password(self, hashed, password):
+        return self._run(_check, hashed, password)
+
+    # Function to tell whether a hash was made with a different cost than the configured one
+    def needs_rehash(self, hashed):
+        match = _cost_pattern.match(hashed or '')
+        return match is None or int(match.group(1)) != self.rounds
+
+    def shutdown(self):
+        if self._executor is not None and self._executor_pid == os.getpid():
+            self._executor.shutdown(wait=False)
+        self._executor = None
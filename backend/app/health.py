@@ -0,0 +1,238 @@
+# Liveness and readiness probes
+#   GET /health/live   - the process is up and serving requests; touches nothing
+#   GET /health/ready  - the app can serve traffic: 200, or 503 when the
+#                        primary database is unreachable or the last check is stale
+#   GET /health        - the readiness result in the original {status, database} shape
+#
+# Probes never query the database themselves. A background thread per worker
+# process checks the primary and every replica every HEALTH_CHECK_INTERVAL
+# seconds with `SELECT 1`, over a connection of its own (outside the app's
+# pools, so it never waits behind, or takes a connection from, real traffic),
+# and keeps the result: reachable or not, the error, and the round-trip time.
+# Probes read that result and the pool counters, so they answer instantly and
+# cost nothing however often they come.
+#
+# The prober starts with the first request a worker handles, so the flask CLI
+# and scripts never start it, and each forked worker runs its own.
+
+import logging
+import os
+import threading
+import time
+from flask import jsonify
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import QueuePool, StaticPool
+from .database import REPLICA_PREFIX, engine_options
+
+logger = logging.getLogger(__name__)
+
+
+# Result of the latest check of one database
+class DatabaseState:
+    __slots__ = ('up', 'latency', 'error', 'checked_at')
+
+    def __init__(self, up=False, latency=None, error=None, checked_at=None):
+        self.up = up
+        self.latency = latency
+        self.error = error
+        self.checked_at = checked_at
+
+    def as_dict(self):
+        return {
+            'up': self.up,
+            'latency_ms': round(self.latency * 1000, 2) if self.latency is not None else None,
+            'error': self.error,
+            'checked_seconds_ago': round(time.monotonic() - self.checked_at, 1) if self.checked_at is not None else None,
+        }
+
+
+# Function to report how many of a pool's connections are checked out
+# Returns None for pools without a fixed size (SQLite, NullPool with PgBouncer)
+def pool_status(engine):
+    pool = engine.pool
+    if not isinstance(pool, QueuePool):
+        return None
+    # max_overflow -1 means no limit on overflow connections
+    capacity = pool.size() + pool._max_overflow if pool._max_overflow >= 0 else None
+    checked_out = pool.checkedout()
+    return {
+        'size': pool.size(),
+        'checked_out': checked_out,
+        'capacity': capacity,
+        'saturation': round(checked_out / capacity, 3) if capacity else None,
+    }
+
+
+def _database_name(key):
+    return 'primary' if key is None else key
+
+
+class HealthProber:
+    def __init__(self, app=None):
+        self.interval = 5.0
+        self.timeout = 2.0
+        self.stale_after = 15.0
+        self.max_pool_saturation = 0
+        self.states = {}
+        self._app = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checked = threading.Event()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.interval = app.config.get('HEALTH_CHECK_INTERVAL', 5.0)
+        self.timeout = app.config.get('HEALTH_CHECK_TIMEOUT', 2.0)
+        self.stale_after = app.config.get('HEALTH_STALE_AFTER') or self.interval * 3
+        self.max_pool_saturation = app.config.get('HEALTH_MAX_POOL_SATURATION', 0)
+        # A prober started for another app (tests, benchmarks) must not report for this one
+        self.stop()
+        self._app = app
+        app.extensions['health'] = self
+
+        app.before_request(self._ensure_running)
+        app.add_url_rule('/health/live', 'health_live', self.live_view, methods=['GET'])
+        app.add_url_rule('/health/ready', 'health_ready', self.ready_view, methods=['GET'])
+        app.add_url_rule('/health', 'health_check', self.health_view, methods=['GET'])
+
+    # Function to start the prober thread in this process if it is not running
+    # A forked worker does not inherit the parent's thread, so the pid is checked too
+    def _ensure_running(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._checked = threading.Event()
+            self.states = {}
+            self._thread = threading.Thread(target=self._run, args=(self.states, self._stop, self._checked),
+                                            name='health-prober', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    # Function to build one dedicated, single-connection engine per database
+    def _probe_engines(self):
+        from .extensions import db
+        config = self._app.config
+        with self._app.app_context():
+            urls = {key: engine.url for key, engine in db.engines.items()
+                    if key is None or str(key).startswith(REPLICA_PREFIX)}
+        engines = {}
+        for key, url in urls.items():
+            connect_args = dict(engine_options(config, url).get('connect_args', {}))
+            if url.get_backend_name() == 'postgresql':
+                connect_args['connect_timeout'] = max(1, int(self.timeout))
+                connect_args['options'] = f'-c statement_timeout={int(self.timeout * 1000)}'
+            engines[key] = create_engine(url, poolclass=StaticPool, connect_args=connect_args)
+        return engines
+
+    def _check(self, engine):
+        started = time.perf_counter()
+        try:
+            with engine.connect() as conn:
+                conn.execute(text('SELECT 1'))
+            return DatabaseState(True, time.perf_counter() - started, checked_at=time.monotonic())
+        except Exception as e:
+            # Reconnect on the next check rather than reuse a broken connection
+            engine.dispose()
+            return DatabaseState(False, time.perf_counter() - started, str(e).splitlines()[0], time.monotonic())
+
+    def _run(self, states, stop, checked):
+        engines = None
+        try:
+            while not stop.is_set():
+                try:
+                    if engines is None:
+                        engines = self._probe_engines()
+                    for key, engine in engines.items():
+                        self._record(states, key, self._check(engine))
+                except Exception:
+                    logger.exception("Health check failed")
+                checked.set()
+                stop.wait(self.interval)
+        finally:
+            for engine in (engines or {}).values():
+                engine.dispose()
+
+    def _record(self, states, key, state):
+        previous = states.get(key)
+        if previous is not None and previous.up != state.up:
+            if state.up:
+                logger.info("Database %s is reachable again", _database_name(key))
+            else:
+                logger.warning("Database %s is unreachable: %s", _database_name(key), state.error)
+        states[key] = state
+
+    # Function to stop the prober thread of this process
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+
+    def _pool_statuses(self):
+        from .extensions import db
+        return {_database_name(key): pool_status(engine) for key, engine in db.engines.items()}
+
+    # Function to assemble the readiness report from the cached state
+    # Returns (report, ready)
+    def report(self):
+        if not self._checked.is_set():
+            # Only a new worker's first probes wait, for its first check
+            self._checked.wait(self.timeout)
+        primary = self.states.get(None)
+        pools = self._pool_statuses()
+        reasons = []
+        if primary is None:
+            reasons.append('database not checked yet')
+        elif not primary.up:
+            reasons.append('database unreachable')
+        elif time.monotonic() - primary.checked_at > self.stale_after:
+            reasons.append('database check is stale')
+        saturation = (pools.get('primary') or {}).get('saturation')
+        if self.max_pool_saturation and saturation is not None and saturation >= self.max_pool_saturation:
+            reasons.append('connection pool saturated')
+
+        report = {
+            'status': 'ok' if not reasons else 'unavailable',
+            'databases': {_database_name(key): state.as_dict() for key, state in list(self.states.items())},
+            'pools': pools,
+        }
+        if reasons:
+            report['reasons'] = reasons
+        return report, not reasons
+
+    def live_view(self):
+        return jsonify({'status': 'ok'}), 200
+
+    def ready_view(self):
+        report, ready = self.report()
+        return jsonify(report), 200 if ready else 503
+
+    def health_view(self):
+        report, ready = self.report()
+        primary = self.states.get(None)
+        if primary is None:
+            database = 'unknown'
+        elif primary.up:
+            database = 'connected'
+        else:
+            database = f'error: {primary.error}'
+        return jsonify({'status': report['status'], 'database': database}), 200 if ready else 503
+
+    # Function to report the cached checks and pool counters as metrics (see Metrics.add_collector)
+    def collect_metrics(self):
+        states = list(self.states.items())
+        pools = [(name, status) for name, status in self._pool_statuses().items() if status is not None]
+        return [
+            ('db_up', 'gauge', 'Whether the last health check reached the database.',
+             [(f'database="{_database_name(key)}"', int(state.up)) for key, state in states]),
+            ('db_check_latency_seconds', 'gauge', 'Round-trip time of the last health check query.',
+             [(f'database="{_database_name(key)}"', state.latency) for key, state in states]),
+            ('db_pool_checked_out', 'gauge', 'Connections currently checked out of the pool.',
+             [(f'database="{name}"', status['checked_out']) for name, status in pools]),
+            ('db_pool_capacity', 'gauge', 'Connections the pool can hand out, overflow included.',
+             [(f'database="{name}"', status['capacity']) for name, status in pools]),
+        ]
@@ -0,0 +1,445 @@
+# Background jobs, kept in the database
+# Work that follows a write but does not have to hold up its response (image
+# variants, cache warming) is added to the `job` table in the same transaction
+# as the write: one INSERT, whatever the work costs, and the job exists if and
+# only if the write was committed. No broker is needed; the app's own database
+# is the queue.
+#
+# Workers (`flask --app main jobs work`) claim due jobs with
+#   UPDATE job SET status = 'running' ... WHERE id IN
+#       (SELECT id ... FOR UPDATE SKIP LOCKED LIMIT 1) RETURNING ...
+# so any number of them can poll the same queue without taking the same job
+# or waiting on each other's locks. A job that raises is queued again after an
+# exponential backoff with jitter, and marked failed after max_attempts. A
+# worker that dies leaves its job running; once the lease has passed, another
+# worker queues it again. Jobs therefore run at least once: tasks must be
+# safe to run twice.
+#
+# An idempotency key makes enqueueing the same work again a no-op while a job
+# with that key is queued or running; a finished job with that key is queued
+# again instead. Finished jobs are deleted after JOBS_RETENTION_SECONDS.
+#
+# On SQLite, FOR UPDATE is not emitted; SQLite allows one writer at a time,
+# so the claim is still taken by exactly one worker.
+
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import SQLAlchemyError
+from .logging_config import stop_logging
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+# Statuses of jobs that have not finished; finished jobs pile up until the
+# retention sweep, so what is read on every scrape is limited to these
+PENDING = (QUEUED, RUNNING)
+
+# Seconds between two runs of the lease and retention sweeps in a worker
+MAINTENANCE_INTERVAL = 60
+
+# Task name -> function, filled by the @task decorator when modules are imported
+_tasks = {}
+
+
+# Decorator registering a function as the task `name`
+# The job's payload is passed as keyword arguments, and the function runs in
+# an app context; what it writes to db.session is committed with the job.
+def task(name):
+    def decorator(fn):
+        if name in _tasks and _tasks[name] is not fn:
+            raise ValueError(f"Task {name} is already registered")
+        _tasks[name] = fn
+        return fn
+    return decorator
+
+
+# Function to compute the delay before the next attempt of a failed job
+# Doubles with each attempt up to `maximum`; the upper half is random so jobs
+# that failed together (a database restart) do not all come back together
+def backoff(attempts, base, maximum):
+    delay = min(maximum, base * 2 ** max(0, attempts - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _job_model():
+    # Imported here: app.models imports the extensions, which import this module
+    from .models import Job
+    return Job
+
+
+class JobStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+
+class JobQueue:
+    def __init__(self, app=None):
+        self.max_attempts = 5
+        self.backoff_base = 5.0
+        self.backoff_max = 3600.0
+        self.lease = 300.0
+        self.poll_interval = 1.0
+        self.retention = 7 * 24 * 3600
+        self.stats = JobStats()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_attempts = app.config.get('JOBS_MAX_ATTEMPTS', 5)
+        self.backoff_base = app.config.get('JOBS_BACKOFF_BASE', 5.0)
+        self.backoff_max = app.config.get('JOBS_BACKOFF_MAX', 3600.0)
+        self.lease = app.config.get('JOBS_LEASE_SECONDS', 300.0)
+        self.poll_interval = app.config.get('JOBS_POLL_INTERVAL', 1.0)
+        self.retention = app.config.get('JOBS_RETENTION_SECONDS', 7 * 24 * 3600)
+        app.extensions['jobs'] = self
+        app.cli.add_command(jobs_cli)
+
+    # Function to add a job to the current transaction
+    # The job is only visible to workers once the caller commits, and is
+    # discarded with everything else if the caller rolls back. With
+    # retry_failed=False a failed job with the key is left failed (for
+    # `flask jobs retry`) rather than queued again.
+    def enqueue(self, task_name, payload=None, key=None, queue='default', delay=0, max_attempts=None,
+                retry_failed=True):
+        from .extensions import db
+        Job = _job_model()
+        insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+        statement = insert(Job).values(
+            queue=queue,
+            task=task_name,
+            payload=payload or {},
+            idempotency_key=key,
+            max_attempts=max_attempts or self.max_attempts,
+            run_at=datetime.utcnow() + timedelta(seconds=delay),
+        )
+        if key is not None:
+            # A pending job with the key already covers this work; a finished
+            # one is queued again with the new payload
+            statement = statement.on_conflict_do_update(
+                index_elements=['idempotency_key'],
+                set_={
+                    'queue': statement.excluded.queue,
+                    'task': statement.excluded.task,
+                    'payload': statement.excluded.payload,
+                    'max_attempts': statement.excluded.max_attempts,
+                    'run_at': statement.excluded.run_at,
+                    'status': QUEUED,
+                    'attempts': 0,
+                    'locked_at': None,
+                    'locked_by': None,
+                    'last_error': None,
+                    'finished_at': None,
+                },
+                where=Job.status.in_((DONE, FAILED) if retry_failed else (DONE,))
+            )
+        db.session.execute(statement)
+        self.stats.incr('enqueued')
+
+    # Function to count jobs by queue, task and status
+    # Returns [(queue, task, status, count, oldest run_at)] for the given
+    # statuses (pending jobs by default, which ix_job_pending covers; None for all)
+    def depth(self, statuses=PENDING):
+        from .extensions import db
+        Job = _job_model()
+        statement = select(Job.queue, Job.task, Job.status, func.count(), func.min(Job.run_at))
+        if statuses is not None:
+            statement = statement.where(Job.status.in_(statuses))
+        return db.session.execute(
+            statement
+            .group_by(Job.queue, Job.task, Job.status)
+            .order_by(Job.queue, Job.task, Job.status)
+        ).all()
+
+    # Function to report queue depth and job counters as metrics (see Metrics.add_collector)
+    # The depth is read from the table, so every web worker reports the same
+    # numbers; the counters are those of this process. Only pending jobs are
+    # counted, so a scrape costs as much as the backlog, not the job history
+    def collect_metrics(self):
+        from .extensions import db
+        try:
+            rows = self.depth()
+        except SQLAlchemyError as e:
+            logger.warning("Could not read the job queue depth: %s", e)
+            db.session.rollback()
+            rows = []
+        now = datetime.utcnow()
+        with self.stats._lock:
+            enqueued = self.stats.enqueued
+        return [
+            ('job_queue_depth', 'gauge', 'Queued and running jobs, by queue, task and status.',
+             [(f'queue="{queue}",task="{name}",status="{status}"', count) for queue, name, status, count, _ in rows]),
+            ('job_queue_oldest_seconds', 'gauge', 'How long the oldest due job of a queue has been waiting.',
+             [(f'queue="{queue}",task="{name}"', max(0.0, (now - oldest).total_seconds()))
+              for queue, name, status, _, oldest in rows if status == QUEUED and oldest is not None]),
+            ('jobs_enqueued_total', 'counter', 'Jobs enqueued by this process.', [('', enqueued)]),
+        ]
+
+
+class Worker:
+    # Runs jobs from the given queues (all queues when empty) until stopped
+    def __init__(self, app, queues=(), name=None):
+        self.app = app
+        self.queues = tuple(queues)
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.jobs = app.extensions['jobs']
+        self._stop = threading.Event()
+        self._last_maintenance = 0.0
+
+    def stop(self, *args):
+        self._stop.set()
+
+    # Function to run jobs until stopped, or, with burst, until none is due
+    # Returns the number of jobs run
+    def run(self, burst=False):
+        ran = 0
+        logger.info("Job worker %s started (queues: %s)", self.name, ', '.join(self.queues) or 'all')
+        while not self._stop.is_set():
+            with self.app.app_context():
+                self._maintain()
+                job = self._claim()
+                if job is not None:
+                    self._execute(job)
+                    ran += 1
+                    continue
+            if burst:
+                break
+            self._stop.wait(self.jobs.poll_interval)
+        stats = self.jobs.stats
+        logger.info("Job worker %s stopped after %s jobs (%s done, %s retried, %s failed)",
+                    self.name, ran, stats.completed, stats.retried, stats.failed)
+        return ran
+
+    def _claim(self):
+        from .extensions import db
+        Job = _job_model()
+        now = datetime.utcnow()
+        candidate = (select(Job.id)
+                     .where(Job.status == QUEUED, Job.run_at <= now)
+                     .order_by(Job.run_at, Job.id)
+                     .limit(1)
+                     .with_for_update(skip_locked=True))
+        if self.queues:
+            candidate = candidate.where(Job.queue.in_(self.queues))
+        try:
+            job = db.session.execute(
+                update(Job)
+                .where(Job.id.in_(candidate.scalar_subquery()), Job.status == QUEUED)
+                .values(status=RUNNING, locked_at=now, locked_by=self.name, attempts=Job.attempts + 1)
+                .returning(Job.id, Job.task, Job.payload, Job.attempts, Job.max_attempts),
+                execution_options={'synchronize_session': False}
+            ).first()
+            db.session.commit()
+            return job
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning("Could not claim a job: %s", e)
+            return None
+        finally:
+            db.session.remove()
+
+    def _execute(self, job):
+        from .extensions import db
+        job_id, task_name, payload, attempts, max_attempts = job
+        started = time.perf_counter()
+        try:
+            handler = _tasks.get(task_name)
+            if handler is None:
+                raise LookupError(f"Unknown task {task_name}")
+            handler(**(payload or {}))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self._failed(job, e)
+            return
+        finally:
+            db.session.remove()
+        self._finish(job_id, status=DONE, finished_at=datetime.utcnow())
+        self.jobs.stats.incr('completed')
+        logger.info("Job %s (%s) done in %.3fs", job_id, task_name, time.perf_counter() - started)
+
+    def _failed(self, job, error):
+        job_id, task_name, _, attempts, max_attempts = job
+        message = ''.join(traceback.format_exception(error))[-4000:]
+        if attempts >= max_attempts:
+            self._finish(job_id, status=FAILED, finished_at=datetime.utcnow(), last_error=message)
+            self.jobs.stats.incr('failed')
+            logger.error("Job %s (%s) failed after %s attempts: %s", job_id, task_name, attempts, error)
+            return
+        delay = backoff(attempts, self.jobs.backoff_base, self.jobs.backoff_max)
+        self._finish(job_id, status=QUEUED, run_at=datetime.utcnow() + timedelta(seconds=delay), last_error=message)
+        self.jobs.stats.incr('retried')
+        logger.warning("Job %s (%s) attempt %s/%s failed, retrying in %.0fs: %s",
+                       job_id, task_name, attempts, max_attempts, delay, error)
+
+    # Function to record a job's outcome, unless its lease was lost meanwhile
+    def _finish(self, job_id, **values):
+        from .extensions import db
+        Job = _job_model()
+        try:
+            db.session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == RUNNING, Job.locked_by == self.name)
+                .values(**values),
+                execution_options={'synchronize_session': False}
+            )
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            # The lease runs out and another worker runs the job again
+            logger.warning("Could not record the outcome of job %s: %s", job_id, e)
+        finally:
+            db.session.remove()
+
+    # Function to queue again jobs whose worker died, and delete old finished jobs
+    def _maintain(self):
+        if time.monotonic() - self._last_maintenance < MAINTENANCE_INTERVAL:
+            return
+        self._last_maintenance = time.monotonic()
+        from .extensions import db
+        Job = _job_model()
+        now = datetime.utcnow()
+        expired = (Job.status == RUNNING, Job.locked_at < now - timedelta(seconds=self.jobs.lease))
+        try:
+            requeued = db.session.execute(
+                update(Job).where(*expired, Job.attempts < Job.max_attempts)
+                .values(status=QUEUED, run_at=now, locked_at=None, locked_by=None),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            abandoned = db.session.execute(
+                update(Job).where(*expired)
+                .values(status=FAILED, finished_at=now, last_error='Lease expired on the last attempt'),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            purged = db.session.execute(
+                delete(Job).where(Job.status.in_((DONE, FAILED)),
+                                  Job.finished_at < now - timedelta(seconds=self.jobs.retention)),
+                execution_options={'synchronize_session': False}
+            ).rowcount
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning("Job queue maintenance failed: %s", e)
+            return
+        finally:
+            db.session.remove()
+        if requeued or abandoned:
+            logger.warning("Requeued %s and failed %s jobs whose lease expired", requeued, abandoned)
+        if purged:
+            logger.info("Deleted %s finished jobs", purged)
+
+
+# Function to run `processes` workers: this process forks them and restarts
+# any that crash, and stops them all on SIGTERM or SIGINT
+def run_workers(app, queues, processes, burst=False):
+    if processes <= 1:
+        worker = Worker(app, queues)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        return worker.run(burst=burst)
+
+    stopping = threading.Event()
+    children = {}
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            worker = Worker(app, queues)
+            signal.signal(signal.SIGTERM, worker.stop)
+            signal.signal(signal.SIGINT, worker.stop)
+            code = 1
+            try:
+                worker.run(burst=burst)
+                code = 0
+            except Exception:
+                logger.exception("Job worker crashed")
+            finally:
+                # os._exit skips atexit handlers, which would flush the log queue
+                stop_logging()
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def forward(signum, frame):
+        stopping.set()
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for _ in range(processes):
+        spawn()
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.pop(pid, None)
+        if not stopping.is_set() and os.waitstatus_to_exitcode(status) != 0:
+            logger.error("Job worker %s exited with status %s; starting another", pid, os.waitstatus_to_exitcode(status))
+            # Do not spin if workers die on startup (database down)
+            time.sleep(1)
+            spawn()
+    return None
+
+
+jobs_cli = AppGroup('jobs', help='Run and inspect background jobs.')
+
+
+@jobs_cli.command('work')
+@click.option('--queue', '-q', 'queues', multiple=True, help='Queue to take jobs from (repeatable; default: all).')
+@click.option('--processes', '-p', default=1, show_default=True, help='Worker processes to run.')
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+def work_command(queues, processes, burst):
+    """Run jobs until stopped."""
+    run_workers(current_app._get_current_object(), queues, processes, burst=burst)
+
+
+@jobs_cli.command('stats')
+@click.option('--all', 'show_all', is_flag=True, help='Count finished jobs too (reads the whole table).')
+def stats_command(show_all):
+    """Show the number of pending jobs by queue, task and status."""
+    rows = current_app.extensions['jobs'].depth(None if show_all else PENDING)
+    if not rows:
+        click.echo('No jobs.')
+    for queue, name, status, count, oldest in rows:
+        click.echo(f'{queue:<12} {name:<28} {status:<8} {count:>8}  oldest run_at {oldest:%Y-%m-%d %H:%M:%S}')
+
+
+@jobs_cli.command('retry')
+@click.option('--task', 'task_name', help='Only retry jobs of this task.')
+def retry_command(task_name):
+    """Queue failed jobs again."""
+    from .extensions import db
+    Job = _job_model()
+    statement = (update(Job).where(Job.status == FAILED)
+                 .values(status=QUEUED, attempts=0, run_at=datetime.utcnow(), finished_at=None))
+    if task_name:
+        statement = statement.where(Job.task == task_name)
+    count = db.session.execute(statement, execution_options={'synchronize_session': False}).rowcount
+    db.session.commit()
+    click.echo(f'Queued {count} failed jobs again.')
@@ -0,0 +1,203 @@
+# Non-blocking structured logging
+# Request threads never write to stdout themselves: the root logger has a
+# single QueueHandler that puts records on a bounded in-memory queue, and a
+# QueueListener thread formats them (as one JSON object per line, or plain
+# text for local development) and writes them out.
+#
+# Before a record is queued it is
+#   - sampled: INFO/DEBUG records of noisy loggers can be kept at a rate
+#     (LOG_SAMPLING = "app.routes=0.1,werkzeug=0.01"); warnings and errors are always kept
+#   - truncated: messages longer than LOG_MAX_MESSAGE_LENGTH are cut
+# and when the queue is full the record is dropped and counted rather than
+# blocking the request.
+#
+# Call sites should use lazy formatting, logger.info("Created post %s", post_id),
+# so nothing is formatted for records that are filtered out.
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+DEFAULT_MAX_MESSAGE_LENGTH = 2000
+DEFAULT_QUEUE_SIZE = 10000
+
+# Attributes every LogRecord has; anything else was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+def _truncate(text, limit):
+    if limit and len(text) > limit:
+        return f'{text[:limit]}... [truncated {len(text) - limit} chars]'
+    return text
+
+
+# Function to parse "logger=rate,logger=rate" into a dict of sampling rates
+def parse_sampling(value):
+    rates = {}
+    for item in (value or '').split(','):
+        if not item.strip():
+            continue
+        name, _, rate = item.partition('=')
+        rates[name.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+# Keeps a fraction of the INFO/DEBUG records of selected loggers
+# A rate set for "app.routes" also applies to "app.routes.post_routes"
+class SamplingFilter(logging.Filter):
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = rates or {}
+        self._resolved = {}
+
+    def _rate(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            prefix = name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition('.')[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+# Queues records without blocking; full queue means the record is dropped
+class NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, log_queue, max_message_length=DEFAULT_MAX_MESSAGE_LENGTH):
+        super().__init__(log_queue)
+        self.max_message_length = max_message_length
+        self.dropped = 0
+        self._exception_formatter = logging.Formatter()
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Resolve the message in the calling thread, since its arguments may
+        # change once the call returns; the rest of the formatting is left to
+        # the listener thread
+        record = copy.copy(record)
+        record.msg = _truncate(record.getMessage(), self.max_message_length)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+# Formats a record as one JSON object per line
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        elif record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+# Function to set up the logging pipeline from the app config
+# Safe to call for every app created in the process: the queue handler and
+# listener are created once and reconfigured afterwards
+def configure_logging(app):
+    global _handler, _listener
+
+    config = app.config
+    level = config.get('LOG_LEVEL', 'INFO')
+    formatter = JsonFormatter() if config.get('LOG_FORMAT', 'json') == 'json' else logging.Formatter(TEXT_FORMAT)
+
+    with _lock:
+        if _handler is None:
+            log_queue = queue.Queue(maxsize=config.get('LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE))
+            output = logging.StreamHandler(sys.stdout)
+            _handler = NonBlockingQueueHandler(log_queue)
+            _listener = QueueListener(log_queue, output, respect_handler_level=False)
+            atexit.register(stop_logging)
+        if _listener._thread is None:
+            _listener.start()
+
+        _handler.max_message_length = config.get('LOG_MAX_MESSAGE_LENGTH', DEFAULT_MAX_MESSAGE_LENGTH)
+        _handler.filters = [SamplingFilter(parse_sampling(config.get('LOG_SAMPLING')))]
+        for output in _listener.handlers:
+            output.setFormatter(formatter)
+
+        root = logging.getLogger()
+        # This pipeline is the only place records are written
+        for existing in list(root.handlers):
+            if existing is not _handler:
+                root.removeHandler(existing)
+        if _handler not in root.handlers:
+            root.addHandler(_handler)
+        root.setLevel(level)
+
+    app.extensions['logging'] = _handler
+
+
+# Function to restart the pipeline in a forked worker
+# Only the forking thread survives a fork: the listener thread is gone, and the
+# queue and lock may have been held by it. The child gets a fresh queue and
+# its own listener writing to the same outputs.
+def _after_fork_in_child():
+    global _lock, _listener
+    _lock = threading.Lock()
+    if _handler is None:
+        return
+    log_queue = queue.Queue(maxsize=_handler.queue.maxsize)
+    _handler.queue = log_queue
+    _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=False)
+    _listener.start()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# Function to flush queued records and stop the listener thread
+def stop_logging():
+    with _lock:
+        if _listener is not None and _listener._thread is not None:
+            try:
+                _listener.stop()
+            except queue.Full:
+                # The listener thread is a daemon; queued records are lost with it
+                pass
+
+
+# Function to report dropped records as a metric (see Metrics.add_collector)
+def collect_metrics():
+    dropped = _handler.dropped if _handler is not None else 0
+    return [('log_records_dropped_total', 'counter', 'Log records dropped because the logging queue was full.', [('', dropped)])]
@@ -0,0 +1,302 @@
+# Uploaded images: content-addressed storage and resized variants
+# Originals are stored under MEDIA_ROOT by the SHA-256 of their bytes,
+#   <root>/ab/ab12...ef.jpg
+# so the same image uploaded twice is stored once, and a file never changes
+# once written: it can be cached by clients and CDNs forever. Each original
+# gets WebP variants, one per width in MEDIA_VARIANT_WIDTHS (never upscaled),
+#   <root>/ab/ab12...ef/w320.webp
+# made by the job workers after the upload (see app/jobs.py), so the request
+# does not wait for them. Requests for a variant that is not there yet (still
+# being made, or Pillow is not installed) are redirected to the original, and
+# schedule it again: these are anonymous GETs, so each process enqueues the
+# job of an image at most once a minute, and never re-runs one that failed.
+# That write is an insert ignored on conflict while the job is pending.
+#
+# Post.image_url holds the original's URL; image_variants() derives the
+# variant URLs from it for the post responses.
+#
+# Variants need Pillow (pip install Pillow); without it only originals are served.
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
+from .jobs import task
+
+logger = logging.getLogger(__name__)
+
+# File signatures of the accepted formats: extension, content type, magic bytes
+IMAGE_TYPES = (
+    ('jpg', 'image/jpeg', (b'\xff\xd8\xff',)),
+    ('png', 'image/png', (b'\x89PNG\r\n\x1a\n',)),
+    ('gif', 'image/gif', (b'GIF87a', b'GIF89a')),
+    ('webp', 'image/webp', (b'RIFF',)),
+)
+
+CHUNK_SIZE = 64 * 1024
+# Bytes needed to recognize every accepted format (WebP's is in bytes 8-12)
+SNIFF_SIZE = 16
+
+# Seconds before this process enqueues the variants of the same original again
+RESCHEDULE_AFTER = 60
+# Originals remembered as recently scheduled, least recently scheduled dropped first
+MAX_SCHEDULED = 10000
+
+_digest = re.compile(r'^[0-9a-f]{64}$')
+_original_name = re.compile(r'^(?P<digest>[0-9a-f]{64})\.(?P<ext>jpg|png|gif|webp)$')
+_variant_name = re.compile(r'^w(?P<width>\d+)\.webp$')
+_original_url = re.compile(r'/(?P<shard>[0-9a-f]{2})/(?P<digest>[0-9a-f]{64})\.(?P<ext>jpg|png|gif|webp)$')
+
+
+class UploadError(Exception):
+    # Raised for uploads that are not an accepted image (400) or are too large (413)
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Function to tell an image's type from its first bytes
+# Returns (extension, content type), or None for anything else
+def sniff_image_type(head):
+    for extension, content_type, signatures in IMAGE_TYPES:
+        if any(head.startswith(signature) for signature in signatures):
+            if extension == 'webp' and head[8:12] != b'WEBP':
+                continue
+            return extension, content_type
+    return None
+
+
+# Runs in a job worker: writes the missing variants of one original
+# Returns the number of files written
+def make_variants(original_path, variant_dir, widths, quality):
+    from PIL import Image, ImageOps
+
+    os.makedirs(variant_dir, exist_ok=True)
+    written = 0
+    with Image.open(original_path) as image:
+        # Phones store the orientation separately; apply it before resizing
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode in ('LA', 'P', 'PA') else 'RGB')
+        for width in widths:
+            target = os.path.join(variant_dir, f'w{width}.webp')
+            if os.path.exists(target):
+                continue
+            variant = image.copy()
+            if variant.width > width:
+                variant.thumbnail((width, variant.height), Image.LANCZOS)
+            # Written under a temporary name so a half-written file is never served
+            partial = f'{target}.{os.getpid()}.{threading.get_ident()}.tmp'
+            variant.save(partial, 'WEBP', quality=quality, method=4)
+            os.replace(partial, target)
+            written += 1
+    return written
+
+
+class MediaStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.uploads = 0
+        self.duplicates = 0
+        self.scheduled = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+
+class Media:
+    def __init__(self, app=None):
+        self.root = None
+        self.url = '/media'
+        self.widths = ()
+        self.quality = 80
+        self.max_upload = 10 * 1024 * 1024
+        self.max_age = 365 * 24 * 3600
+        self.stats = MediaStats()
+        # digest -> time it was last scheduled by this process
+        self._scheduled = OrderedDict()
+        self._scheduled_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.root = app.config['MEDIA_ROOT']
+        self.url = app.config.get('MEDIA_URL', '/media').rstrip('/')
+        self.widths = tuple(sorted(app.config.get('MEDIA_VARIANT_WIDTHS', (320, 640, 1280))))
+        self.quality = app.config.get('MEDIA_VARIANT_QUALITY', 80)
+        self.max_upload = app.config.get('MEDIA_MAX_UPLOAD_BYTES', 10 * 1024 * 1024)
+        self.max_age = app.config.get('MEDIA_MAX_AGE', 365 * 24 * 3600)
+        app.extensions['media'] = self
+
+    def original_path(self, digest, extension):
+        return os.path.join(self.root, digest[:2], f'{digest}.{extension}')
+
+    def variant_dir(self, digest):
+        return os.path.join(self.root, digest[:2], digest)
+
+    def original_url(self, digest, extension):
+        return f'{self.url}/{digest[:2]}/{digest}.{extension}'
+
+    def variant_urls(self, digest):
+        return {str(width): f'{self.url}/{digest[:2]}/{digest}/w{width}.webp' for width in self.widths}
+
+    # Function to store an uploaded image from a binary stream
+    # The bytes are hashed while they are copied to a temporary file, which is
+    # then moved to its content address. Returns (digest, extension, content
+    # type, size, created); created is False when the image was already stored.
+    def save(self, stream):
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        image_type = None
+        fd, partial = tempfile.mkstemp(dir=self.root, suffix='.upload')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if image_type is None:
+                        # A stream may return fewer bytes than asked for; the
+                        # type is only decided on SNIFF_SIZE bytes, or the whole upload
+                        head += chunk[:SNIFF_SIZE - len(head)]
+                        if head and (len(head) >= SNIFF_SIZE or not chunk):
+                            image_type = sniff_image_type(head)
+                            if image_type is None:
+                                raise UploadError('Unsupported image type; use JPEG, PNG, GIF or WebP')
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_upload:
+                        raise UploadError(f'Image is larger than {self.max_upload} bytes', 413)
+                    digest.update(chunk)
+                    out.write(chunk)
+            if image_type is None:
+                raise UploadError('Empty upload')
+
+            extension, content_type = image_type
+            digest = digest.hexdigest()
+            path = self.original_path(digest, extension)
+            created = not os.path.exists(path)
+            if created:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.chmod(partial, 0o644)
+                os.replace(partial, path)
+        finally:
+            if os.path.exists(partial):
+                os.unlink(partial)
+
+        self.stats.incr('uploads' if created else 'duplicates')
+        return digest, extension, content_type, size, created
+
+    # Function to have the missing variants of an original made by a job worker
+    # The job is keyed by the digest, so uploads and requests for the same
+    # original add one job between them. Returns False when they cannot be
+    # scheduled now; a later request for a variant schedules them again
+    def schedule_variants(self, digest, extension):
+        if not self.widths or not variants_supported():
+            return False
+        # Requests for each missing variant of an image come in together;
+        # one enqueue per process covers them
+        now = time.monotonic()
+        with self._scheduled_lock:
+            if now - self._scheduled.get(digest, -RESCHEDULE_AFTER) < RESCHEDULE_AFTER:
+                return True
+        from .extensions import db
+        try:
+            # A failed job is left for `flask jobs retry`; requests for a
+            # variant that cannot be made must not run it again and again
+            current_app.extensions['jobs'].enqueue(
+                'images.make_variants', {'digest': digest, 'extension': extension},
+                key=f'variants:{digest}', queue='images', retry_failed=False)
+            db.session.commit()
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.warning("Could not schedule variants of image %s: %s", digest, e)
+            return False
+        with self._scheduled_lock:
+            self._scheduled[digest] = now
+            self._scheduled.move_to_end(digest)
+            while len(self._scheduled) > MAX_SCHEDULED:
+                self._scheduled.popitem(last=False)
+        self.stats.incr('scheduled')
+        return True
+
+    # Function to locate a stored original by digest, whatever its extension
+    def find_original(self, digest):
+        for extension, _, _ in IMAGE_TYPES:
+            if os.path.exists(self.original_path(digest, extension)):
+                return extension
+        return None
+
+    # Function to report the upload counters as metrics (see Metrics.add_collector)
+    # Variant jobs are reported with the job queue (job_queue_depth{queue="images"})
+    def collect_metrics(self):
+        stats = self.stats
+        with stats._lock:
+            return [
+                ('images_uploaded_total', 'counter', 'Images stored (duplicates of a stored image excluded).', [('', stats.uploads)]),
+                ('images_duplicate_uploads_total', 'counter', 'Uploads of an image that was already stored.', [('', stats.duplicates)]),
+                ('image_variants_scheduled_total', 'counter', 'Variant jobs enqueued by this process.', [('', stats.scheduled)]),
+            ]
+
+
+# Job: make the missing variants of an original (see Media.schedule_variants)
+@task('images.make_variants')
+def make_variants_job(digest, extension):
+    media = current_app.extensions['media']
+    if not variants_supported():
+        raise RuntimeError("Image variants require the Pillow package (pip install Pillow)")
+    written = make_variants(media.original_path(digest, extension), media.variant_dir(digest),
+                            media.widths, media.quality)
+    logger.info("Wrote %s variants of image %s", written, digest)
+
+
+_pillow = None
+
+
+# Function to tell whether Pillow is available to make variants
+def variants_supported():
+    global _pillow
+    if _pillow is None:
+        try:
+            import PIL  # noqa: F401
+            _pillow = True
+        except ImportError:
+            logger.warning("Pillow is not installed; images are served without variants (pip install Pillow)")
+            _pillow = False
+    return _pillow
+
+
+# Function to parse a media file name: an original "<digest>.<ext>"
+# Returns (digest, extension) or None
+def parse_original_name(name):
+    match = _original_name.match(name)
+    return (match['digest'], match['ext']) if match else None
+
+
+def is_digest(value):
+    return _digest.match(value) is not None
+
+
+# Function to parse a variant file name "w<width>.webp" into its width, or None
+def parse_variant_name(name):
+    match = _variant_name.match(name)
+    return int(match['width']) if match else None
+
+
+# Function to derive the variant URLs of a post image
+# Returns {width: url} for images uploaded here, None for other image URLs
+def image_variants(image_url):
+    if not image_url:
+        return None
+    match = _original_url.search(image_url)
+    if match is None or match['shard'] != match['digest'][:2]:
+        return None
+    return current_app.extensions['media'].variant_urls(match['digest'])
@@ -0,0 +1,231 @@
+# Per-request metrics in the Prometheus text format
+# Metrics records, for every endpoint, the request duration, the number of SQL
+# statements and the time spent in them (from SQLAlchemy engine events), the
+# response size and the status code, and serves them on /metrics.
+#
+# Recording is kept cheap: each endpoint's series are created once, with their
+# label strings, when the app is set up; a request only looks its series up by
+# endpoint name and increments bucket counters. Strings are only built when
+# /metrics is scraped. Values are per process; with several workers, scrape
+# each worker or aggregate in Prometheus.
+
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from flask import request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_TIME_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SQL_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+UNMATCHED = '<unmatched>'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        if value == float('inf'):
+            return '+Inf'
+        return repr(value)
+    return str(value)
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # One counter per bucket plus +Inf; made cumulative when exposed
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{_format_value(float(bound))}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {_format_value(self.total)}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+
+# All series for one endpoint
+class EndpointMetrics:
+    __slots__ = ('labels', 'lock', 'duration', 'sql_count', 'sql_time', 'response_size', 'statuses')
+
+    def __init__(self, endpoint, methods):
+        self.labels = f'endpoint="{_escape(endpoint)}",method="{_escape(methods)}"'
+        self.lock = threading.Lock()
+        self.duration = Histogram(DURATION_BUCKETS)
+        self.sql_count = Histogram(SQL_COUNT_BUCKETS)
+        self.sql_time = Histogram(SQL_TIME_BUCKETS)
+        self.response_size = Histogram(SIZE_BUCKETS)
+        self.statuses = {}
+
+    def record(self, duration, sql_count, sql_time, size, status):
+        with self.lock:
+            self.duration.observe(duration)
+            self.sql_count.observe(sql_count)
+            self.sql_time.observe(sql_time)
+            if size is not None:
+                self.response_size.observe(size)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+
+# State of the request being handled; one small object per request
+class _RequestTimer:
+    __slots__ = ('started', 'sql_count', 'sql_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info['metrics_query_started'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timer = _current.get()
+    if timer is None:
+        return
+    started = conn.info.pop('metrics_query_started', None)
+    timer.sql_count += 1
+    if started is not None:
+        timer.sql_time += time.perf_counter() - started
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.server_timing = False
+        self._endpoints = {}
+        self._endpoints_lock = threading.Lock()
+        self._collectors = []
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.server_timing = app.config.get('METRICS_SERVER_TIMING', False)
+        app.extensions['metrics'] = self
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+
+        # Statements from every engine are counted, but only while a request is being handled
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            self._listening = True
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule(app.config.get('METRICS_PATH', '/metrics'), 'metrics', self.metrics_view, methods=['GET'])
+
+    # Function to create the series of every endpoint registered so far
+    # Called once the blueprints are registered; later endpoints are added on first use
+    def register_endpoints(self, app):
+        for rule in app.url_map.iter_rules():
+            self._series(rule.endpoint, rule.methods)
+        self._series(UNMATCHED, ())
+
+    def _series(self, endpoint, methods=None):
+        series = self._endpoints.get(endpoint)
+        if series is None:
+            with self._endpoints_lock:
+                series = self._endpoints.get(endpoint)
+                if series is None:
+                    shown = sorted(m for m in (methods or ()) if m not in ('HEAD', 'OPTIONS'))
+                    series = self._endpoints[endpoint] = EndpointMetrics(endpoint, ','.join(shown))
+        return series
+
+    # Function to add a source of extra samples to /metrics
+    # `collect` returns (name, type, help, [(labels, value), ...]) tuples
+    def add_collector(self, collect):
+        if collect not in self._collectors:
+            self._collectors.append(collect)
+
+    def _before_request(self):
+        _current.set(_RequestTimer())
+
+    def _after_request(self, response):
+        timer = _current.get()
+        if timer is None or request.endpoint == 'metrics':
+            return response
+        duration = time.perf_counter() - timer.started
+
+        endpoint = request.endpoint or UNMATCHED
+        series = self._endpoints.get(endpoint)
+        if series is None:
+            rule = request.url_rule
+            series = self._series(endpoint, rule.methods if rule else None)
+        # Streamed responses have no length up front; their size is not recorded
+        size = None if response.is_streamed else response.calculate_content_length()
+        series.record(duration, timer.sql_count, timer.sql_time, size, response.status_code)
+
+        if self.server_timing:
+            response.headers.add('Server-Timing', f'app;dur={duration * 1000:.1f}')
+            response.headers.add('Server-Timing', f'db;dur={timer.sql_time * 1000:.1f};desc="{timer.sql_count} queries"')
+        return response
+
+    def _teardown_request(self, exc=None):
+        _current.set(None)
+
+    # Function to render every metric in the Prometheus text format
+    def render(self):
+        with self._endpoints_lock:
+            endpoints = list(self._endpoints.values())
+
+        lines = []
+
+        def histogram(name, help_text, attribute):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} histogram')
+            for series in endpoints:
+                with series.lock:
+                    lines.extend(getattr(series, attribute).samples(name, series.labels))
+
+        histogram('http_request_duration_seconds', 'Time to handle a request, until the response headers are ready.', 'duration')
+        histogram('http_request_sql_statements', 'SQL statements run while handling a request.', 'sql_count')
+        histogram('http_request_sql_duration_seconds', 'Time spent in SQL statements while handling a request.', 'sql_time')
+        histogram('http_response_size_bytes', 'Size of response bodies (streamed responses excluded).', 'response_size')
+
+        lines.append('# HELP http_requests_total Requests handled, by status code.')
+        lines.append('# TYPE http_requests_total counter')
+        for series in endpoints:
+            with series.lock:
+                statuses = sorted(series.statuses.items())
+            for status, count in statuses:
+                lines.append(f'http_requests_total{{{series.labels},status="{status}"}} {count}')
+
+        for collect in self._collectors:
+            for name, metric_type, help_text, samples in collect():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f'{name}{{{labels}}} {_format_value(value)}' if labels else f'{name} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), content_type=CONTENT_TYPE)
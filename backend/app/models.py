@@ -17,10 +17,74 @@ class Post(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    # Plain-text teaser of the content, shown in listings instead of the full text
+    excerpt = db.Column(db.String(300))
     image_url = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    # Author of the post; load it with joinedload() where it is needed so
+    # listings do not issue one extra query per row
+    author = db.relationship('User', backref=db.backref('posts', lazy='dynamic'))
+
     def __repr__(self):
         return f'<Post {self.title}>'
+
+
+# Indexes for the keyset-paginated listings, which order by (created_at, id)
+# newest first: the global feed, and one author's posts
+db.Index('ix_post_created_at_id', Post.created_at.desc(), Post.id.desc())
+db.Index('ix_post_user_id_created_at_id', Post.user_id, Post.created_at.desc(), Post.id.desc())
+
+
+# Background job (see app/jobs.py)
+# A row is added in the same transaction as the write that needs the work, so
+# the job exists exactly when the write was committed. Workers claim queued
+# rows with FOR UPDATE SKIP LOCKED and mark them done, or queue them again
+# with a backoff until max_attempts is reached.
+class Job(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    queue = db.Column(db.String(50), nullable=False, default='default')
+    task = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    # Enqueueing a job with the key of a pending one does nothing (see JobQueue.enqueue)
+    idempotency_key = db.Column(db.String(200), unique=True)
+    # queued, running, done or failed
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    locked_by = db.Column(db.String(100))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.task} {self.status}>'
+
+
+# Workers look for the next due job of a queue
+db.Index('ix_job_queue_status_run_at', Job.queue, Job.status, Job.run_at)
+# Queue depth metrics count pending jobs only (see JobQueue.depth); a partial
+# index holds just those rows, however many finished jobs the table keeps
+db.Index('ix_job_pending', Job.queue, Job.task, Job.status, Job.run_at,
+         postgresql_where=Job.status.in_(('queued', 'running')),
+         sqlite_where=Job.status.in_(('queued', 'running')))
+
+
+# Revoked token (see app/revocation.py)
+# One row per logged-out token, kept until the token would have expired anyway
+class TokenBlocklist(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), unique=True, nullable=False)
+    token_type = db.Column(db.String(16), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Workers read the rows revoked since their last refresh
+    revoked_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    # When the token expires; NULL for tokens that never do
+    expires_at = db.Column(db.DateTime, index=True)
+
+    def __repr__(self):
+        return f'<TokenBlocklist {self.jti}>'
@@ -0,0 +1,47 @@
+# Query counting helpers
+# Used to check how many SQL statements a piece of code runs, so N+1 query
+# regressions in the service layer get caught before they reach production.
+
+from contextlib import contextmanager
+from sqlalchemy import event
+from .extensions import db
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append(statement)
+
+
+class QueryCountMismatch(AssertionError):
+    pass
+
+
+# Context manager that counts statements sent to the engine while it is active
+# Must be used inside an application context when no engine is given.
+@contextmanager
+def count_queries(engine=None):
+    engine = engine or db.engine
+    counter = QueryCounter()
+    event.listen(engine, 'before_cursor_execute', counter._before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, 'before_cursor_execute', counter._before_cursor_execute)
+
+
+# Context manager that raises QueryCountMismatch if the wrapped block does not
+# run exactly `expected` statements
+@contextmanager
+def assert_num_queries(expected, engine=None):
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count != expected:
+        statements = '\n'.join(f'  {i + 1}. {s}' for i, s in enumerate(counter.statements))
+        raise QueryCountMismatch(
+            f'Expected {expected} queries, got {counter.count}:\n{statements}'
+        )
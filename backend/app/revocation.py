@@ -0,0 +1,289 @@
+# Token revocation
+# POST /api/auth/logout adds the token's jti to the token_blocklist table.
+# Checking that table on every authenticated request would add a query to
+# requests that otherwise need none (the profile is served from the token
+# claims), so each worker process keeps the revoked jtis in memory instead and
+# answers the check from there.
+#
+# A background thread per process loads the unexpired revocations once, then
+# every REVOCATION_REFRESH_INTERVAL seconds reads only the rows revoked since
+# its last read. A token revoked through one worker is rejected by that worker
+# at once, and by the others after their next refresh. The thread reads over
+# a connection of its own, outside the app's pool, like the health prober.
+#
+# A worker whose refresher has not read the table for REVOCATION_STALE_AFTER
+# seconds (the database is unreachable, the thread is stuck) could be missing
+# revocations made through other workers, so it checks tokens in the database
+# until a refresh succeeds again; if the database cannot answer either, the
+# request fails rather than being let through on the old set.
+#
+# Revocations are kept only until the token would have expired anyway, in
+# memory and in the table (a job deletes expired rows), so the set stays as
+# small as the number of tokens revoked within JWT_ACCESS_TOKEN_EXPIRES.
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, delete, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.pool import StaticPool
+from .database import engine_options
+from .jobs import task
+
+logger = logging.getLogger(__name__)
+
+# Rows committed out of revoked_at order (a slow transaction, clock skew
+# between hosts) are still read if they are at most this much older
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def _token_model():
+    # Imported here: app.models imports the extensions, which import this module
+    from .models import TokenBlocklist
+    return TokenBlocklist
+
+
+def _expires_at(jwt_payload):
+    exp = jwt_payload.get('exp')
+    return datetime.utcfromtimestamp(exp) if exp is not None else None
+
+
+class RevocationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.revoked = 0
+        self.rejected = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.fallbacks = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+
+class Revocations:
+    def __init__(self, app=None):
+        self.refresh_interval = 5.0
+        self.timeout = 2.0
+        self.stale_after = 15.0
+        self.purge_delay = 3600
+        self.stats = RevocationStats()
+        # jti -> expiry (datetime, or None for tokens that do not expire)
+        self._revoked = {}
+        self._app = None
+        self._lock = threading.Lock()
+        self._revoked_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._loaded = threading.Event()
+        # time.monotonic() of the last successful refresh
+        self._refreshed_at = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.refresh_interval = app.config.get('REVOCATION_REFRESH_INTERVAL', 5.0)
+        self.timeout = app.config.get('REVOCATION_LOAD_TIMEOUT', 2.0)
+        self.stale_after = app.config.get('REVOCATION_STALE_AFTER', 3 * self.refresh_interval)
+        self.purge_delay = app.config.get('REVOCATION_PURGE_DELAY', 3600)
+        # A refresher started for another app (tests, benchmarks) must not answer for this one
+        self.stop()
+        self._app = app
+        app.extensions['revocations'] = self
+        app.before_request(self._ensure_running)
+
+    # Function to start the refresher thread in this process if it is not running
+    # A forked worker does not inherit the parent's thread, so the pid is checked too
+    def _ensure_running(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._loaded = threading.Event()
+            self._refreshed_at = None
+            self._revoked = {}
+            thread = threading.Thread(target=self._run, args=(self._stop, self._loaded),
+                                      name='token-revocations', daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+
+    # Function to build the refresher's engine: one connection of its own,
+    # except for an in-memory SQLite database, which only the app's engine can see
+    def _engine(self):
+        from .extensions import db
+        with self._app.app_context():
+            engine = db.engine
+        url = engine.url
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            return engine, False
+        connect_args = dict(engine_options(self._app.config, url).get('connect_args', {}))
+        return create_engine(url, poolclass=StaticPool, connect_args=connect_args), True
+
+    def _run(self, stop, loaded):
+        engine = owned = None
+        since = None
+        failing = False
+        try:
+            while not stop.is_set():
+                try:
+                    if engine is None:
+                        engine, owned = self._engine()
+                    since = self._refresh(engine, since)
+                    self._refreshed_at = time.monotonic()
+                    loaded.set()
+                    self.stats.incr('refreshes')
+                    if failing:
+                        logger.info("Revoked tokens are being refreshed again")
+                    failing = False
+                except Exception as e:
+                    self.stats.incr('refresh_failures')
+                    # Logged when refreshes start failing, not on every attempt;
+                    # a worker that cannot load at all checks tokens in the database
+                    if loaded.is_set() and not failing:
+                        logger.warning("Could not refresh revoked tokens: %s", str(e).splitlines()[0])
+                    failing = True
+                    if owned:
+                        # Reconnect on the next refresh rather than reuse a broken connection
+                        engine.dispose()
+                stop.wait(self.refresh_interval)
+        finally:
+            if owned:
+                engine.dispose()
+
+    # Function to read revocations into memory: all unexpired ones on the first
+    # call, then those revoked since `since`. Returns the new `since`
+    def _refresh(self, engine, since):
+        TokenBlocklist = _token_model()
+        now = datetime.utcnow()
+        statement = select(TokenBlocklist.jti, TokenBlocklist.expires_at, TokenBlocklist.revoked_at)
+        if since is None:
+            statement = statement.where(or_(TokenBlocklist.expires_at.is_(None), TokenBlocklist.expires_at > now))
+        else:
+            statement = statement.where(TokenBlocklist.revoked_at >= since - REFRESH_OVERLAP)
+        with engine.connect() as conn:
+            rows = conn.execute(statement).all()
+
+        with self._revoked_lock:
+            revoked = self._revoked
+            if any(expires_at is not None and expires_at <= now for expires_at in revoked.values()):
+                # Replaced rather than changed in place, so readers never see it mid-update
+                revoked = {jti: expires_at for jti, expires_at in revoked.items()
+                           if expires_at is None or expires_at > now}
+            for jti, expires_at, revoked_at in rows:
+                if expires_at is None or expires_at > now:
+                    revoked[jti] = expires_at
+                if since is None or revoked_at > since:
+                    since = revoked_at
+            self._revoked = revoked
+        return since or now
+
+    # Function to tell whether the in-memory set was refreshed within REVOCATION_STALE_AFTER
+    def _fresh(self):
+        refreshed_at = self._refreshed_at
+        return refreshed_at is not None and time.monotonic() - refreshed_at <= self.stale_after
+
+    # Function to tell whether token checks in this process are answered from memory
+    def ready(self):
+        return self._pid == os.getpid() and self._loaded.is_set() and self._fresh()
+
+    # Function for the async serving path, whose token checks must not block
+    # the event loop: starts the refresher and waits for its first load in a
+    # thread. Returns ready()
+    async def wait_ready(self):
+        if self.ready():
+            return True
+        self._ensure_running()
+        await asyncio.to_thread(self._loaded.wait, self.timeout)
+        return self.ready()
+
+    # Function to stop the refresher thread of this process
+    def stop(self):
+        self._stop.set()
+        self._pid = None
+
+    # Function to tell whether a token has been revoked (the token_in_blocklist_loader)
+    # Answered from memory; a worker whose first load has not finished within
+    # REVOCATION_LOAD_TIMEOUT, or whose set is stale, asks the database
+    def is_revoked(self, jwt_header, jwt_payload):
+        jti = jwt_payload.get('jti')
+        if jti is None:
+            return False
+        if not self._loaded.is_set():
+            self._ensure_running()
+            if not self._loaded.wait(self.timeout):
+                return self._is_revoked_in_database(jti)
+        if not self._fresh():
+            # A database error here fails the request (fails closed)
+            return self._is_revoked_in_database(jti)
+        revoked = jti in self._revoked
+        if revoked:
+            self.stats.incr('rejected')
+        return revoked
+
+    def _is_revoked_in_database(self, jti):
+        from .extensions import db
+        TokenBlocklist = _token_model()
+        self.stats.incr('fallbacks')
+        revoked = db.session.execute(select(TokenBlocklist.id).where(TokenBlocklist.jti == jti)).first() is not None
+        if revoked:
+            self.stats.incr('rejected')
+        return revoked
+
+    # Function to revoke a token
+    # Adds the row and the job deleting it once expired to the current
+    # transaction; the caller commits, then calls revoked() to apply it here
+    def revoke(self, jwt_payload):
+        from .extensions import db, jobs
+        TokenBlocklist = _token_model()
+        insert = postgresql.insert if db.engine.dialect.name == 'postgresql' else sqlite.insert
+        db.session.execute(
+            insert(TokenBlocklist).values(
+                jti=jwt_payload['jti'],
+                token_type=jwt_payload.get('type', 'access'),
+                user_id=int(jwt_payload['sub']),
+                revoked_at=datetime.utcnow(),
+                expires_at=_expires_at(jwt_payload),
+            ).on_conflict_do_nothing(index_elements=['jti'])
+        )
+        # One pending purge covers every logout until it runs
+        jobs.enqueue('auth.purge_revoked_tokens', key='auth:purge-revoked-tokens', delay=self.purge_delay)
+
+    # Function to apply a committed revocation to this process at once
+    def revoked(self, jwt_payload):
+        with self._revoked_lock:
+            self._revoked[jwt_payload['jti']] = _expires_at(jwt_payload)
+        self.stats.incr('revoked')
+
+    # Function to report revocation counters as metrics (see Metrics.add_collector)
+    def collect_metrics(self):
+        stats = self.stats
+        refreshed_at = self._refreshed_at
+        age = time.monotonic() - refreshed_at if refreshed_at is not None else 0.0
+        with stats._lock:
+            return [
+                ('tokens_revoked', 'gauge', 'Unexpired revoked tokens known to this process.', [('', len(self._revoked))]),
+                ('tokens_revoked_total', 'counter', 'Tokens revoked through this process.', [('', stats.revoked)]),
+                ('tokens_rejected_total', 'counter', 'Requests rejected because their token was revoked.', [('', stats.rejected)]),
+                ('token_revocation_refreshes_total', 'counter', 'Reads of new revocations from the database.', [('', stats.refreshes)]),
+                ('token_revocation_refresh_failures_total', 'counter', 'Reads of new revocations that failed.', [('', stats.refresh_failures)]),
+                ('token_revocation_age_seconds', 'gauge', 'Seconds since the last successful read of new revocations.', [('', age)]),
+                ('token_revocation_fallbacks_total', 'counter', 'Token checks sent to the database before the first load or while stale.', [('', stats.fallbacks)]),
+            ]
+
+
+# Job: delete revocations of tokens that have expired since (see Revocations.revoke)
+@task('auth.purge_revoked_tokens')
+def purge_revoked_tokens():
+    from .extensions import db
+    TokenBlocklist = _token_model()
+    deleted = db.session.execute(
+        delete(TokenBlocklist).where(TokenBlocklist.expires_at < datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    ).rowcount
+    logger.info("Deleted %s expired token revocations", deleted)
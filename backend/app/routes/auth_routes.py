@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify # Blueprint for authentication routes, request for getting JSON, jsonify for returning JSON
-from flask_jwt_extended import jwt_required, get_jwt_identity # Import for JWT authentication
-from ..services.auth_service import register_user, login_user, get_user_by_id # Import authentication services
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request # Import for JWT authentication
+from ..services.auth_service import register_user, login_user, logout_user, get_user_identity, get_user_identity_async, provision_users # Import authentication services
+from flask import current_app
+import hmac
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,6 +25,45 @@ def login():
         return jsonify({"error": "Missing JSON in request"}), 400 # 400 Bad Request
     return login_user(request.get_json())
 
+# Logout route
+# Revokes the token sent with the request; the client should discard it too
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+    return logout_user(get_jwt())
+
+# Bulk user provisioning route, for SSO import jobs
+# Authenticated with the X-Provisioning-Token header; disabled unless
+# PROVISIONING_TOKEN is configured
+@auth_bp.route('/users/bulk', methods=['POST'])
+def bulk_provision():
+    expected = current_app.config.get('PROVISIONING_TOKEN')
+    if not expected:
+        return jsonify({"error": "Not found"}), 404
+    provided = request.headers.get('X-Provisioning-Token', '')
+    if not hmac.compare_digest(provided.encode('utf-8'), expected.encode('utf-8')):
+        return jsonify({"error": "Invalid provisioning token"}), 401
+
+    if not request.is_json:
+        return jsonify({"error": "Missing JSON in request"}), 400
+    data = request.get_json()
+    users = data.get('users') if isinstance(data, dict) else None
+    if not isinstance(users, list):
+        return jsonify({"error": "Request must contain a users list"}), 400
+
+    max_users = current_app.config.get('PROVISIONING_MAX_USERS', 10000)
+    if len(users) > max_users:
+        return jsonify({"error": f"At most {max_users} users per request"}), 413
+    # Every plain-text password costs a bcrypt hash before the response
+    max_passwords = current_app.config.get('PROVISIONING_MAX_PASSWORDS', 100)
+    passwords = sum(1 for user in users if isinstance(user, dict) and user.get('password'))
+    if passwords > max_passwords:
+        return jsonify({"error": f"At most {max_passwords} users with a password per request; "
+                                 "send password_hash or smaller batches"}), 413
+
+    result, status_code = provision_users(users, batch_size=current_app.config.get('PROVISIONING_BATCH_SIZE', 1000))
+    return jsonify(result), status_code
+
 # Profile route
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
@@ -30,8 +71,15 @@ def profile():
     try:
         # Get user ID from JWT token (will be a string)
         user_id = get_jwt_identity()
-        logger.info(f"Profile accessed by user ID: {user_id}")
-        
+        logger.debug("Profile accessed by user ID: %s", user_id)
+
+        # Serve the profile from the signed token claims; ?fresh=true (or a
+        # token issued before the claims existed) reads it through the identity cache
+        fresh = request.args.get('fresh', '').lower() in ('1', 'true', 'yes')
+        profile_data = None if fresh else _profile_from_claims(user_id)
+        if profile_data is not None:
+            return jsonify(profile_data), 200
+
         # Convert to integer if needed for database queries
         try:
             user_id_int = int(user_id)
@@ -39,11 +87,11 @@ def profile():
             # If conversion fails, keep original value
             user_id_int = user_id
         
-        # Get user data from database
-        user_data, status_code = get_user_by_id(user_id_int)
+        # Get user data from the identity cache (database on a miss)
+        user_data, status_code = get_user_identity(user_id_int)
         
         if status_code != 200:
-            logger.error(f"Failed to get user data: {user_data}")
+            logger.error("Failed to get user data: %s", user_data)
             return jsonify({'error': 'Failed to get user profile'}), status_code
         
         # Return user information
@@ -55,5 +103,62 @@ def profile():
             }
         }), 200
     except Exception as e:
-        logger.error(f"Error in profile route: {str(e)}")
+        logger.exception("Error in profile route")
+        return jsonify({'error': f'Profile access failed: {str(e)}'}), 500
+
+
+# Function to build the profile from the token claims, or None when they do
+# not have it (tokens issued before the claims existed)
+def _profile_from_claims(user_id):
+    claims = get_jwt()
+    if 'username' in claims and 'email' in claims:
+        return {
+            'user': {
+                'id': int(user_id) if str(user_id).isdigit() else user_id,
+                'username': claims['username'],
+                'email': claims['email']
+            }
+        }
+    return None
+
+
+# Async version of the profile route, served by the async serving path (see app/asgi.py)
+async def profile_async(session):
+    # Same checks as @jwt_required(); failures go to the same error handlers
+    verify_jwt_in_request()
+    try:
+        user_id = get_jwt_identity()
+        logger.debug("Profile accessed by user ID: %s", user_id)
+
+        fresh = request.args.get('fresh', '').lower() in ('1', 'true', 'yes')
+        profile_data = None if fresh else _profile_from_claims(user_id)
+        if profile_data is not None:
+            return jsonify(profile_data), 200
+
+        try:
+            user_id_int = int(user_id)
+        except (ValueError, TypeError):
+            user_id_int = user_id
+
+        user_data, status_code = await get_user_identity_async(session, user_id_int)
+
+        if status_code != 200:
+            logger.error("Failed to get user data: %s", user_data)
+            return jsonify({'error': 'Failed to get user profile'}), status_code
+
+        return jsonify({
+            'user': {
+                'id': user_data['id'],
+                'username': user_data['username'],
+                'email': user_data['email']
+            }
+        }), 200
+    except Exception as e:
+        logger.exception("Error in profile route")
         return jsonify({'error': f'Profile access failed: {str(e)}'}), 500
+
+
+# Endpoint name -> async view
+async_views = {
+    'auth.profile': profile_async,
+}
@@ -0,0 +1,98 @@
+from flask import Blueprint, request, jsonify, current_app, redirect, send_from_directory, abort
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import NotFound
+from ..media import UploadError, is_digest, parse_original_name, parse_variant_name
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Image routes: uploads under /api/images, and the stored files under MEDIA_URL
+# (see app/media.py)
+
+image_bp = Blueprint('images', __name__)
+media_bp = Blueprint('media', __name__)
+
+
+# Route to upload an image
+# The body is either multipart/form-data with the file in an `image` field, or
+# the raw image bytes with an image/* content type. The response gives the URL
+# to store as a post's image_url, and the URLs its variants will have.
+@image_bp.route('/', methods=['POST'])
+@jwt_required()
+def upload_image():
+    media = current_app.extensions['media']
+    if request.content_length is not None and request.content_length > media.max_upload + 64 * 1024:
+        return jsonify({"error": f"Image is larger than {media.max_upload} bytes"}), 413
+
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('image')
+        if upload is None:
+            return jsonify({"error": "Missing image field in the form"}), 400
+        stream = upload.stream
+    elif request.mimetype.startswith('image/'):
+        stream = request.stream
+    else:
+        return jsonify({"error": "Send multipart/form-data with an image field, or an image/* body"}), 415
+
+    try:
+        digest, extension, content_type, size, created = media.save(stream)
+    except UploadError as e:
+        return jsonify({"error": str(e)}), e.status_code
+    except OSError as e:
+        logger.exception("Could not store uploaded image")
+        return jsonify({"error": f"Could not store image: {str(e)}"}), 500
+
+    media.schedule_variants(digest, extension)
+    logger.info("Stored image %s (%s bytes) for user ID %s", digest, size, get_jwt_identity())
+    return jsonify({
+        'url': media.original_url(digest, extension),
+        'hash': digest,
+        'content_type': content_type,
+        'size': size,
+        'variants': media.variant_urls(digest)
+    }), 201 if created else 200
+
+
+def _send_immutable(directory, name, media):
+    # conditional=True answers Range and If-None-Match requests (206 / 304)
+    response = send_from_directory(directory, name, conditional=True, max_age=media.max_age)
+    # The content at a content address never changes
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    # Served with the type of the extension only; browsers must not guess another
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    return response
+
+
+# Route to serve a stored original
+@media_bp.route('/<shard>/<name>', methods=['GET'])
+def original(shard, name):
+    media = current_app.extensions['media']
+    parsed = parse_original_name(name)
+    if parsed is None or parsed[0][:2] != shard:
+        abort(404)
+    return _send_immutable(media.root, f'{shard}/{name}', media)
+
+
+# Route to serve a variant
+# A variant not made yet is scheduled and the client is sent to the original
+@media_bp.route('/<shard>/<digest>/<name>', methods=['GET'])
+def variant(shard, digest, name):
+    media = current_app.extensions['media']
+    width = parse_variant_name(name)
+    if width is None or width not in media.widths or not is_digest(digest) or digest[:2] != shard:
+        abort(404)
+
+    try:
+        return _send_immutable(media.root, f'{shard}/{digest}/{name}', media)
+    except NotFound:
+        pass
+
+    extension = media.find_original(digest)
+    if extension is None:
+        abort(404)
+    media.schedule_variants(digest, extension)
+    response = redirect(media.original_url(digest, extension), code=307)
+    # Not cacheable: the variant will replace it once it is made
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
@@ -1,6 +1,13 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from ..services.post_service import get_posts, create_post, get_post_by_id, update_post, delete_post, get_posts_by_user_id
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
+from ..services.post_service import get_posts, create_post, get_post_by_id, update_post, delete_post, get_posts_by_user_id, get_post_validators, page_validators
+from ..services.post_service import get_posts_async, get_post_by_id_async, get_posts_by_user_id_async, get_post_validators_async
+from ..services.pagination import parse_page_args, PaginationError
+from ..services.search_service import search_posts, parse_search_args, SearchError
+from ..services.import_service import import_posts, iter_ndjson, iter_json_array
+from ..services.export_service import export_posts, parse_export_args, ExportError
+import json
+from ..conditional import make_etag, is_not_modified, not_modified_response, conditional_json
 import logging
 
 # Configure logging
@@ -10,55 +17,153 @@ logger = logging.getLogger(__name__)
 
 post_bp = Blueprint('posts', __name__)
 
-# Route to get all posts
+
+# Function to answer a GET conditionally: validators are checked first, and the
+# body is only loaded when the client's copy (If-None-Match / If-Modified-Since)
+# is out of date
+def _conditional_get(validators, load, etag_parts=(), private=False):
+    validator_result, status_code = validators
+    if status_code != 200:
+        return jsonify(validator_result), status_code
+
+    fingerprint, last_modified = validator_result
+    etag = make_etag(fingerprint, *etag_parts)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified, private=private)
+
+    result, status_code = load()
+    return conditional_json(result, status_code, etag, last_modified, private=private)
+
+
+def _page_etag_parts(page):
+    return (page['limit'], request.args.get('before'), request.args.get('after'))
+
+
+# Function to answer a listing GET conditionally: its validators come from the
+# loaded page (see page_validators), so only the body is skipped for a client
+# whose copy is current
+def _conditional_page(loaded, scope, etag_parts=(), private=False):
+    result, status_code = loaded
+    validators = (page_validators(result, scope), 200) if status_code == 200 else loaded
+    return _conditional_get(validators, lambda: loaded, etag_parts=etag_parts, private=private)
+
+# Route to get a page of posts
+# Query parameters: limit, and either before or after (cursors from a previous page)
 @post_bp.route('/', methods=['GET'])
 def fetch_posts():
-    result, status_code = get_posts()
+    try:
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return _conditional_page(get_posts(**page), 'all', etag_parts=_page_etag_parts(page))
+
+# Route to search posts by title and content
+# Query parameters: q (required), limit, page
+@post_bp.route('/search', methods=['GET'])
+def search():
+    try:
+        args = parse_search_args(request.args)
+    except SearchError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result, status_code = search_posts(**args)
     return jsonify(result), status_code
 
+# Route to export posts as a stream, for snapshots and analytics
+# Query parameters: format (ndjson or csv), author, since, until, gzip
+# Rows are read through a server-side cursor and written as they arrive, so
+# memory use does not grow with the number of posts.
+@post_bp.route('/export', methods=['GET'])
+@jwt_required()
+def export():
+    try:
+        args = parse_export_args(request.args)
+    except ExportError as e:
+        return jsonify({"error": str(e)}), 400
+
+    extension = 'csv' if args['export_format'] == 'csv' else 'ndjson'
+    mimetype = 'text/csv' if extension == 'csv' else 'application/x-ndjson'
+    filename = f'posts.{extension}'
+    if args['compress']:
+        mimetype = 'application/gzip'
+        filename += '.gz'
+
+    response = Response(stream_with_context(export_posts(**args)), status=200, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
 # Route to get a single post by ID
 @post_bp.route('/<int:post_id>', methods=['GET'])
 def get_post(post_id):
-    result, status_code = get_post_by_id(post_id)
-    return jsonify(result), status_code
+    return _conditional_get(get_post_validators(post_id), lambda: get_post_by_id(post_id))
 
 # Route to create a new post
 @post_bp.route('/', methods=['POST'])
 @jwt_required() # Ensure the user is authenticated
 def new_post():
     try:
-        logger.info("Received POST request to create a new post")
-        
         if not request.is_json:
             logger.warning("Request is not JSON format")
             return jsonify({"error": "Missing JSON in request"}), 400
 
         data = request.get_json()
-        logger.info(f"Request data: {data}")
-        
         if not data or 'title' not in data or 'content' not in data:
-            logger.warning(f"Missing required fields in request: {data}")
+            # Log which fields were sent, never the post content itself
+            logger.warning("Missing required fields in request, got: %s", sorted(data) if isinstance(data, dict) else type(data).__name__)
             return jsonify({"error": "Missing required fields"}), 400
 
         # Get the user ID from the token (will be a string)
         user_id = get_jwt_identity()
-        logger.info(f"Creating post for user ID: {user_id}")
         
         # Convert to integer for database operations
         try:
             user_id_int = int(user_id)
         except (ValueError, TypeError):
-            logger.error(f"Could not convert user_id to integer: {user_id}")
+            logger.error("Could not convert user_id to integer: %s", user_id)
             return jsonify({"error": "Invalid user ID format"}), 400
         
         result, status_code = create_post(user_id_int, data)
-        logger.info(f"Post creation result: {result}, status: {status_code}")
+        if status_code == 201:
+            logger.info("Created post %s for user ID %s", result.get('post_id'), user_id_int)
         
         return jsonify(result), status_code
     except Exception as e:
-        logger.error(f"Error creating post: {str(e)}")
+        logger.exception("Error creating post")
         return jsonify({"error": f"Failed to create post: {str(e)}"}), 500
 
+# Route to import many posts at once for the current user
+# The body is NDJSON (application/x-ndjson, one post per line) or a JSON array
+# of posts; it is read as a stream and inserted in batches of IMPORT_BATCH_SIZE.
+# The response is NDJSON as well: one result per record, then a summary line.
+@post_bp.route('/import', methods=['POST'])
+@jwt_required()
+def bulk_import():
+    user_id = get_jwt_identity()
+    try:
+        user_id_int = int(user_id)
+    except (ValueError, TypeError):
+        logger.error("Could not convert user_id to integer: %s", user_id)
+        return jsonify({"error": "Invalid user ID format"}), 400
+
+    max_record_size = current_app.config.get('IMPORT_MAX_RECORD_SIZE', 1024 * 1024)
+    mimetype = request.mimetype
+    if mimetype in ('application/x-ndjson', 'application/jsonl'):
+        records = iter_ndjson(request.stream, max_record_size=max_record_size)
+    elif mimetype == 'application/json':
+        records = iter_json_array(request.stream, max_record_size=max_record_size)
+    else:
+        return jsonify({"error": "Content-Type must be application/x-ndjson or application/json"}), 415
+
+    batch_size = current_app.config.get('IMPORT_BATCH_SIZE', 1000)
+
+    def generate():
+        for result in import_posts(user_id_int, records, batch_size=batch_size):
+            yield json.dumps(result) + '\n'
+
+    return Response(stream_with_context(generate()), status=200, mimetype='application/x-ndjson')
+
 # Route to update an existing post
 @post_bp.route('/<int:post_id>', methods=['PUT'])
 @jwt_required()
@@ -74,7 +179,7 @@ def update_existing_post(post_id):
     try:
         user_id_int = int(user_id)
     except (ValueError, TypeError):
-        logger.error(f"Could not convert user_id to integer: {user_id}")
+        logger.error("Could not convert user_id to integer: %s", user_id)
         return jsonify({"error": "Invalid user ID format"}), 400
     
     result, status_code = update_post(post_id, user_id_int, data)
@@ -88,7 +193,7 @@ def remove_post(post_id):
     try:
         user_id_int = int(user_id)
     except (ValueError, TypeError):
-        logger.error(f"Could not convert user_id to integer: {user_id}")
+        logger.error("Could not convert user_id to integer: %s", user_id)
         return jsonify({"error": "Invalid user ID format"}), 400
     
     result, status_code = delete_post(post_id, user_id_int)
@@ -97,8 +202,13 @@ def remove_post(post_id):
 # Route to get posts by user ID
 @post_bp.route('/user/<int:user_id>', methods=['GET'])
 def get_user_posts(user_id):
-    result, status_code = get_posts_by_user_id(user_id)
-    return jsonify(result), status_code
+    try:
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return _conditional_page(get_posts_by_user_id(user_id, **page), f'user:{user_id}',
+                             etag_parts=_page_etag_parts(page))
 
 # Route to get posts for the current authenticated user
 @post_bp.route('/my-posts', methods=['GET'])
@@ -108,8 +218,86 @@ def get_my_posts():
     try:
         user_id_int = int(user_id)
     except (ValueError, TypeError):
-        logger.error(f"Could not convert user_id to integer: {user_id}")
+        logger.error("Could not convert user_id to integer: %s", user_id)
         return jsonify({"error": "Invalid user ID format"}), 400
-    
-    result, status_code = get_posts_by_user_id(user_id_int)
-    return jsonify(result), status_code
+
+    try:
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return _conditional_page(get_posts_by_user_id(user_id_int, **page), f'user:{user_id_int}',
+                             etag_parts=_page_etag_parts(page), private=True)
+
+
+# Async versions of the read routes above, served on the event loop by the
+# async serving path (see app/asgi.py). They run inside a Flask request
+# context like any view, get an AsyncSession as their first argument, and
+# must answer exactly like their synchronous counterparts.
+
+async def _conditional_get_async(validators, load, etag_parts=(), private=False):
+    validator_result, status_code = validators
+    if status_code != 200:
+        return jsonify(validator_result), status_code
+
+    fingerprint, last_modified = validator_result
+    etag = make_etag(fingerprint, *etag_parts)
+    if is_not_modified(etag, last_modified):
+        return not_modified_response(etag, last_modified, private=private)
+
+    result, status_code = await load()
+    return conditional_json(result, status_code, etag, last_modified, private=private)
+
+
+async def fetch_posts_async(session):
+    try:
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return _conditional_page(await get_posts_async(session, **page), 'all', etag_parts=_page_etag_parts(page))
+
+
+async def get_post_async(session, post_id):
+    return await _conditional_get_async(
+        await get_post_validators_async(session, post_id),
+        lambda: get_post_by_id_async(session, post_id)
+    )
+
+
+async def get_user_posts_async(session, user_id):
+    try:
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return _conditional_page(await get_posts_by_user_id_async(session, user_id, **page), f'user:{user_id}',
+                             etag_parts=_page_etag_parts(page))
+
+
+async def get_my_posts_async(session):
+    # Same checks as @jwt_required(); failures go to the same error handlers
+    verify_jwt_in_request()
+    user_id = get_jwt_identity()
+    try:
+        user_id_int = int(user_id)
+    except (ValueError, TypeError):
+        logger.error("Could not convert user_id to integer: %s", user_id)
+        return jsonify({"error": "Invalid user ID format"}), 400
+
+    try:
+        page = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return _conditional_page(await get_posts_by_user_id_async(session, user_id_int, **page), f'user:{user_id_int}',
+                             etag_parts=_page_etag_parts(page), private=True)
+
+
+# Endpoint name -> async view
+async_views = {
+    'posts.fetch_posts': fetch_posts_async,
+    'posts.get_post': get_post_async,
+    'posts.get_user_posts': get_user_posts_async,
+    'posts.get_my_posts': get_my_posts_async,
+}
@@ -0,0 +1,63 @@
+# Schema objects that exist in the database but are not declared on the models
+# Full-text search lives outside the ORM (see services/search_service.py): the
+# PostgreSQL search_vector column is generated by the database, and SQLite uses
+# an FTS5 virtual table with its shadow tables. Migrations create them, and
+# autogenerate / drift checks must not report them as removed.
+
+UNMANAGED_TABLES = {
+    'post_fts',
+    'post_fts_data',
+    'post_fts_idx',
+    'post_fts_content',
+    'post_fts_docsize',
+    'post_fts_config',
+}
+
+UNMANAGED_COLUMNS = {
+    ('post', 'search_vector'),
+}
+
+UNMANAGED_INDEXES = {
+    'ix_post_search_vector',
+}
+
+
+# Function passed to Alembic as include_object to skip the objects above
+def include_object(obj, name, type_, reflected, compare_to):
+    if type_ == 'table':
+        return name not in UNMANAGED_TABLES
+    if type_ == 'column':
+        return (obj.table.name, name) not in UNMANAGED_COLUMNS
+    if type_ == 'index':
+        return name not in UNMANAGED_INDEXES
+    return True
+
+
+# Function to drop an index left invalid by a failed CREATE INDEX CONCURRENTLY
+# (PostgreSQL only; call it inside an autocommit block). PostgreSQL keeps such
+# an index: it is never used by queries but still updated on every write, and
+# both IF NOT EXISTS and a look at the existing index names take it for built.
+# Returns True if the index was dropped, so the caller builds it again
+def drop_invalid_index(bind, name):
+    from sqlalchemy import text
+
+    invalid = bind.execute(
+        text("SELECT 1 FROM pg_index WHERE indexrelid = to_regclass(:name) AND NOT indisvalid"),
+        {'name': name}
+    ).first()
+    if invalid is None:
+        return False
+    bind.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+    return True
+
+
+# Function to create the tables from the models, plus the search objects above
+# Used by `flask --app main init-db` and by scripts that start from an empty
+# database; servers do not touch the schema when they boot, so run this (or
+# `flask --app main db upgrade`) once before starting them
+def create_schema():
+    from .extensions import db
+    from .services.search_service import ensure_search_schema
+
+    db.create_all()
+    ensure_search_schema(db.engine)
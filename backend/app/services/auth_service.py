@@ -1,14 +1,53 @@
-from flask_bcrypt import check_password_hash
 from flask_jwt_extended import create_access_token
 from datetime import datetime
-from ..extensions import bcrypt
+from ..extensions import hasher, cache, revocations
+from ..database import replica_read
+from flask import current_app
+from ..hashing import HashingBusy
 from ..models import db, User
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 import logging
+import re
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Messages for the unique constraints on the user table
+DUPLICATE_MESSAGES = {
+    'username': 'Username already exists',
+    'email': 'Email already exists',
+}
+
+# Stored for provisioned accounts without a password (e.g. SSO users); it is
+# not a valid bcrypt hash, so password login always fails for them
+UNUSABLE_PASSWORD = '!'
+
+_bcrypt_hash = re.compile(r'^\$2[abxy]?\$\d{2}\$[./A-Za-z0-9]{53}$')
+
+
+# Function to find which unique column an IntegrityError violated
+# PostgreSQL reports the constraint name (user_email_key, user_username_key);
+# SQLite reports "UNIQUE constraint failed: user.email"
+def _violated_field(error):
+    diag = getattr(error.orig, 'diag', None)
+    source = getattr(diag, 'constraint_name', None) or str(error.orig)
+    source = source.lower()
+    for field in ('username', 'email'):
+        if field in source:
+            return field
+    return None
+
+# Function to create an access token carrying the user's identity
+# id, username and email never change after registration, so the profile can be
+# served from these claims without a database query
+def _create_token(user):
+    return create_access_token(
+        identity=str(user.id),
+        additional_claims={'username': user.username, 'email': user.email}
+    )
+
 # Function to register a new user
 def register_user(data):
     # try and catch for database errors
@@ -25,18 +64,10 @@ def register_user(data):
         if len(data['password']) < 6:
             return {'error': 'Password must be at least 6 characters'}, 400
 
-        # Check if user email already exists
-        existing_user = User.query.filter_by(email=data['email']).first()
-        if existing_user:
-            return {'error': 'Email already exists'}, 409
-
-        # Check if username already exists
-        existing_username = User.query.filter_by(username=data['username']).first()
-        if existing_username:
-            return {'error': 'Username already exists'}, 409
-
         # Create new user
-        hashed_password = bcrypt.generate_password_hash(data['password']).decode('utf-8') # generate_password_hash is a function provided by flask-bcrypt, it takes the password and returns a hashed string
+        # Duplicates are not looked up first: the unique constraints reject them
+        # on insert, which is one round trip and has no race window
+        hashed_password = hasher.hash_password(data['password']) # bcrypt hash computed in the hashing pool, off the request worker
 
         # Create a new user object with the provided data
         new_user = User(
@@ -46,13 +77,12 @@ def register_user(data):
             created_at=datetime.utcnow()
         )
         db.session.add(new_user) # Add new user to database
-        db.session.commit() # Commit changes to database
-
-        # Generate token for immediate login
-        access_token = create_access_token(identity=str(new_user.id))
+        db.session.flush() # INSERT ... RETURNING id; raises IntegrityError on duplicates
 
-        # Return success response
-        return {
+        # Build the response before committing, since commit expires the object
+        # and reading it afterwards would query the row again
+        access_token = _create_token(new_user)
+        response = {
             'message': 'User registered successfully',
             'access_token': access_token,
             'user': {
@@ -60,14 +90,19 @@ def register_user(data):
                 'username': new_user.username,
                 'email': new_user.email
             }
-        }, 201
+        }
+        db.session.commit() # Commit changes to database
+
+        # Return success response
+        return response, 201
+    except HashingBusy as e:
+        logger.warning("Registration rejected, password hashing is saturated: %s", e)
+        return {'error': 'Server is busy, please try again shortly'}, 503
     except IntegrityError as e: # Integrityerror for unique constraints
         db.session.rollback()   # Rollback the session in case of error
-        if 'unique constraint' in str(e.orig).lower():
-            if 'username' in str(e.orig).lower():
-                return {'error': 'Username already exists'}, 409
-            elif 'email' in str(e.orig).lower():
-                return {'error': 'Email already exists'}, 409
+        field = _violated_field(e)
+        if field:
+            return {'error': DUPLICATE_MESSAGES[field]}, 409
         return {'error': f'Registration failed due to database constraint: {str(e)}'}, 409
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -81,29 +116,29 @@ def login_user(data):
     try:
         # Validate required fields
         if 'email' not in data or 'password' not in data:
-            logger.warning(f"Login attempt missing required fields: {data}")
+            logger.warning("Login attempt missing required fields")
             return {'error': 'Email and password are required'}, 400
 
-        logger.info(f"Login attempt for email: {data['email']}")
+        logger.debug("Login attempt for email: %s", data['email'])
         
         # Find user by email
         user = User.query.filter_by(email=data['email']).first()
         if not user:
-            logger.warning(f"Login failed: User with email {data['email']} not found")
+            logger.warning("Login failed: User with email %s not found", data['email'])
             return {'error': 'Invalid email or password'}, 401
             
-        if not check_password_hash(user.password, data['password']):
-            logger.warning(f"Login failed: Incorrect password for user {data['email']}")
+        if not hasher.check_password(user.password, data['password']):
+            logger.warning("Login failed: Incorrect password for user %s", data['email'])
             return {'error': 'Invalid email or password'}, 401
 
+        # Upgrade the stored hash when BCRYPT_LOG_ROUNDS has changed since it was made
+        if hasher.needs_rehash(user.password):
+            _rehash_password(user, data['password'])
+
         # Generate access token
-        logger.info(f"Generating token for user ID: {user.id}")
         # Convert user.id to string to fix "Subject must be a string" error
-        access_token = create_access_token(identity=str(user.id))
-        logger.info(f"Token generated successfully for user ID: {user.id}")
-        
-        # Print token for debugging
-        print(f"DEBUG - Generated token: {access_token}")
+        access_token = _create_token(user)
+        logger.info("Token generated for user ID: %s", user.id)
 
         return {
             'access_token': access_token,
@@ -113,34 +148,188 @@ def login_user(data):
                 'email': user.email
             }
         }, 200
+    except HashingBusy as e:
+        logger.warning("Login rejected, password hashing is saturated: %s", e)
+        return {'error': 'Server is busy, please try again shortly'}, 503
     except SQLAlchemyError as e:
-        logger.error(f"Database error during login: {str(e)}")
+        logger.error("Database error during login: %s", e)
         return {'error': f'Login failed due to database error: {str(e)}'}, 500
     except Exception as e:
-        logger.error(f"Unexpected error during login: {str(e)}")
+        logger.exception("Unexpected error during login")
         return {'error': f'Login failed: {str(e)}'}, 500
 
+# Function to log out: revoke the token the request was made with
+# Further requests with the token get a 401 (see app/revocation.py)
+def logout_user(jwt_payload):
+    try:
+        revocations.revoke(jwt_payload)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error("Database error during logout: %s", e)
+        return {'error': f'Logout failed due to database error: {str(e)}'}, 500
+    revocations.revoked(jwt_payload)
+    logger.info("Token revoked for user ID: %s", jwt_payload.get('sub'))
+    return {'message': 'Successfully logged out'}, 200
+
+# Function to replace a user's password hash with one at the configured cost
+# A failure here must not fail the login; the next login will try again.
+def _rehash_password(user, password):
+    try:
+        user.password = hasher.hash_password(password)
+        db.session.commit()
+        logger.info("Rehashed password for user ID %s at cost %s", user.id, hasher.rounds)
+    except (HashingBusy, SQLAlchemyError) as e:
+        db.session.rollback()
+        logger.warning("Could not rehash password for user ID %s: %s", user.id, e)
+
+# Columns of the user shape, read as a plain row rather than an ORM object
+USER_COLUMNS = (User.id, User.username, User.email, User.created_at)
+
+
+def _user_statement(user_id):
+    return select(*USER_COLUMNS).where(User.id == user_id)
+
+
+def _user_result(user_id, row):
+    if not row:
+        logger.warning("User with ID %s not found", user_id)
+        return {'error': 'User not found'}, 404
+
+    # Return user data
+    found_id, username, email, created_at = row
+    return {
+        'id': found_id,
+        'username': username,
+        'email': email,
+        'created_at': created_at.isoformat() if created_at else None
+    }, 200
+
+
+def _user_error(e):
+    if isinstance(e, SQLAlchemyError):
+        logger.error("Database error when getting user by ID: %s", e)
+    else:
+        logger.exception("Unexpected error when getting user by ID")
+    return {'error': f'Failed to get user: {str(e)}'}, 500
+
+
 # Function to get user by ID
+@replica_read
 def get_user_by_id(user_id):
     try:
-        logger.info(f"Getting user by ID: {user_id}")
-        
-        # Find user by ID
-        user = User.query.get(user_id)
-        if not user:
-            logger.warning(f"User with ID {user_id} not found")
-            return {'error': 'User not found'}, 404
-            
-        # Return user data
-        return {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'created_at': user.created_at.isoformat() if user.created_at else None
-        }, 200
-    except SQLAlchemyError as e:
-        logger.error(f"Database error when getting user by ID: {str(e)}")
-        return {'error': f'Failed to get user: {str(e)}'}, 500
+        logger.debug("Getting user by ID: %s", user_id)
+        return _user_result(user_id, db.session.execute(_user_statement(user_id)).first())
     except Exception as e:
-        logger.error(f"Unexpected error when getting user by ID: {str(e)}")
-        return {'error': f'Failed to get user: {str(e)}'}, 500
+        return _user_error(e)
+
+
+# Same as get_user_by_id, in an AsyncSession (see app/asgi.py)
+async def get_user_by_id_async(session, user_id):
+    try:
+        logger.debug("Getting user by ID: %s", user_id)
+        return _user_result(user_id, (await session.execute(_user_statement(user_id))).first())
+    except Exception as e:
+        return _user_error(e)
+
+
+def _identity_key(user_id):
+    return f'user:{user_id}'
+
+
+# Function to get user data through a short-lived identity cache
+# For callers that need fresher data than the token claims, without a
+# database query on every request
+def get_user_identity(user_id):
+    return cache.cached_result(
+        _identity_key(user_id),
+        lambda: get_user_by_id(user_id),
+        timeout=current_app.config.get('IDENTITY_CACHE_TTL', 30)
+    )
+
+
+async def get_user_identity_async(session, user_id):
+    return await cache.cached_result_async(
+        _identity_key(user_id),
+        lambda: get_user_by_id_async(session, user_id),
+        timeout=current_app.config.get('IDENTITY_CACHE_TTL', 30)
+    )
+
+# Function to validate one record for bulk provisioning
+# Returns an error message, or None if the record is valid
+def _provisioning_error(record):
+    if not isinstance(record, dict):
+        return 'Record must be an object'
+    if not record.get('username') or not record.get('email'):
+        return 'Missing required fields'
+    if not isinstance(record['username'], str) or not isinstance(record['email'], str):
+        return 'username and email must be strings'
+    if '@' not in record['email']:
+        return 'Invalid email format'
+    if record.get('password') is not None and not isinstance(record['password'], str):
+        return 'password must be a string'
+    if 'password' in record and len(record['password'] or '') < 6:
+        return 'Password must be at least 6 characters'
+    if record.get('password_hash') is not None and not isinstance(record['password_hash'], str):
+        return 'password_hash must be a string'
+    if 'password_hash' in record and not _bcrypt_hash.match(record['password_hash'] or ''):
+        return 'password_hash must be a bcrypt hash'
+    return None
+
+
+# Function to create many users at once (SSO imports)
+# Each record has username and email, plus an optional password (hashed here)
+# or password_hash (an existing bcrypt hash). Records without either get an
+# unusable password. Rows are inserted with multi-row INSERT ... ON CONFLICT
+# DO NOTHING RETURNING, one statement per batch, and existing users are
+# reported as conflicts instead of failing the whole request.
+def provision_users(records, batch_size=1000):
+    try:
+        results = [None] * len(records)
+        valid = []
+        for index, record in enumerate(records):
+            error = _provisioning_error(record)
+            if error:
+                results[index] = {'index': index, 'status': 'invalid', 'error': error}
+            else:
+                valid.append(index)
+
+        # Hash plain-text passwords in parallel on the hashing pool
+        to_hash = [index for index in valid if records[index].get('password')]
+        hashes = dict(zip(to_hash, hasher.hash_many([records[index]['password'] for index in to_hash])))
+
+        dialect = db.engine.dialect.name
+        insert = postgresql.insert if dialect == 'postgresql' else sqlite.insert
+        now = datetime.utcnow()
+
+        for start in range(0, len(valid), batch_size):
+            batch = valid[start:start + batch_size]
+            rows = [{
+                'username': records[index]['username'],
+                'email': records[index]['email'],
+                'password': hashes.get(index) or records[index].get('password_hash') or UNUSABLE_PASSWORD,
+                'created_at': now
+            } for index in batch]
+            statement = (insert(User).values(rows)
+                         .on_conflict_do_nothing()
+                         .returning(User.id, User.email))
+            created = {row.email: row.id for row in db.session.execute(statement)}
+            db.session.commit()
+
+            for index in batch:
+                user_id = created.pop(records[index]['email'], None)
+                if user_id is not None:
+                    results[index] = {'index': index, 'status': 'created', 'id': user_id}
+                else:
+                    results[index] = {'index': index, 'status': 'conflict', 'error': 'Username or email already exists'}
+
+        summary = {status: sum(1 for result in results if result['status'] == status)
+                   for status in ('created', 'conflict', 'invalid')}
+        return {**summary, 'results': results}, 200
+    except HashingBusy as e:
+        logger.warning("Bulk provisioning could not hash passwords: %s", e)
+        return {'error': 'Password hashing is busy, retry later or with smaller batches'}, 503
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        logger.error("Database error during bulk provisioning: %s", e)
+        return {'error': f'Provisioning failed: {str(e)}'}, 500
@@ -0,0 +1,143 @@
+from ..models import db, Post, User
+from datetime import datetime, timezone
+from sqlalchemy import select
+import csv
+import io
+import json
+import zlib
+
+# Streaming export of posts.
+# Rows come from a server-side cursor (yield_per), are serialized to NDJSON or
+# CSV in chunks of roughly CHUNK_SIZE characters, and can be gzipped on the
+# fly, so memory use does not depend on how many posts are exported.
+
+FORMATS = ('ndjson', 'csv')
+FETCH_SIZE = 1000
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = ('id', 'title', 'content', 'excerpt', 'image_url', 'author_id', 'author_name', 'created_at', 'updated_at')
+
+
+class ExportError(ValueError):
+    pass
+
+
+def _parse_timestamp(value, name):
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise ExportError(f'{name} must be an ISO 8601 timestamp')
+    if parsed.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+# Function to read format/author/since/until/gzip from the query string
+def parse_export_args(args):
+    export_format = args.get('format', 'ndjson').lower()
+    if export_format not in FORMATS:
+        raise ExportError(f"format must be one of: {', '.join(FORMATS)}")
+
+    author = args.get('author')
+    if author is not None:
+        try:
+            author = int(author)
+        except ValueError:
+            raise ExportError('author must be a user ID')
+
+    since = _parse_timestamp(args['since'], 'since') if args.get('since') else None
+    until = _parse_timestamp(args['until'], 'until') if args.get('until') else None
+
+    return {
+        'export_format': export_format,
+        'author': author,
+        'since': since,
+        'until': until,
+        'compress': args.get('gzip', '').lower() in ('1', 'true', 'yes'),
+    }
+
+
+# Function to stream post rows (as tuples in EXPORT_COLUMNS order) through a server-side cursor
+# `since` is inclusive and `until` exclusive, both on created_at
+def iter_post_rows(author=None, since=None, until=None, fetch_size=FETCH_SIZE):
+    statement = (select(Post.id, Post.title, Post.content, Post.excerpt, Post.image_url,
+                        Post.user_id, User.username, Post.created_at, Post.updated_at)
+                 .join(User, User.id == Post.user_id)
+                 .order_by(Post.id))
+    if author is not None:
+        statement = statement.where(Post.user_id == author)
+    if since is not None:
+        statement = statement.where(Post.created_at >= since)
+    if until is not None:
+        statement = statement.where(Post.created_at < until)
+
+    result = db.session.execute(statement.execution_options(stream_results=True, yield_per=fetch_size))
+    try:
+        for row in result:
+            yield row
+    finally:
+        result.close()
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+# Function to serialize rows as NDJSON, yielding text chunks
+def ndjson_chunks(rows, chunk_size=CHUNK_SIZE):
+    buffer = []
+    size = 0
+    for row in rows:
+        line = json.dumps({
+            'id': row[0],
+            'title': row[1],
+            'content': row[2],
+            'excerpt': row[3],
+            'image_url': row[4],
+            'author_id': row[5],
+            'author_name': row[6],
+            'created_at': _isoformat(row[7]),
+            'updated_at': _isoformat(row[8])
+        }) + '\n'
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield ''.join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+# Function to serialize rows as CSV with a header row, yielding text chunks
+def csv_chunks(rows, chunk_size=CHUNK_SIZE):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row[:7] + (_isoformat(row[7]), _isoformat(row[8])))
+        if output.tell() >= chunk_size:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    if output.tell():
+        yield output.getvalue()
+
+
+# Function to gzip a stream of text chunks on the fly
+def gzip_chunks(chunks, level=6):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# Function to build the full export stream: rows, serialized, optionally gzipped
+# Yields str chunks, or bytes when compressed
+def export_posts(export_format='ndjson', author=None, since=None, until=None, compress=False):
+    rows = iter_post_rows(author=author, since=since, until=until)
+    chunks = csv_chunks(rows) if export_format == 'csv' else ndjson_chunks(rows)
+    return gzip_chunks(chunks) if compress else chunks
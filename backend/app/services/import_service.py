@@ -0,0 +1,251 @@
+from ..models import db, Post
+from ..extensions import cache
+from .post_service import make_excerpt
+from datetime import datetime, timezone
+from sqlalchemy import insert
+from sqlalchemy.exc import SQLAlchemyError
+import codecs
+import json
+import logging
+
+# Bulk post import from a streamed request body.
+# Records are read one at a time (NDJSON lines, or elements of a JSON array),
+# validated, and inserted in batches with one multi-row INSERT ... RETURNING
+# per batch. Results are yielded per record as each batch commits, so neither
+# the upload nor the results are ever held in memory in full.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+# Bound variables allowed in one SQLite statement (SQLITE_MAX_VARIABLE_NUMBER)
+SQLITE_MAX_VARIABLES = 32766
+# Largest record read into memory; anything longer is rejected unread
+DEFAULT_MAX_RECORD_SIZE = 1024 * 1024
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+# Function to read NDJSON records from a binary stream
+# Yields (record, error) pairs; a bad or oversized line is reported and skipped
+def iter_ndjson(stream, max_record_size=DEFAULT_MAX_RECORD_SIZE):
+    while True:
+        line = stream.readline(max_record_size + 1)
+        if not line:
+            return
+        if len(line) > max_record_size and not line.endswith(b'\n'):
+            # Skip the rest of the line without keeping it
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(READ_CHUNK_SIZE)
+            yield None, f'Record is larger than {max_record_size} bytes'
+            continue
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line), None
+        except (ValueError, UnicodeDecodeError) as e:
+            yield None, f'Invalid JSON: {str(e)}'
+
+
+# Function to read the elements of a top-level JSON array from a binary stream,
+# decoding incrementally. Yields (record, error) pairs like iter_ndjson; since a
+# syntax error inside the array cannot be skipped, it raises ImportFormatError,
+# as does an element longer than max_record_size bytes.
+def iter_json_array(stream, chunk_size=READ_CHUNK_SIZE, max_record_size=DEFAULT_MAX_RECORD_SIZE):
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    eof = False
+    started = False
+    after_value = False
+
+    def read_more():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            eof = True
+        buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+        pos = 0
+
+    while True:
+        while pos < len(buffer) and buffer[pos].isspace():
+            pos += 1
+        if pos >= len(buffer):
+            if eof:
+                raise ImportFormatError('Unexpected end of JSON array')
+            read_more()
+            continue
+
+        char = buffer[pos]
+        if not started:
+            if char != '[':
+                raise ImportFormatError('Expected a JSON array')
+            started = True
+            pos += 1
+        elif char == ']':
+            return
+        elif after_value:
+            if char != ',':
+                raise ImportFormatError(f'Expected , or ] at offset {pos}')
+            after_value = False
+            pos += 1
+        else:
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                if eof or not _truncated(e, len(buffer)):
+                    raise ImportFormatError(f'Invalid JSON: {str(e)}')
+                if len(buffer[pos:].encode('utf-8')) > max_record_size:
+                    raise ImportFormatError(f'Record is larger than {max_record_size} bytes')
+                read_more()
+                continue
+            if end >= len(buffer) and not eof:
+                # A value ending exactly at the buffer edge may continue in the next chunk
+                read_more()
+                continue
+            yield record, None
+            pos = end
+            after_value = True
+
+
+# Function to tell whether a decode error may just mean the value continues in
+# the next chunk; anything else is a syntax error, and reading on would only
+# re-parse the buffer again for each chunk. An unterminated string is reported
+# where it starts, a cut number, literal or \uXXXX escape a few characters
+# before the end
+def _truncated(error, length):
+    return error.msg.startswith('Unterminated string') or error.pos >= length - 6
+
+
+# Function to validate one record and turn it into a post row
+# Returns (row, error)
+def _post_row(record, user_id, now):
+    if not isinstance(record, dict):
+        return None, 'Record must be an object'
+
+    title = record.get('title')
+    content = record.get('content')
+    if not isinstance(title, str) or not title.strip():
+        return None, 'title is required'
+    if len(title) > 100:
+        return None, 'title must be at most 100 characters'
+    if not isinstance(content, str) or not content:
+        return None, 'content is required'
+
+    image_url = record.get('image_url')
+    if image_url is not None and (not isinstance(image_url, str) or len(image_url) > 255):
+        return None, 'image_url must be a string of at most 255 characters'
+
+    # Keep the original publication date when migrating from another platform
+    created_at = now
+    if record.get('created_at'):
+        try:
+            created_at = datetime.fromisoformat(str(record['created_at']).replace('Z', '+00:00'))
+            if created_at.tzinfo is not None:
+                # Stored timestamps are naive UTC
+                created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        except ValueError:
+            return None, 'created_at must be an ISO 8601 timestamp'
+
+    return {
+        'title': title,
+        'content': content,
+        'excerpt': make_excerpt(content),
+        'image_url': image_url,
+        'created_at': created_at,
+        'updated_at': created_at,
+        'user_id': user_id
+    }, None
+
+
+# Function to insert rows on SQLite with one INSERT ... VALUES (...), (...)
+# RETURNING id per SQLITE_MAX_VARIABLES. It is sent as a driver statement:
+# compiling a multi-row VALUES construct costs more than the insert itself.
+# Values go through the columns' own bind processors, so they are stored
+# exactly as the ORM stores them. SQLite has one writer and gives the rows of
+# a statement increasing ids in VALUES order, but does not promise RETURNING's
+# order, so the ids are sorted.
+def _sqlite_insert(rows):
+    table = Post.__table__
+    names = list(rows[0])
+    dialect = db.engine.dialect
+    processors = [table.c[name].type.dialect_impl(dialect).bind_processor(dialect) for name in names]
+    placeholders = '(' + ', '.join('?' * len(names)) + ')'
+    step = SQLITE_MAX_VARIABLES // len(names)
+    ids = []
+    for start in range(0, len(rows), step):
+        chunk = rows[start:start + step]
+        sql = (f"INSERT INTO {table.name} ({', '.join(names)}) VALUES "
+               + ', '.join([placeholders] * len(chunk)) + ' RETURNING id')
+        params = tuple(process(row[name]) if process else row[name]
+                       for row in chunk for name, process in zip(names, processors))
+        ids.extend(sorted(post_id for post_id, in db.session.connection().exec_driver_sql(sql, params)))
+    return ids
+
+
+# Function to insert one batch; returns the new ids in input order
+# On PostgreSQL, SQLAlchemy sends multi-row INSERTs and matches the RETURNING
+# rows to the input (sort_by_parameter_order); on SQLite that option falls back
+# to one INSERT per row, so _sqlite_insert is used instead
+def _insert_batch(rows):
+    if db.engine.dialect.name == 'sqlite':
+        ids = _sqlite_insert(rows)
+    else:
+        statement = insert(Post).returning(Post.id, sort_by_parameter_order=True)
+        ids = [row.id for row in db.session.execute(statement, rows)]
+    db.session.commit()
+    return ids
+
+
+# Function to import posts for a user from an iterator of (record, error) pairs
+# Yields one result dict per record, then a final summary dict
+def import_posts(user_id, records, batch_size=DEFAULT_BATCH_SIZE):
+    counts = {'created': 0, 'invalid': 0, 'failed': 0}
+    pending = []  # (index, row) waiting for the next batch insert
+    now = datetime.utcnow()
+
+    def flush():
+        indexes = [index for index, _ in pending]
+        try:
+            ids = _insert_batch([row for _, row in pending])
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            logger.error("Bulk import batch of %d posts failed: %s", len(pending), e)
+            counts['failed'] += len(pending)
+            results = [{'index': index, 'status': 'failed', 'error': 'Database error'} for index in indexes]
+        else:
+            counts['created'] += len(ids)
+            results = [{'index': index, 'status': 'created', 'id': post_id} for index, post_id in zip(indexes, ids)]
+            cache.invalidate('posts', f'user:{user_id}')
+        pending.clear()
+        return results
+
+    index = -1
+    try:
+        for index, (record, error) in enumerate(records):
+            row = None
+            if error is None:
+                row, error = _post_row(record, user_id, now)
+            if error:
+                counts['invalid'] += 1
+                yield {'index': index, 'status': 'invalid', 'error': error}
+                continue
+
+            pending.append((index, row))
+            if len(pending) >= batch_size:
+                yield from flush()
+    except ImportFormatError as e:
+        # The rest of the body cannot be parsed; keep what was already read
+        if pending:
+            yield from flush()
+        yield {'index': index + 1, 'status': 'aborted', 'error': str(e)}
+        yield {'summary': {**counts, 'aborted': True}}
+        return
+
+    if pending:
+        yield from flush()
+    yield {'summary': {**counts, 'aborted': False}}
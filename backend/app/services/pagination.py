@@ -0,0 +1,95 @@
+import base64
+import binascii
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import tuple_
+
+# Keyset (cursor) pagination helpers.
+# Listings are ordered by (created_at DESC, id DESC); a cursor is an opaque,
+# URL-safe token wrapping the (created_at, id) key of the row it points at.
+# Following a cursor is an index range scan, so the cost of a page does not
+# depend on how deep into the listing the client is.
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class PaginationError(ValueError):
+    pass
+
+
+# Function to encode a (created_at, id) key into an opaque cursor
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+# Function to decode a cursor back into a (created_at, id) key
+def decode_cursor(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeError, binascii.Error):
+        raise PaginationError('Invalid cursor')
+
+
+# Function to read limit/before/after from the query string
+def parse_page_args(args):
+    default_size = current_app.config.get('POSTS_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    max_size = current_app.config.get('POSTS_MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+
+    limit = args.get('limit', default_size)
+    try:
+        limit = int(limit)
+    except (ValueError, TypeError):
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be at least 1')
+    limit = min(limit, max_size)
+
+    before = args.get('before')
+    after = args.get('after')
+    if before and after:
+        raise PaginationError('Use either before or after, not both')
+
+    return {
+        'limit': limit,
+        'before': decode_cursor(before) if before else None,
+        'after': decode_cursor(after) if after else None,
+    }
+
+
+# Function to build the statement for one page of a select ordered by
+# (created_at DESC, id DESC). One extra row is fetched to tell whether there
+# is another page. `after` walks towards older rows (next page), `before`
+# towards newer rows (previous page).
+def page_statement(statement, model, limit, before=None, after=None):
+    key = tuple_(model.created_at, model.id)
+    if before is not None:
+        return (statement.filter(key > before)
+                .order_by(model.created_at.asc(), model.id.asc())
+                .limit(limit + 1))
+    if after is not None:
+        statement = statement.filter(key < after)
+    return statement.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1)
+
+
+# Function to turn the rows fetched by page_statement into (rows, next_cursor, prev_cursor)
+def page_result(rows, limit, before=None, after=None):
+    has_more = len(rows) > limit
+    if before is not None:
+        rows = list(reversed(rows[:limit]))
+        prev_cursor = _cursor_for(rows[0]) if rows and has_more else None
+        next_cursor = _cursor_for(rows[-1]) if rows else None
+        return rows, next_cursor, prev_cursor
+
+    rows = rows[:limit]
+    next_cursor = _cursor_for(rows[-1]) if rows and has_more else None
+    prev_cursor = _cursor_for(rows[0]) if rows and after is not None else None
+    return rows, next_cursor, prev_cursor
+
+
+def _cursor_for(row):
+    return encode_cursor(row.created_at, row.id)
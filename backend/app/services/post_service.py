@@ -1,39 +1,190 @@
 from ..models import db, Post, User
+from ..extensions import cache, jobs
+from ..jobs import task
+from ..database import reading_replica, replica_read
+from ..media import image_variants
 from datetime import datetime
+from sqlalchemy import select
 from sqlalchemy.exc import SQLAlchemyError
+from .pagination import page_statement, page_result, DEFAULT_PAGE_SIZE
+from flask import current_app
+import re
 
+# Maximum length of the stored excerpt (the column holds up to 300 characters)
+EXCERPT_LENGTH = 280
 
-# Function to get all posts
-def get_posts():
+# Reads select plain columns rather than ORM objects: rows come back as
+# tuples, without the identity map and per-instance state that make up most
+# of the cost of a long listing. The shaping functions below unpack them in
+# the order of these tuples.
+
+# Columns loaded for listings; the full content is only read by get_post_by_id
+SUMMARY_COLUMNS = (Post.id, Post.title, Post.excerpt, Post.image_url, Post.created_at, Post.updated_at, Post.user_id)
+POST_COLUMNS = (Post.id, Post.title, Post.content, Post.user_id, Post.image_url, Post.created_at, Post.updated_at)
+
+_whitespace = re.compile(r'\s+')
+
+
+# Function to build the listing excerpt from a post's content
+def make_excerpt(content, length=EXCERPT_LENGTH):
+    text = _whitespace.sub(' ', content or '').strip()
+    if len(text) <= length:
+        return text
+    # Cut on a word boundary and mark the cut
+    cut = text[:length - 1]
+    if ' ' in cut:
+        cut = cut[:cut.rindex(' ')]
+    return cut.rstrip(' .,;:') + '\u2026'
+
+
+# Cache keys embed the version of the namespace they belong to; writes bump
+# the versions below instead of hunting down every affected key
+def _post_key(post_id):
+    return f"post:{post_id}:v{cache.version(f'post:{post_id}')}"
+
+
+def _posts_page_key(limit, before, after):
+    return f"posts:v{cache.version('posts')}:{limit}:{before}:{after}"
+
+
+def _user_posts_page_key(user_id, limit, before, after):
+    return f"posts:user:{user_id}:v{cache.version(f'user:{user_id}')}:{limit}:{before}:{after}"
+
+
+# Function to build the `store` check of cached_result for keys of a namespace:
+# a replica may not have the namespace's last write yet (see app/database.py)
+def _store(namespace):
+    return lambda: not (reading_replica() and cache.recently_written(namespace))
+
+
+# Function to invalidate cached reads affected by a write to a post
+def _invalidate_post(post_id, user_id):
+    namespaces = ['posts', f'user:{user_id}']
+    if post_id is not None:
+        namespaces.append(f'post:{post_id}')
+    cache.invalidate(*namespaces)
+
+
+# Read functions are split into a statement builder, a function shaping the
+# rows into the response, and the cached entry points: get_posts and friends
+# run in the request's session, the *_async versions in an AsyncSession for
+# the async serving path (see app/asgi.py). Both share cache entries; the
+# async versions build their keys with cache.call_async, since a key needs the
+# namespace version from a possibly remote cache.
+
+def _summary(row):
+    post_id, title, excerpt, image_url, created_at, updated_at, user_id = row
+    return {
+        'id': post_id,
+        'title': title,
+        'excerpt': excerpt,
+        'author': user_id,
+        'image_url': image_url,
+        'image_variants': image_variants(image_url),
+        'created_at': created_at.isoformat() if created_at else None,
+        'updated_at': updated_at.isoformat() if updated_at else None
+    }
+
+
+def _page(items, next_cursor, prev_cursor, limit):
+    return {
+        'posts': items,
+        'next_cursor': next_cursor,
+        'prev_cursor': prev_cursor,
+        'limit': limit
+    }
+
+
+def _posts_statement(limit, before, after):
+    return page_statement(select(*SUMMARY_COLUMNS), Post, limit, before, after)
+
+
+def _posts_result(rows, limit, before, after):
+    rows, next_cursor, prev_cursor = page_result(rows, limit, before, after)
+    return _page([_summary(row) for row in rows], next_cursor, prev_cursor, limit), 200
+
+
+def _database_error(e):
+    return {'error': f'Database error: {str(e)}'}, 500
+
+
+# Function to get one page of posts, newest first
+@replica_read
+def get_posts(limit=DEFAULT_PAGE_SIZE, before=None, after=None):
+    return cache.cached_result(
+        _posts_page_key(limit, before, after),
+        lambda: _load_posts(limit, before, after),
+        store=_store('posts')
+    )
+
+
+def _load_posts(limit, before, after):
     try:
-        posts = Post.query.order_by(Post.created_at.desc()).all()
-        return [{'id': p.id, 'title': p.title, 'content': p.content, 'author': p.user_id, 'created_at': p.created_at.isoformat() if p.created_at else None} for p in posts], 200
+        rows = db.session.execute(_posts_statement(limit, before, after)).all()
+        return _posts_result(rows, limit, before, after)
     except SQLAlchemyError as e:
-        return {'error': f'Database error: {str(e)}'}, 500
+        return _database_error(e)
+
+
+async def get_posts_async(session, limit=DEFAULT_PAGE_SIZE, before=None, after=None):
+    async def load():
+        try:
+            rows = (await session.execute(_posts_statement(limit, before, after))).all()
+            return _posts_result(rows, limit, before, after)
+        except SQLAlchemyError as e:
+            return _database_error(e)
+    key = await cache.call_async(_posts_page_key, limit, before, after)
+    return await cache.cached_result_async(key, load, store=_store('posts'))
+
+
+def _post_statement(post_id):
+    # Author name is read in the same query via a join
+    return (select(*POST_COLUMNS, User.username)
+            .outerjoin(User, Post.user_id == User.id)
+            .where(Post.id == post_id))
+
+
+def _post_result(row):
+    if not row:
+        return {'error': 'Post not found'}, 404
+
+    post_id, title, content, user_id, image_url, created_at, updated_at, username = row
+    author_name = username if username is not None else "Unknown"
+
+    return {
+        'id': post_id,
+        'title': title,
+        'content': content,
+        'author_id': user_id,
+        'author_name': author_name,
+        'image_url': image_url,
+        'image_variants': image_variants(image_url),
+        'created_at': created_at.isoformat() if created_at else None,
+        'updated_at': updated_at.isoformat() if updated_at else None
+    }, 200
 
 
 # Function to get a post by ID
+@replica_read
 def get_post_by_id(post_id):
-    try:
-        post = Post.query.get(post_id)
-        if not post:
-            return {'error': 'Post not found'}, 404
+    return cache.cached_result(_post_key(post_id), lambda: _load_post(post_id), store=_store(f'post:{post_id}'))
+
 
-        author = User.query.get(post.user_id)
-        author_name = author.username if author else "Unknown"
-
-        return {
-            'id': post.id,
-            'title': post.title,
-            'content': post.content,
-            'author_id': post.user_id,
-            'author_name': author_name,
-            'image_url': post.image_url,
-            'created_at': post.created_at.isoformat() if post.created_at else None,
-            'updated_at': post.updated_at.isoformat() if post.updated_at else None
-        }, 200
+def _load_post(post_id):
+    try:
+        return _post_result(db.session.execute(_post_statement(post_id)).first())
     except SQLAlchemyError as e:
-        return {'error': f'Database error: {str(e)}'}, 500
+        return _database_error(e)
+
+
+async def get_post_by_id_async(session, post_id):
+    async def load():
+        try:
+            return _post_result((await session.execute(_post_statement(post_id))).first())
+        except SQLAlchemyError as e:
+            return _database_error(e)
+    key = await cache.call_async(_post_key, post_id)
+    return await cache.cached_result_async(key, load, store=_store(f'post:{post_id}'))
 
 # Function to create a new post
 def create_post(user_id, data):
@@ -41,12 +192,17 @@ def create_post(user_id, data):
         new_post = Post(
             title=data['title'],
             content=data['content'],
+            excerpt=make_excerpt(data['content']),
             user_id=user_id,
             created_at=datetime.utcnow(),
             image_url=data.get('image_url')
         )
         db.session.add(new_post)
+        if cache.shared:
+            db.session.flush()
+            _enqueue_warm_cache(new_post)
         db.session.commit()
+        _invalidate_post(None, user_id)
         return {'message': 'Post created successfully', 'post_id': new_post.id}, 201
     except SQLAlchemyError as e:
         db.session.rollback()
@@ -69,17 +225,45 @@ def update_post(post_id, user_id, data):
             post.title = data['title']
         if 'content' in data:
             post.content = data['content']
+            post.excerpt = make_excerpt(data['content'])
         if 'image_url' in data:
             post.image_url = data['image_url']
 
         post.updated_at = datetime.utcnow()
+        if cache.shared:
+            _enqueue_warm_cache(post)
 
         db.session.commit()
+        _invalidate_post(post.id, post.user_id)
         return {'message': 'Post updated successfully', 'post_id': post.id}, 200
     except SQLAlchemyError as e:
         db.session.rollback()
         return {'error': f'Failed to update post: {str(e)}'}, 500
 
+# Cache warming
+# Writes invalidate the post and the listings it appears in, so the next
+# readers would all miss together. With a shared cache a job worker reloads
+# them instead. The job is added in the write's transaction; a local cache is
+# per process, so there is nothing a worker could warm for the web workers.
+def _enqueue_warm_cache(post):
+    version = post.updated_at or post.created_at
+    jobs.enqueue('posts.warm_cache', {'post_id': post.id, 'user_id': post.user_id},
+                 key=f'warm:post:{post.id}:{version.isoformat()}')
+
+
+# Job: reload a written post with its validators, the first page of posts and
+# its author's first page
+# The reads are not @replica_read: they go to the primary, which has the write
+@task('posts.warm_cache')
+def warm_post_cache(post_id, user_id):
+    limit = current_app.config.get('POSTS_PAGE_SIZE', DEFAULT_PAGE_SIZE)
+    cache.cached_result(_post_key(post_id) + ':validators', lambda: _load_post_validators(post_id))
+    cache.cached_result(_post_key(post_id), lambda: _load_post(post_id))
+    cache.cached_result(_posts_page_key(limit, None, None), lambda: _load_posts(limit, None, None))
+    cache.cached_result(_user_posts_page_key(user_id, limit, None, None),
+                        lambda: _load_posts_by_user_id(user_id, limit, None, None))
+
+
 # Function to delete a post
 def delete_post(post_id, user_id):
     try:
@@ -94,35 +278,117 @@ def delete_post(post_id, user_id):
 
         db.session.delete(post)
         db.session.commit()
+        _invalidate_post(post_id, user_id)
         return {'message': 'Post deleted successfully'}, 200
     except SQLAlchemyError as e:
         db.session.rollback()
         return {'error': f'Failed to delete post: {str(e)}'}, 500
 
-# Function to get posts by user ID
-def get_posts_by_user_id(user_id):
+def _user_posts_statement(user_id, limit, before, after):
+    statement = (select(*SUMMARY_COLUMNS, User.username)
+                 .outerjoin(User, Post.user_id == User.id)
+                 .where(Post.user_id == user_id))
+    return page_statement(statement, Post, limit, before, after)
+
+
+def _user_posts_result(rows, limit, before, after):
+    rows, next_cursor, prev_cursor = page_result(rows, limit, before, after)
+
+    result = []
+    for post_id, title, excerpt, image_url, created_at, updated_at, author_id, username in rows:
+        result.append({
+            'id': post_id,
+            'title': title,
+            'excerpt': excerpt,
+            'author_id': author_id,
+            'author_name': username if username is not None else "Unknown",
+            'image_url': image_url,
+            'image_variants': image_variants(image_url),
+            'created_at': created_at.isoformat() if created_at else None,
+            'updated_at': updated_at.isoformat() if updated_at else None
+        })
+
+    return _page(result, next_cursor, prev_cursor, limit), 200
+
+
+# Function to get one page of posts by user ID, newest first
+@replica_read
+def get_posts_by_user_id(user_id, limit=DEFAULT_PAGE_SIZE, before=None, after=None):
+    return cache.cached_result(
+        _user_posts_page_key(user_id, limit, before, after),
+        lambda: _load_posts_by_user_id(user_id, limit, before, after),
+        store=_store(f'user:{user_id}')
+    )
+
+
+def _load_posts_by_user_id(user_id, limit, before, after):
+    try:
+        rows = db.session.execute(_user_posts_statement(user_id, limit, before, after)).all()
+        return _user_posts_result(rows, limit, before, after)
+    except SQLAlchemyError as e:
+        return _database_error(e)
+
+
+async def get_posts_by_user_id_async(session, user_id, limit=DEFAULT_PAGE_SIZE, before=None, after=None):
+    async def load():
+        try:
+            rows = (await session.execute(_user_posts_statement(user_id, limit, before, after))).all()
+            return _user_posts_result(rows, limit, before, after)
+        except SQLAlchemyError as e:
+            return _database_error(e)
+    key = await cache.call_async(_user_posts_page_key, user_id, limit, before, after)
+    return await cache.cached_result_async(key, load, store=_store(f'user:{user_id}'))
+
+
+# Freshness validators for conditional GET, as (fingerprint, last_modified)
+# A single post's come from a cheap query instead of loading its content, and
+# are cached under the same version as the post; a listing's from its page.
+
+def _post_validators_statement(post_id):
+    return select(Post.updated_at, Post.created_at).where(Post.id == post_id)
+
+
+def _post_validators_result(post_id, row):
+    if not row:
+        return {'error': 'Post not found'}, 404
+    last_modified = row.updated_at or row.created_at
+    return (f'post:{post_id}:{last_modified.isoformat() if last_modified else ""}', last_modified), 200
+
+
+# Function to get validators for a single post
+@replica_read
+def get_post_validators(post_id):
+    return cache.cached_result(
+        _post_key(post_id) + ':validators',
+        lambda: _load_post_validators(post_id),
+        store=_store(f'post:{post_id}')
+    )
+
+
+def _load_post_validators(post_id):
     try:
-        posts = Post.query.filter_by(user_id=user_id).order_by(Post.created_at.desc()).all()
-        
-        if not posts:
-            return {'posts': []}, 200
-            
-        result = []
-        for post in posts:
-            author = User.query.get(post.user_id)
-            author_name = author.username if author else "Unknown"
-            
-            result.append({
-                'id': post.id,
-                'title': post.title,
-                'content': post.content,
-                'author_id': post.user_id,
-                'author_name': author_name,
-                'image_url': post.image_url,
-                'created_at': post.created_at.isoformat() if post.created_at else None,
-                'updated_at': post.updated_at.isoformat() if post.updated_at else None
-            })
-            
-        return {'posts': result}, 200
+        return _post_validators_result(post_id, db.session.execute(_post_validators_statement(post_id)).first())
     except SQLAlchemyError as e:
-        return {'error': f'Database error: {str(e)}'}, 500
+        return _database_error(e)
+
+
+async def get_post_validators_async(session, post_id):
+    async def load():
+        try:
+            return _post_validators_result(post_id, (await session.execute(_post_validators_statement(post_id))).first())
+        except SQLAlchemyError as e:
+            return _database_error(e)
+    key = await cache.call_async(_post_key, post_id)
+    return await cache.cached_result_async(key + ':validators', load, store=_store(f'post:{post_id}'))
+
+
+# A listing page's validators are taken from the page itself: its posts' ids
+# and update times, and its cursors. A post added, edited or deleted on the
+# page changes them, and they cost nothing beyond loading the page (usually a
+# cache hit). An aggregate over the table (count, max) would grow with it.
+# There is no Last-Modified: the newest time on a page does not move when a
+# post is deleted from it or an older one is imported into it, so an
+# If-Modified-Since check would answer 304 for a changed page.
+def page_validators(page, scope):
+    rows = ','.join(f"{post['id']}@{post['updated_at'] or post['created_at']}" for post in page['posts'])
+    return f"posts:{scope}:{rows}:{page['next_cursor']}:{page['prev_cursor']}", None
@@ -0,0 +1,224 @@
+from ..models import db
+from ..media import image_variants
+from flask import current_app
+from sqlalchemy import text, inspect
+from sqlalchemy.exc import SQLAlchemyError
+import html
+import logging
+import re
+
+# Full-text search over post titles and content.
+# PostgreSQL: a generated `search_vector` tsvector column (title weighted above
+# content) with a GIN index, so it is kept current by the database on every write.
+# SQLite: an external-content FTS5 table kept in sync by triggers, used for
+# local development and tests without a PostgreSQL server.
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+# Deepest result that can be paged to; ranking every match for deep pages is wasted work
+MAX_SEARCH_OFFSET = 1000
+# Matches ranked per search: the newest ones, read in id order from the index.
+# Ranking every match of a common word would take time in proportion to the
+# table; this keeps a search as fast at millions of posts as at thousands.
+# Must cover MAX_SEARCH_OFFSET plus a page.
+SEARCH_CANDIDATES = 2000
+
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_STOP = '</mark>'
+# The database marks matches with these private-use characters; the snippet is
+# HTML-escaped before they are replaced with the tags above, so markup in a
+# post comes back as text
+START_SENTINEL = '\ue000'
+STOP_SENTINEL = '\ue001'
+
+POSTGRES_SCHEMA = [
+    """
+    ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_post_search_vector ON post USING GIN (search_vector)",
+]
+
+SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE post_fts USING fts5(title, content, content='post', content_rowid='id')",
+    """
+    CREATE TRIGGER post_fts_ai AFTER INSERT ON post BEGIN
+        INSERT INTO post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER post_fts_ad AFTER DELETE ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER post_fts_au AFTER UPDATE OF title, content ON post BEGIN
+        INSERT INTO post_fts(post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+        INSERT INTO post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+    END
+    """,
+    # Index rows that existed before the FTS table was created
+    "INSERT INTO post_fts(post_fts) VALUES ('rebuild')",
+]
+
+# Rank the newest SEARCH_CANDIDATES matches and only build headlines for the
+# requested page; ts_headline re-parses the whole document, so it must not run
+# for every match
+POSTGRES_SEARCH = text("""
+    SELECT ranked.id, ranked.title, ranked.excerpt, ranked.user_id, u.username AS author_name,
+           ranked.image_url, ranked.created_at, ranked.updated_at, ranked.rank,
+           ts_headline('english', ranked.content, ranked.query,
+                       'StartSel=' || :start_sel || ', StopSel=' || :stop_sel ||
+                       ', MaxFragments=2, MaxWords=30, MinWords=10') AS snippet
+    FROM (
+        SELECT candidates.*, ts_rank_cd(candidates.search_vector, candidates.query) AS rank
+        FROM (
+            SELECT p.id, p.title, p.excerpt, p.content, p.user_id, p.image_url, p.created_at, p.updated_at,
+                   p.search_vector, q.query
+            FROM post p, websearch_to_tsquery('english', :q) AS q(query)
+            WHERE p.search_vector @@ q.query
+            ORDER BY p.id DESC
+            LIMIT :candidates
+        ) AS candidates
+        ORDER BY rank DESC, candidates.id DESC
+        LIMIT :limit OFFSET :offset
+    ) AS ranked
+    JOIN "user" u ON u.id = ranked.user_id
+    ORDER BY ranked.rank DESC, ranked.id DESC
+""").columns(created_at=db.DateTime, updated_at=db.DateTime)
+
+# Same for FTS5: the page is ranked from the newest candidates, then matched
+# again by rowid for snippet(), which only works in a MATCH query
+SQLITE_SEARCH = text("""
+    SELECT p.id, p.title, p.excerpt, p.user_id, u.username AS author_name,
+           p.image_url, p.created_at, p.updated_at, ranked.rank,
+           snippet(post_fts, 1, :start_sel, :stop_sel, '...', 24) AS snippet
+    FROM (
+        SELECT rowid, rank FROM (
+            SELECT rowid, -bm25(post_fts, 4.0, 1.0) AS rank
+            FROM post_fts
+            WHERE post_fts MATCH :q
+            ORDER BY rowid DESC
+            LIMIT :candidates
+        )
+        ORDER BY rank DESC, rowid DESC
+        LIMIT :limit OFFSET :offset
+    ) AS ranked
+    JOIN post_fts ON post_fts.rowid = ranked.rowid
+    JOIN post p ON p.id = ranked.rowid
+    JOIN "user" u ON u.id = p.user_id
+    WHERE post_fts MATCH :q
+    ORDER BY ranked.rank DESC, p.id DESC
+""").columns(created_at=db.DateTime, updated_at=db.DateTime)
+
+_fts_token = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchError(ValueError):
+    pass
+
+
+# Function to create the search column/index (PostgreSQL) or FTS table (SQLite)
+# Safe to run repeatedly.
+def ensure_search_schema(engine):
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == 'postgresql':
+            for statement in POSTGRES_SCHEMA:
+                conn.execute(text(statement))
+        elif dialect == 'sqlite':
+            if 'post_fts' in inspect(conn).get_table_names():
+                return
+            for statement in SQLITE_SCHEMA:
+                conn.execute(text(statement))
+        else:
+            logger.warning("Full-text search is not supported on %s", dialect)
+
+
+# Function to turn free text into an FTS5 query: every word must match,
+# and FTS5 operators typed by the user are treated as plain words
+def _sqlite_match_expression(query):
+    tokens = _fts_token.findall(query)
+    return ' '.join(f'"{token}"' for token in tokens)
+
+
+# Function to turn a snippet marked with the sentinels into safe HTML
+def _snippet_html(snippet):
+    if snippet is None:
+        return None
+    return (html.escape(snippet, quote=False)
+            .replace(START_SENTINEL, HIGHLIGHT_START)
+            .replace(STOP_SENTINEL, HIGHLIGHT_STOP))
+
+
+# Function to read q/limit/page from the query string
+def parse_search_args(args):
+    query = (args.get('q') or '').strip()
+    if not query:
+        raise SearchError('Query parameter q is required')
+
+    try:
+        limit = int(args.get('limit', current_app.config.get('SEARCH_PAGE_SIZE', DEFAULT_SEARCH_LIMIT)))
+        page = int(args.get('page', 1))
+    except (ValueError, TypeError):
+        raise SearchError('limit and page must be integers')
+    if limit < 1 or page < 1:
+        raise SearchError('limit and page must be at least 1')
+    limit = min(limit, MAX_SEARCH_LIMIT)
+
+    if (page - 1) * limit >= MAX_SEARCH_OFFSET:
+        raise SearchError(f'Search results are limited to the first {MAX_SEARCH_OFFSET} matches')
+
+    return {'query': query, 'limit': limit, 'page': page}
+
+
+# Function to search posts, best match first, with highlighted snippets
+def search_posts(query, limit=DEFAULT_SEARCH_LIMIT, page=1):
+    try:
+        dialect = db.engine.dialect.name
+        if dialect == 'postgresql':
+            statement, match = POSTGRES_SEARCH, query
+        elif dialect == 'sqlite':
+            statement, match = SQLITE_SEARCH, _sqlite_match_expression(query)
+            if not match:
+                return {'results': [], 'query': query, 'page': page, 'limit': limit, 'has_more': False}, 200
+        else:
+            return {'error': f'Search is not supported on {dialect}'}, 501
+
+        # Fetch one extra row to know whether there is a next page
+        rows = db.session.execute(statement, {
+            'q': match,
+            'limit': limit + 1,
+            'offset': (page - 1) * limit,
+            'candidates': SEARCH_CANDIDATES,
+            'start_sel': START_SENTINEL,
+            'stop_sel': STOP_SENTINEL,
+        }).all()
+
+        return {
+            'results': [{
+                'id': row.id,
+                'title': row.title,
+                'excerpt': row.excerpt,
+                'snippet': _snippet_html(row.snippet),
+                'rank': float(row.rank),
+                'author_id': row.user_id,
+                'author_name': row.author_name,
+                'image_url': row.image_url,
+                'image_variants': image_variants(row.image_url),
+                'created_at': row.created_at.isoformat() if row.created_at else None,
+                'updated_at': row.updated_at.isoformat() if row.updated_at else None
+            } for row in rows[:limit]],
+            'query': query,
+            'page': page,
+            'limit': limit,
+            'has_more': len(rows) > limit
+        }, 200
+    except SQLAlchemyError as e:
+        return {'error': f'Database error: {str(e)}'}, 500
+
@@ -0,0 +1,7 @@
+# ASGI entry point: the read endpoints are served on the event loop, every
+# other route by the Flask app (see app/asgi.py)
+#   uvicorn asgi:application --workers 4
+from main import app
+from app.asgi import create_asgi_app
+
+application = create_asgi_app(app)
@@ -0,0 +1,468 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+
+# Add the backend and scripts directories to sys.path to import from app and seed_data
+sys.path.append(str(BACKEND_DIR))
+sys.path.append(str(BACKEND_DIR / 'scripts'))
+
+from sqlalchemy import text
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import User, Post
+from app.query_counter import count_queries
+from app.services.pagination import encode_cursor
+from app.schema import create_schema
+from seed_data import make_password_hash, generate_users, generate_posts, load_rows
+
+# Endpoint benchmarks.
+# Boots create_app() against a scratch database, seeds it at each requested
+# scale with the seed_data generators, then sends requests through the Flask
+# test client and records latency percentiles, throughput and SQL statements
+# per request for every scenario. Results are written as JSON and checked
+# against thresholds.json (and optionally a baseline results file); any
+# regression makes the run exit with status 1.
+#
+#   python benchmarks/run_benchmarks.py
+#   python benchmarks/run_benchmarks.py --scales small,large --baseline benchmarks/results/<previous>.json
+
+RESULTS_DIR = Path(__file__).parent / 'results'
+THRESHOLDS_FILE = Path(__file__).parent / 'thresholds.json'
+
+# name: (users, posts)
+SCALES = {
+    'small': (100, 1000),
+    'medium': (1000, 20000),
+    'large': (10000, 200000),
+    'xl': (100000, 5000000),
+}
+
+BENCH_PASSWORD = 'benchmark123'
+PROVISIONING_TOKEN = 'benchmark-provisioning-token'
+IMPORT_RECORDS = 100
+PROVISION_USERS = 100
+
+
+class BenchmarkConfig(Config):
+    TESTING = True
+    PROVISIONING_TOKEN = PROVISIONING_TOKEN
+    # Hash in threads so the benchmark does not depend on the process start method
+    HASHING_EXECUTOR = 'thread'
+    # Room for the bulk scenarios above
+    PROVISIONING_MAX_USERS = max(Config.PROVISIONING_MAX_USERS, PROVISION_USERS)
+
+
+# Scenarios: one per route, plus variants that exercise a different code path.
+# Each entry is (name, build, max_requests) where build(ctx, i) returns the
+# keyword arguments for client.open() and the expected status code.
+# max_requests caps scenarios dominated by bcrypt or by large bodies.
+
+def _auth(ctx):
+    return {'Authorization': f"Bearer {ctx['token']}"}
+
+
+def _register(ctx, i):
+    name = f"bench{ctx['run']}r{i}"
+    return dict(method='POST', path='/api/auth/register',
+                json={'username': name, 'email': f'{name}@example.com', 'password': BENCH_PASSWORD}), 201
+
+
+def _login(ctx, i):
+    return dict(method='POST', path='/api/auth/login',
+                json={'email': ctx['email'], 'password': BENCH_PASSWORD}), 200
+
+
+def _users_bulk(ctx, i):
+    users = [{'username': f"bench{ctx['run']}b{i}u{j}", 'email': f"bench{ctx['run']}b{i}u{j}@example.com"}
+             for j in range(PROVISION_USERS)]
+    return dict(method='POST', path='/api/auth/users/bulk', json={'users': users},
+                headers={'X-Provisioning-Token': PROVISIONING_TOKEN}), 200
+
+
+def _profile(ctx, i):
+    return dict(method='GET', path='/api/auth/profile', headers=_auth(ctx)), 200
+
+
+def _profile_fresh(ctx, i):
+    return dict(method='GET', path='/api/auth/profile?fresh=true', headers=_auth(ctx)), 200
+
+
+def _list_posts(ctx, i):
+    return dict(method='GET', path='/api/posts/?limit=20'), 200
+
+
+def _list_posts_deep(ctx, i):
+    return dict(method='GET', path=f"/api/posts/?limit=20&before={ctx['deep_cursor']}"), 200
+
+
+def _list_posts_revalidate(ctx, i):
+    # Conditional GET with the current ETag; answered with 304
+    return dict(method='GET', path='/api/posts/?limit=20', headers={'If-None-Match': ctx['list_etag']}), 304
+
+
+def _search(ctx, i):
+    return dict(method='GET', path=f"/api/posts/search?q={ctx['rng'].choice(ctx['search_terms'])}"), 200
+
+
+def _export(ctx, i):
+    return dict(method='GET', path=f"/api/posts/export?author={ctx['rng'].choice(ctx['user_ids'])}", headers=_auth(ctx)), 200
+
+
+def _get_post(ctx, i):
+    return dict(method='GET', path=f"/api/posts/{ctx['rng'].choice(ctx['post_ids'])}"), 200
+
+
+def _user_posts(ctx, i):
+    return dict(method='GET', path=f"/api/posts/user/{ctx['top_author']}?limit=20"), 200
+
+
+def _my_posts(ctx, i):
+    return dict(method='GET', path='/api/posts/my-posts?limit=20', headers=_auth(ctx)), 200
+
+
+def _create_post(ctx, i):
+    return dict(method='POST', path='/api/posts/', headers=_auth(ctx),
+                json={'title': f'Benchmark post {i}', 'content': 'Benchmark content. ' * 50}), 201
+
+
+def _import_posts(ctx, i):
+    body = '\n'.join(json.dumps({'title': f'Imported {i}.{j}', 'content': 'Imported content. ' * 50})
+                     for j in range(IMPORT_RECORDS))
+    return dict(method='POST', path='/api/posts/import', data=body,
+                headers={**_auth(ctx), 'Content-Type': 'application/x-ndjson'}), 200
+
+
+def _update_post(ctx, i):
+    return dict(method='PUT', path=f"/api/posts/{ctx['own_post_id']}", headers=_auth(ctx),
+                json={'title': f'Updated {i}', 'content': 'Updated content. ' * 50}), 200
+
+
+def _delete_post(ctx, i):
+    return dict(method='DELETE', path=f"/api/posts/{ctx['deletable_ids'].pop()}", headers=_auth(ctx)), 200
+
+
+# Reads run before writes, and deletes last, so writes do not skew the reads
+SCENARIOS = [
+    ('auth.profile', _profile, None),
+    ('auth.profile_fresh', _profile_fresh, None),
+    ('posts.list', _list_posts, None),
+    ('posts.list_deep', _list_posts_deep, None),
+    ('posts.list_revalidate', _list_posts_revalidate, None),
+    ('posts.get', _get_post, None),
+    ('posts.user', _user_posts, None),
+    ('posts.my_posts', _my_posts, None),
+    ('posts.search', _search, None),
+    ('posts.export', _export, 50),
+    ('auth.login', _login, 20),
+    ('auth.register', _register, 20),
+    ('auth.users_bulk', _users_bulk, 10),
+    ('posts.create', _create_post, None),
+    ('posts.import', _import_posts, 20),
+    ('posts.update', _update_post, None),
+    ('posts.delete', _delete_post, None),
+]
+
+
+# Function to compute a percentile (nearest rank) of sorted values
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _make_config(database_url, cache_type, rounds):
+    return type('ScaleConfig', (BenchmarkConfig,), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'CACHE_TYPE': cache_type,
+        'BCRYPT_LOG_ROUNDS': rounds,
+    })
+
+
+# Function to create an empty schema and load users and posts at the given scale
+def seed_database(users, posts, seed, rounds):
+    if db.engine.dialect.name != 'sqlite':
+        # A reused server database is wiped so every scale starts from the same state
+        db.drop_all()
+    create_schema()
+
+    rng = random.Random(seed)
+    password_hash = make_password_hash(BENCH_PASSWORD, rounds=rounds)
+    load_rows(db.engine, User.__table__, generate_users(users, password_hash, rng), 10000, 'users')
+    user_ids = db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+    load_rows(db.engine, Post.__table__, generate_posts(posts, user_ids, rng), 10000, 'posts')
+    if db.engine.dialect.name == 'postgresql':
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            conn.execute(text('ANALYZE "user", post'))
+
+
+# Function to gather the ids, cursors and tokens the scenarios need
+def prepare_context(client, seed, requests, run):
+    # `requests` must cover the measured and warmup requests of the delete scenario
+    rng = random.Random(seed)
+    post_count = db.session.execute(db.select(db.func.count(Post.id))).scalar()
+    post_ids = db.session.execute(db.select(Post.id)).scalars().all()
+    user_ids = db.session.execute(db.select(User.id)).scalars().all()
+    top_author = db.session.execute(
+        db.select(Post.user_id).group_by(Post.user_id).order_by(db.func.count().desc()).limit(1)
+    ).scalar()
+    middle = db.session.execute(
+        db.select(Post.created_at, Post.id)
+        .order_by(Post.created_at.desc(), Post.id.desc())
+        .offset(post_count // 2).limit(1)
+    ).one()
+
+    # The benchmark user owns a handful of posts plus one post per delete request
+    email = f'bench{run}@example.com'
+    response = client.post('/api/auth/register', json={'username': f'bench{run}', 'email': email, 'password': BENCH_PASSWORD})
+    token = response.get_json()['access_token']
+    user_id = response.get_json()['user']['id']
+    now = datetime.utcnow()
+    rows = [{'title': f'Own post {i}', 'content': 'Own content.', 'excerpt': 'Own content.',
+             'created_at': now, 'updated_at': now, 'user_id': user_id} for i in range(requests + 10)]
+    db.session.execute(db.insert(Post), rows)
+    db.session.commit()
+    own_ids = db.session.execute(db.select(Post.id).where(Post.user_id == user_id).order_by(Post.id)).scalars().all()
+
+    list_etag = client.get('/api/posts/?limit=20').headers.get('ETag')
+
+    return {
+        'rng': rng,
+        'run': run,
+        'token': token,
+        'email': email,
+        'post_ids': rng.sample(post_ids, min(len(post_ids), 1000)),
+        'user_ids': rng.sample(user_ids, min(len(user_ids), 1000)),
+        'top_author': top_author,
+        'deep_cursor': encode_cursor(middle.created_at, middle.id),
+        'list_etag': list_etag,
+        'own_post_id': own_ids[0],
+        'deletable_ids': own_ids[10:],
+        'search_terms': ['latency', 'database cache', 'python flask', 'release', 'query index'],
+    }
+
+
+# Function to run one scenario and summarize its measurements
+def run_scenario(client, ctx, build, requests, warmup):
+    for i in range(warmup):
+        kwargs, _ = build(ctx, -1 - i)
+        client.open(**kwargs).get_data()
+
+    latencies = []
+    queries = []
+    statuses = {}
+    errors = 0
+    with count_queries(db.engine) as counter:
+        started = time.perf_counter()
+        for i in range(requests):
+            kwargs, expected_status = build(ctx, i)
+            before = counter.count
+            request_started = time.perf_counter()
+            response = client.open(**kwargs)
+            body = response.get_data()
+            latencies.append(time.perf_counter() - request_started)
+            queries.append(counter.count - before)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+            if response.status_code != expected_status:
+                errors += 1
+                if errors == 1:
+                    print(f"    unexpected status {response.status_code}: {body[:200]!r}")
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': requests,
+        'errors': errors,
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'throughput_rps': round(requests / elapsed, 1),
+        'mean_ms': round(sum(latencies) / len(latencies) * 1000, 3),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+        'queries_per_request': {
+            'min': min(queries),
+            'max': max(queries),
+            'mean': round(sum(queries) / len(queries), 2),
+        },
+    }
+
+
+def run_scale(name, users, posts, options, database_url, run):
+    print(f"Scale {name}: {users} users, {posts} posts")
+    app = create_app(_make_config(database_url, options.cache, options.bcrypt_rounds))
+    results = {}
+    try:
+        with app.app_context():
+            started = time.perf_counter()
+            seed_database(users, posts, options.seed, options.bcrypt_rounds)
+            print(f"  seeded in {time.perf_counter() - started:.1f}s")
+
+            client = app.test_client()
+            ctx = prepare_context(client, options.seed, options.requests + options.warmup, run)
+            for scenario, build, max_requests in SCENARIOS:
+                if options.only and scenario not in options.only:
+                    continue
+                requests = min(options.requests, max_requests or options.requests)
+                results[scenario] = run_scenario(client, ctx, build, requests, min(options.warmup, requests))
+                summary = results[scenario]
+                print(f"  {scenario:<24} p50 {summary['p50_ms']:>9.2f} ms  p95 {summary['p95_ms']:>9.2f} ms  "
+                      f"p99 {summary['p99_ms']:>9.2f} ms  {summary['throughput_rps']:>8.1f} req/s  "
+                      f"queries {summary['queries_per_request']['max']}")
+            db.session.remove()
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        app.extensions['hasher'].shutdown()
+    return {'users': users, 'posts': posts, 'scenarios': results}
+
+
+# Function to compare results with the thresholds and an optional baseline
+# Returns a list of failure messages
+def check_regressions(results, thresholds, baseline=None, tolerance=None):
+    failures = []
+    defaults = thresholds.get('default', {})
+    tolerance = tolerance if tolerance is not None else thresholds.get('max_regression', 0.25)
+    # Ignore baseline differences smaller than this; fast endpoints are dominated by noise
+    min_delta_ms = thresholds.get('min_regression_ms', 2)
+
+    # Limits for a scenario: defaults, then the scenario's own, then overrides
+    # for the database in use and for the scale
+    database_overrides = thresholds.get('databases', {}).get(results['database'], {})
+    for scale, scale_result in results['scales'].items():
+        scale_overrides = thresholds.get('scales', {}).get(scale, {})
+        for scenario, summary in scale_result['scenarios'].items():
+            limits = {
+                **defaults,
+                **thresholds.get('scenarios', {}).get(scenario, {}),
+                **database_overrides.get(scenario, {}),
+                **scale_overrides.get(scenario, {}),
+            }
+            where = f'{scale}/{scenario}'
+            if summary['errors'] > limits.get('max_errors', 0):
+                failures.append(f"{where}: {summary['errors']} requests returned an unexpected status")
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+                if metric in limits and summary[metric] > limits[metric]:
+                    failures.append(f"{where}: {metric} {summary[metric]} > {limits[metric]}")
+            if 'max_queries' in limits and summary['queries_per_request']['max'] > limits['max_queries']:
+                failures.append(f"{where}: {summary['queries_per_request']['max']} queries per request > {limits['max_queries']}")
+
+            if baseline is None:
+                continue
+            previous = baseline.get('scales', {}).get(scale, {}).get('scenarios', {}).get(scenario)
+            if previous is None:
+                continue
+            if summary['p95_ms'] > previous['p95_ms'] * (1 + tolerance) and \
+                    summary['p95_ms'] - previous['p95_ms'] > min_delta_ms:
+                failures.append(f"{where}: p95 {summary['p95_ms']} ms is more than {tolerance:.0%} "
+                                f"above the baseline {previous['p95_ms']} ms")
+            if summary['queries_per_request']['max'] > previous['queries_per_request']['max']:
+                failures.append(f"{where}: {summary['queries_per_request']['max']} queries per request, "
+                                f"baseline {previous['queries_per_request']['max']}")
+    return failures
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _parse_scale(value):
+    if value in SCALES:
+        return value, SCALES[value]
+    try:
+        users, posts = (int(part) for part in value.split(':'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"scale must be one of {', '.join(SCALES)} or USERS:POSTS")
+    return value, (users, posts)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark the API endpoints')
+    parser.add_argument('--scales', default='small,medium',
+                        help=f"comma-separated scales ({', '.join(SCALES)}) or USERS:POSTS (default: small,medium)")
+    parser.add_argument('--requests', type=int, default=200, help='measured requests per scenario (default: 200)')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per scenario (default: 5)')
+    parser.add_argument('--only', help='comma-separated scenario names to run')
+    parser.add_argument('--cache', default='null', choices=('null', 'local', 'redis'),
+                        help="cache backend; 'null' measures the database path (default: null)")
+    parser.add_argument('--bcrypt-rounds', type=int, default=Config.BCRYPT_LOG_ROUNDS,
+                        help=f'bcrypt cost (default: BCRYPT_LOG_ROUNDS, {Config.BCRYPT_LOG_ROUNDS})')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the data set (default: 42)')
+    parser.add_argument('--database-url',
+                        help='scratch database to use; its tables are DROPPED and recreated. '
+                             'Default: a temporary SQLite file per scale')
+    parser.add_argument('--thresholds', default=str(THRESHOLDS_FILE), help='thresholds file')
+    parser.add_argument('--baseline', help='results file to compare against')
+    parser.add_argument('--max-regression', type=float,
+                        help='allowed p95 increase over the baseline, as a fraction (default: from thresholds file)')
+    parser.add_argument('-o', '--output', help='results file (default: benchmarks/results/<time>-<commit>.json)')
+    options = parser.parse_args()
+    options.scales = [_parse_scale(value.strip()) for value in options.scales.split(',') if value.strip()]
+    options.only = set(options.only.split(',')) if options.only else None
+    return options
+
+
+def main():
+    options = parse_args()
+    # Keep request logging out of the measurements and the output
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {
+        'commit': _git_commit(),
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': options.database_url.split('://', 1)[0] if options.database_url else 'sqlite',
+        'cache': options.cache,
+        'bcrypt_rounds': options.bcrypt_rounds,
+        'requests': options.requests,
+        'scales': {},
+    }
+
+    for run, (name, (users, posts)) in enumerate(options.scales):
+        if options.database_url:
+            results['scales'][name] = run_scale(name, users, posts, options, options.database_url, run)
+            continue
+        scratch = tempfile.mkdtemp(prefix='artikulo-bench-')
+        try:
+            database_url = f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+            results['scales'][name] = run_scale(name, users, posts, options, database_url, run)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    output = Path(options.output) if options.output else \
+        RESULTS_DIR / f"{datetime.utcnow():%Y%m%dT%H%M%S}-{results['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    thresholds = json.loads(Path(options.thresholds).read_text()) if options.thresholds else {}
+    baseline = json.loads(Path(options.baseline).read_text()) if options.baseline else None
+    failures = check_regressions(results, thresholds, baseline, options.max_regression)
+    for failure in failures:
+        print(f"FAIL  {failure}")
+    if failures:
+        sys.exit(1)
+    print("All benchmarks within thresholds.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent))
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import select
+from sqlalchemy.orm import load_only
+
+from run_benchmarks import BenchmarkConfig, RESULTS_DIR, _git_commit, percentile, seed_database
+from app import create_app
+from app.extensions import db
+from app.json_provider import OrjsonProvider
+from app.models import Post
+from app.services.post_service import SUMMARY_COLUMNS, _summary
+
+# Serialization benchmark for large list responses.
+# Measures the three steps between the query and the bytes of a 1k-item page
+# of posts, each against the way it was done before:
+#   shape   - ORM entities shaped into dicts vs plain column rows
+#   encode  - Flask's default JSON provider vs orjson
+#   request - GET /api/posts/?limit=N end to end with each provider, with the
+#             cache off (query, shaping and encoding) and warm (encoding only)
+#
+#   python benchmarks/serialization.py
+#   python benchmarks/serialization.py --items 1000 --rounds 50
+
+PROVIDERS = {
+    'default': DefaultJSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+
+# The shaping done before rows were read as plain columns: one ORM object per post
+def _summary_from_entity(p):
+    return {
+        'id': p.id,
+        'title': p.title,
+        'excerpt': p.excerpt,
+        'author': p.user_id,
+        'image_url': p.image_url,
+        'created_at': p.created_at.isoformat() if p.created_at else None,
+        'updated_at': p.updated_at.isoformat() if p.updated_at else None
+    }
+
+
+def _shape_entities(items):
+    posts = db.session.scalars(select(Post).options(load_only(*SUMMARY_COLUMNS)).limit(items)).all()
+    result = [_summary_from_entity(p) for p in posts]
+    # A new identity map each round, as in a new request
+    db.session.expunge_all()
+    return result
+
+
+def _shape_rows(items):
+    rows = db.session.execute(select(*SUMMARY_COLUMNS).limit(items)).all()
+    return [_summary(row) for row in rows]
+
+
+# Function to time fn over a number of rounds, after a few unmeasured ones
+def measure(fn, rounds, warmup=3):
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'rounds': rounds,
+        'mean_ms': round(sum(timings) / len(timings) * 1000, 3),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+    }
+
+
+def _make_config(database_url, cache_type, provider, items):
+    return type('SerializationConfig', (BenchmarkConfig,), {
+        'SQLALCHEMY_DATABASE_URI': database_url,
+        'CACHE_TYPE': cache_type,
+        'JSON_PROVIDER': provider,
+        'POSTS_MAX_PAGE_SIZE': items,
+        'BCRYPT_LOG_ROUNDS': 4,
+    })
+
+
+# Function to measure shaping and encoding outside of a request
+def run_units(database_url, options):
+    results = {}
+    app = create_app(_make_config(database_url, 'null', 'default', options.items))
+    try:
+        with app.app_context():
+            results['shape.entities'] = measure(lambda: _shape_entities(options.items), options.rounds)
+            results['shape.rows'] = measure(lambda: _shape_rows(options.items), options.rounds)
+
+            payload = {'posts': _shape_rows(options.items)}
+            for name, provider in PROVIDERS.items():
+                encoder = provider(app)
+                results[f'encode.{name}'] = measure(lambda: encoder.response(payload).get_data(), options.rounds)
+                results[f'encode.{name}']['bytes'] = len(encoder.response(payload).get_data())
+            db.session.remove()
+    finally:
+        with app.app_context():
+            db.engine.dispose()
+        app.extensions['hasher'].shutdown()
+    return results
+
+
+# Function to measure the list endpoint through the test client
+def run_requests(database_url, options):
+    results = {}
+    path = f'/api/posts/?limit={options.items}'
+    for provider in PROVIDERS:
+        for cache_type, label in (('null', 'miss'), ('local', 'hit')):
+            app = create_app(_make_config(database_url, cache_type, provider, options.items))
+            try:
+                with app.app_context():
+                    client = app.test_client()
+
+                    def request():
+                        response = client.get(path)
+                        assert response.status_code == 200, response.status_code
+                        return response.get_data()
+
+                    results[f'request.{provider}.{label}'] = measure(request, options.rounds)
+                    db.session.remove()
+            finally:
+                with app.app_context():
+                    db.engine.dispose()
+                app.extensions['hasher'].shutdown()
+    return results
+
+
+def _speedup(results, slow, fast):
+    return round(results[slow]['p50_ms'] / results[fast]['p50_ms'], 2) if results[fast]['p50_ms'] else None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark shaping and JSON encoding of large list responses')
+    parser.add_argument('--items', type=int, default=1000, help='posts per response (default: 1000)')
+    parser.add_argument('--rounds', type=int, default=30, help='measured rounds per case (default: 30)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the data set (default: 42)')
+    parser.add_argument('-o', '--output', help='results file (default: benchmarks/results/serialization-<time>-<commit>.json)')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_url = f"sqlite:///{Path(directory) / 'serialization.db'}"
+        app = create_app(_make_config(database_url, 'null', 'default', options.items))
+        with app.app_context():
+            seed_database(max(1, options.items // 10), options.items, options.seed, 4)
+            db.session.remove()
+            db.engine.dispose()
+        app.extensions['hasher'].shutdown()
+
+        results = run_units(database_url, options)
+        results.update(run_requests(database_url, options))
+
+    for name, summary in results.items():
+        print(f"  {name:<24} p50 {summary['p50_ms']:>9.2f} ms  p95 {summary['p95_ms']:>9.2f} ms")
+    speedups = {
+        'shape': _speedup(results, 'shape.entities', 'shape.rows'),
+        'encode': _speedup(results, 'encode.default', 'encode.orjson'),
+        'request.miss': _speedup(results, 'request.default.miss', 'request.orjson.miss'),
+        'request.hit': _speedup(results, 'request.default.hit', 'request.orjson.hit'),
+    }
+    for name, factor in speedups.items():
+        print(f"  {name:<24} {factor}x faster")
+
+    output = {
+        'commit': _git_commit(),
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'items': options.items,
+        'results': results,
+        'speedups': speedups,
+    }
+    path = Path(options.output) if options.output else \
+        RESULTS_DIR / f"serialization-{datetime.utcnow():%Y%m%dT%H%M%S}-{output['commit'] or 'nogit'}.json"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(output, indent=2))
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
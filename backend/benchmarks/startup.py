@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+RESULTS_DIR = Path(__file__).parent / 'results'
+THRESHOLDS_FILE = Path(__file__).parent / 'thresholds.json'
+
+# Worker boot measurement
+# Each run starts a fresh interpreter, like a server worker without preload,
+# which imports the app, creates it and serves one request. Nothing in it may
+# need the database: the request is for an unknown path, so it goes through
+# every before/after request hook and the 404 handler only.
+PROBE = """
+import json, sys, time
+started = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+response = app.test_client().get('/__startup_probe__')
+served = time.perf_counter()
+assert response.status_code == 404, response.status_code
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'first_request_ms': (served - created) * 1000,
+    'modules': len(sys.modules),
+}))
+"""
+
+METRICS = ('import_ms', 'create_app_ms', 'first_request_ms', 'process_ms')
+
+
+# Function to compute a percentile (nearest rank) of sorted values
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _probe_env():
+    env = dict(os.environ)
+    # Plain workers: no flask CLI commands, and no log lines in the output
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    env['LOG_LEVEL'] = 'WARNING'
+    return env
+
+
+# Function to boot the app once in a new interpreter
+# process_ms is the wall time of the whole process, interpreter start and exit included
+def run_once(python):
+    started = time.perf_counter()
+    completed = subprocess.run([python, '-c', PROBE, str(BACKEND_DIR)], env=_probe_env(),
+                               capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(f"startup probe failed:\n{completed.stderr}")
+    sample = json.loads(completed.stdout.strip().splitlines()[-1])
+    sample['process_ms'] = elapsed
+    return sample
+
+
+# Function to list the packages that take the most time to import
+# Uses the interpreter's own -X importtime report, grouped by top-level package
+def import_profile(python, top):
+    completed = subprocess.run([python, '-X', 'importtime', '-c', f'import sys; sys.path.insert(0, {str(BACKEND_DIR)!r}); import app'],
+                               env=_probe_env(), capture_output=True, text=True)
+    packages = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        try:
+            self_us, _, name = line[len('import time:'):].split('|')
+            self_us = int(self_us)
+        except ValueError:
+            # Header line
+            continue
+        package = name.strip().split('.')[0]
+        packages[package] = packages.get(package, 0) + self_us
+    ranked = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [{'package': package, 'ms': round(us / 1000, 1)} for package, us in ranked]
+
+
+def summarize(samples):
+    summary = {}
+    for metric in METRICS:
+        values = sorted(sample[metric] for sample in samples)
+        summary[metric] = {
+            'p50': round(percentile(values, 50), 1),
+            'p95': round(percentile(values, 95), 1),
+            'min': round(values[0], 1),
+            'max': round(values[-1], 1),
+        }
+    summary['modules'] = samples[-1]['modules']
+    return summary
+
+
+# Function to compare median timings with the "startup" limits of the thresholds file
+def check_thresholds(summary, limits):
+    failures = []
+    for metric in METRICS:
+        limit = limits.get(metric)
+        if limit is not None and summary[metric]['p50'] > limit:
+            failures.append(f"{metric}: median {summary[metric]['p50']} > {limit}")
+    # Deterministic, unlike the timings: catches a heavy import added to the boot path
+    if 'max_modules' in limits and summary['modules'] > limits['max_modules']:
+        failures.append(f"modules: {summary['modules']} loaded > {limits['max_modules']}")
+    return failures
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure how long a worker takes to boot and serve its first request')
+    parser.add_argument('--runs', type=int, default=10, help='fresh interpreters to start (default: 10)')
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured runs, to fill the OS file cache (default: 1)')
+    parser.add_argument('--python', default=sys.executable, help='interpreter to measure (default: this one)')
+    parser.add_argument('--import-profile', type=int, default=10, metavar='N',
+                        help='show the N slowest packages to import; 0 to skip (default: 10)')
+    parser.add_argument('--thresholds', default=str(THRESHOLDS_FILE), help='thresholds file')
+    parser.add_argument('-o', '--output', help='results file (default: benchmarks/results/startup-<time>-<commit>.json)')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+
+    for _ in range(options.warmup):
+        run_once(options.python)
+    samples = [run_once(options.python) for _ in range(options.runs)]
+    summary = summarize(samples)
+
+    print(f"{'':18} {'p50':>8} {'p95':>8} {'min':>8} {'max':>8}")
+    for metric in METRICS:
+        row = summary[metric]
+        print(f"{metric:18} {row['p50']:8.1f} {row['p95']:8.1f} {row['min']:8.1f} {row['max']:8.1f}")
+    print(f"{summary['modules']} modules loaded")
+
+    results = {
+        'commit': _git_commit(),
+        'created_at': datetime.utcnow().isoformat() + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': options.runs,
+        'startup': summary,
+    }
+    if options.import_profile:
+        results['import_profile'] = import_profile(options.python, options.import_profile)
+        print("Slowest imports:")
+        for entry in results['import_profile']:
+            print(f"  {entry['package']:30} {entry['ms']:8.1f} ms")
+
+    output = Path(options.output) if options.output else \
+        RESULTS_DIR / f"startup-{datetime.utcnow():%Y%m%dT%H%M%S}-{results['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+    thresholds = json.loads(Path(options.thresholds).read_text()) if options.thresholds else {}
+    failures = check_thresholds(summary, thresholds.get('startup', {}))
+    for failure in failures:
+        print(f"FAIL  {failure}")
+    if failures:
+        sys.exit(1)
+    print("Startup within thresholds.")
+
+
+if __name__ == "__main__":
+    main()
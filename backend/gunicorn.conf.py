@@ -0,0 +1,23 @@
+# Gunicorn settings, picked up automatically when starting from this directory:
+#   gunicorn main:app
+# Every setting can still be overridden on the command line.
+
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', '1'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+
+# Import the app once in the master and fork the workers from it, so each
+# worker starts without importing the app again. The app drops the database
+# connections and restarts its logging thread in every forked worker (see
+# create_app and app/logging_config.py). Set GUNICORN_PRELOAD=false to have
+# each worker import the app itself instead.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Logs go through the app's logging pipeline; only errors from gunicorn itself
+# are written by gunicorn
+accesslog = None
+errorlog = '-'
@@ -2,12 +2,7 @@ import os
 import logging
 from app import create_app
 
-# logging configuration provides information about server startup and database connection status
-# Needed for debugging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logging is configured by create_app (LOG_LEVEL, LOG_FORMAT; see app/logging_config.py)
 logger = logging.getLogger(__name__)
 
 app = create_app()
@@ -17,10 +12,9 @@ if __name__ == '__main__':
     host = os.environ.get('HOST', '0.0.0.0')
     debug = os.environ.get('FLASK_ENV') == 'development'
 
-    logger.info(f"Starting server on {host}:{port} with debug={debug}")
-    logger.info(f"PostgreSQL database connection configured")
+    logger.info("Starting server on %s:%s with debug=%s", host, port, debug)
 
     try:
         app.run(debug=debug, host=host, port=port)
     except Exception as e:
-        logger.error(f"Error starting server: {e}")
+        logger.error("Error starting server: %s", e)
@@ -1,2 +0,0 @@
-# TODO: Migration using flask migrate (built on top of Alembic) with SQLAlchemy
-
@@ -0,0 +1,53 @@
+"""indexes for the post listings: (created_at, id) and (user_id, created_at, id)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 09:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.schema import drop_invalid_index
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# Both listings page on (created_at DESC, id DESC); the author listing filters
+# on user_id first. Without these, each page is a sequential scan plus a sort.
+INDEXES = [
+    ('ix_post_created_at_id', [sa.text('created_at DESC'), sa.text('id DESC')]),
+    ('ix_post_user_id_created_at_id', ['user_id', sa.text('created_at DESC'), sa.text('id DESC')]),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    existing = {index['name'] for index in sa.inspect(bind).get_indexes('post')}
+
+    if bind.dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY does not block writes, but cannot run
+        # inside a transaction. An earlier run that failed part way leaves an
+        # invalid index, which is dropped and built again
+        with op.get_context().autocommit_block():
+            for name, columns in INDEXES:
+                if name not in existing or drop_invalid_index(bind, name):
+                    op.create_index(name, 'post', columns, postgresql_concurrently=True)
+    else:
+        for name, columns in INDEXES:
+            if name not in existing:
+                op.create_index(name, 'post', columns)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            for name, _ in reversed(INDEXES):
+                op.drop_index(name, table_name='post', postgresql_concurrently=True)
+    else:
+        for name, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='post')
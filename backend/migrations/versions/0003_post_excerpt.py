@@ -0,0 +1,29 @@
+"""post.excerpt column for listings
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 09:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('post')}
+    if 'excerpt' not in columns:
+        op.add_column('post', sa.Column('excerpt', sa.String(length=300), nullable=True))
+    # Existing rows are filled by scripts/backfill_excerpts.py, in batches and
+    # outside of the migration transaction
+
+
+def downgrade():
+    with op.batch_alter_table('post') as batch_op:
+        batch_op.drop_column('excerpt')
@@ -0,0 +1,72 @@
+"""full-text search: tsvector column and GIN index (PostgreSQL), FTS5 table (SQLite)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.schema import drop_invalid_index
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        # Adding a stored generated column rewrites the table once; the index
+        # is then built without blocking writes (again, if an earlier run left
+        # it invalid)
+        op.execute("""
+            ALTER TABLE post ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(content, '')), 'B')
+            ) STORED
+        """)
+        with op.get_context().autocommit_block():
+            drop_invalid_index(bind, 'ix_post_search_vector')
+            op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_post_search_vector ON post USING GIN (search_vector)")
+
+    elif bind.dialect.name == 'sqlite':
+        if sa.inspect(bind).has_table('post_fts'):
+            return
+        op.execute("CREATE VIRTUAL TABLE post_fts USING fts5(title, content, content='post', content_rowid='id')")
+        op.execute("""
+            CREATE TRIGGER post_fts_ai AFTER INSERT ON post BEGIN
+                INSERT INTO post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER post_fts_ad AFTER DELETE ON post BEGIN
+                INSERT INTO post_fts(post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+            END
+        """)
+        op.execute("""
+            CREATE TRIGGER post_fts_au AFTER UPDATE OF title, content ON post BEGIN
+                INSERT INTO post_fts(post_fts, rowid, title, content) VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END
+        """)
+        op.execute("INSERT INTO post_fts(post_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    if bind.dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_post_search_vector")
+        op.execute("ALTER TABLE post DROP COLUMN IF EXISTS search_vector")
+
+    elif bind.dialect.name == 'sqlite':
+        for trigger in ('post_fts_ai', 'post_fts_ad', 'post_fts_au'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS post_fts")
@@ -0,0 +1,41 @@
+"""token_blocklist table for revoked tokens
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('token_blocklist'):
+        return
+    op.create_table(
+        'token_blocklist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(length=36), nullable=False),
+        sa.Column('token_type', sa.String(length=16), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('revoked_at', sa.DateTime(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('jti')
+    )
+    op.create_index(op.f('ix_token_blocklist_revoked_at'), 'token_blocklist', ['revoked_at'], unique=False)
+    op.create_index(op.f('ix_token_blocklist_expires_at'), 'token_blocklist', ['expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_token_blocklist_expires_at'), table_name='token_blocklist')
+    op.drop_index(op.f('ix_token_blocklist_revoked_at'), table_name='token_blocklist')
+    op.drop_table('token_blocklist')
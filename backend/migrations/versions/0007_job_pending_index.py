@@ -0,0 +1,45 @@
+"""partial index on pending jobs for the queue depth metrics
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.schema import drop_invalid_index
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# /metrics counts queued and running jobs on every scrape; finished jobs stay
+# in the table for JOBS_RETENTION_SECONDS and must not be read for it
+NAME = 'ix_job_pending'
+COLUMNS = ['queue', 'task', 'status', 'run_at']
+PENDING = sa.text("status IN ('queued', 'running')")
+
+
+def upgrade():
+    bind = op.get_bind()
+    exists = NAME in {index['name'] for index in sa.inspect(bind).get_indexes('job')}
+
+    if bind.dialect.name == 'postgresql':
+        # CREATE INDEX CONCURRENTLY does not block enqueues, but cannot run
+        # inside a transaction. An invalid index left by a failed run is rebuilt
+        with op.get_context().autocommit_block():
+            if not exists or drop_invalid_index(bind, NAME):
+                op.create_index(NAME, 'job', COLUMNS, postgresql_where=PENDING, postgresql_concurrently=True)
+    elif not exists:
+        op.create_index(NAME, 'job', COLUMNS, sqlite_where=PENDING)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        with op.get_context().autocommit_block():
+            op.drop_index(NAME, table_name='job', postgresql_concurrently=True)
+    else:
+        op.drop_index(NAME, table_name='job')
@@ -0,0 +1,63 @@
+import sys
+from pathlib import Path
+from sqlalchemy import inspect, text
+
+# Add the parent directory to sys.path to import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import create_app
+from app.extensions import db
+from app.models import Post
+from app.services.post_service import make_excerpt
+
+BATCH_SIZE = 1000
+
+
+def add_excerpt_column():
+    """Add the post.excerpt column to databases created before it existed"""
+    columns = [column['name'] for column in inspect(db.engine).get_columns('post')]
+    if 'excerpt' in columns:
+        print("Column post.excerpt already exists.")
+        return
+    with db.engine.begin() as conn:
+        conn.execute(text('ALTER TABLE post ADD COLUMN excerpt VARCHAR(300)'))
+    print("Added column post.excerpt")
+
+
+def backfill_excerpts(batch_size=BATCH_SIZE):
+    """Compute excerpts for posts that do not have one, in batches ordered by id"""
+    last_id = 0
+    updated = 0
+    while True:
+        rows = (db.session.query(Post.id, Post.content)
+                .filter(Post.excerpt.is_(None), Post.id > last_id)
+                .order_by(Post.id)
+                .limit(batch_size)
+                .all())
+        if not rows:
+            break
+        db.session.execute(
+            Post.__table__.update()
+            .where(Post.__table__.c.id == db.bindparam('post_id'))
+            # updated_at is set to itself so its onupdate default does not
+            # touch every post (that would change every post's validators)
+            .values(excerpt=db.bindparam('excerpt'), updated_at=Post.__table__.c.updated_at),
+            [{'post_id': row.id, 'excerpt': make_excerpt(row.content)} for row in rows]
+        )
+        db.session.commit()
+        last_id = rows[-1].id
+        updated += len(rows)
+        print(f"Backfilled {updated} posts...")
+    return updated
+
+
+if __name__ == "__main__":
+    try:
+        app = create_app()
+        with app.app_context():
+            add_excerpt_column()
+            total = backfill_excerpts()
+        print(f"Excerpt backfill completed successfully! ({total} posts updated)")
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
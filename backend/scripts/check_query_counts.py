@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+
+# Add the parent directory to sys.path to import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import create_app
+from app.config import Config
+from app.extensions import db
+from app.models import User, Post
+from app.schema import create_schema
+from app.query_counter import assert_num_queries, QueryCountMismatch
+from app.services.post_service import get_posts, get_post_by_id, get_posts_by_user_id, get_post_validators
+from app.services.auth_service import get_user_by_id
+
+# Number of SQL statements each read service function is allowed to run.
+# These must not grow with the number of rows returned.
+QUERY_BUDGETS = [
+    ('get_posts', lambda ids: get_posts(limit=50), 1),
+    ('get_post_by_id', lambda ids: get_post_by_id(ids['post']), 1),
+    ('get_posts_by_user_id', lambda ids: get_posts_by_user_id(ids['user'], limit=50), 1),
+    ('get_user_by_id', lambda ids: get_user_by_id(ids['user']), 1),
+    ('get_post_validators', lambda ids: get_post_validators(ids['post']), 1),
+]
+
+
+class QueryCountConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    TESTING = True
+    # Measure the database, not the cache
+    CACHE_TYPE = 'null'
+
+
+def seed(users=3, posts_per_user=10):
+    """Insert a small data set so listings return many rows"""
+    user_ids = []
+    for i in range(users):
+        user = User(username=f'user{i}', email=f'user{i}@example.com', password='x')
+        db.session.add(user)
+        db.session.flush()
+        user_ids.append(user.id)
+        for j in range(posts_per_user):
+            db.session.add(Post(title=f'Post {j} by user{i}', content='Lorem ipsum ' * 20, user_id=user.id))
+    db.session.commit()
+    return {'user': user_ids[0], 'post': Post.query.first().id}
+
+
+def check_query_counts():
+    """Run each read service function and compare its query count to the budget"""
+    app = create_app(QueryCountConfig)
+    failures = 0
+    with app.app_context():
+        create_schema()
+        ids = seed()
+        for name, call, budget in QUERY_BUDGETS:
+            # Start from an empty identity map so nothing is served from the session
+            db.session.expire_all()
+            try:
+                with assert_num_queries(budget):
+                    result, status_code = call(ids)
+                if status_code != 200:
+                    raise QueryCountMismatch(f'returned status {status_code}: {result}')
+                print(f"OK    {name}: {budget} queries")
+            except QueryCountMismatch as e:
+                failures += 1
+                print(f"FAIL  {name}: {e}")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if check_query_counts() else 0)
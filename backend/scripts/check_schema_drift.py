@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import upgrade
+
+# Add the parent directory to sys.path to import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+from app import create_app, init_migrate
+from app.config import Config
+from app.extensions import db
+from app.schema import include_object
+
+
+def check_schema_drift(database_url):
+    """Upgrade the database to the latest migration and compare it with the models"""
+
+    class DriftConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        CACHE_TYPE = 'null'
+
+    app = create_app(DriftConfig)
+    init_migrate(app)
+    with app.app_context():
+        upgrade()
+        with db.engine.connect() as conn:
+            context = MigrationContext.configure(conn, opts={
+                'compare_type': True,
+                'include_object': include_object,
+            })
+            return compare_metadata(context, db.metadata)
+
+
+if __name__ == "__main__":
+    # Default to a scratch SQLite database; pass DATABASE_URL to check a real server
+    database_url = os.getenv('DATABASE_URL')
+    scratch = None
+    if not database_url:
+        scratch = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+        scratch.close()
+        database_url = f"sqlite:///{scratch.name}"
+
+    try:
+        differences = check_schema_drift(database_url)
+    finally:
+        if scratch:
+            os.unlink(scratch.name)
+
+    if differences:
+        print("Models and migrations have drifted apart:")
+        for difference in differences:
+            print(f"  {difference}")
+        print("Generate a migration with: flask --app main db migrate -m \"<message>\"")
+        sys.exit(1)
+    print("Models and migrations are in sync.")
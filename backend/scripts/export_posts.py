@@ -0,0 +1,61 @@
+import argparse
+import contextlib
+import sys
+from pathlib import Path
+
+# Add the parent directory to sys.path to import from app
+sys.path.append(str(Path(__file__).parent.parent))
+
+# The export may be written to stdout, so anything printed while the app is
+# imported and set up goes to stderr instead; the log handler created by
+# create_app keeps writing to stderr afterwards
+with contextlib.redirect_stdout(sys.stderr):
+    from app import create_app
+    from app.services.export_service import export_posts, parse_export_args, ExportError, FORMATS
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Stream posts to NDJSON or CSV')
+    parser.add_argument('--format', choices=FORMATS, default='ndjson', help='output format (default: ndjson)')
+    parser.add_argument('--author', help='only export posts by this user ID')
+    parser.add_argument('--since', help='only posts created at or after this ISO 8601 timestamp')
+    parser.add_argument('--until', help='only posts created before this ISO 8601 timestamp')
+    parser.add_argument('--gzip', action='store_true', help='gzip the output')
+    parser.add_argument('-o', '--output', help='file to write to (default: stdout)')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+    query = {key: value for key, value in (
+        ('format', options.format),
+        ('author', options.author),
+        ('since', options.since),
+        ('until', options.until),
+    ) if value is not None}
+    if options.gzip:
+        query['gzip'] = 'true'
+
+    try:
+        args = parse_export_args(query)
+    except ExportError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(2)
+
+    with contextlib.redirect_stdout(sys.stderr):
+        app = create_app()
+    with app.app_context():
+        if options.output:
+            mode = 'wb' if args['compress'] else 'w'
+            with open(options.output, mode, **({} if args['compress'] else {'encoding': 'utf-8', 'newline': ''})) as out:
+                for chunk in export_posts(**args):
+                    out.write(chunk)
+        else:
+            out = sys.stdout.buffer if args['compress'] else sys.stdout
+            for chunk in export_posts(**args):
+                out.write(chunk)
+            out.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -46,45 +46,17 @@ def create_database():
     conn.close()
 
 def create_tables():
-    """Create the necessary tables in the database"""
-    # Connect to our application database
-    conn = psycopg2.connect(
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME
-    )
-    conn.autocommit = True
-    cursor = conn.cursor()
-
-    # Create users table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS "user" (
-        id SERIAL PRIMARY KEY,
-        username VARCHAR(80) UNIQUE NOT NULL,
-        email VARCHAR(120) UNIQUE NOT NULL,
-        password VARCHAR(255) NOT NULL,
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
+    """Create or upgrade the tables by applying all pending migrations"""
+    # Imported here so the database exists before the app connects to it
+    from flask_migrate import upgrade
+    from app import create_app, init_migrate
 
-    # Create posts table
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS post (
-        id SERIAL PRIMARY KEY,
-        title VARCHAR(100) NOT NULL,
-        content TEXT NOT NULL,
-        image_url VARCHAR(255),
-        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        user_id INTEGER REFERENCES "user"(id) NOT NULL
-    )
-    ''')
+    app = create_app()
+    init_migrate(app)
+    with app.app_context():
+        upgrade()
 
     print("Tables created successfully!")
-    cursor.close()
-    conn.close()
 
 if __name__ == "__main__":
     try:
@@ -1,94 +1,235 @@
-import os
+import argparse
+import csv
+import io
+import itertools
+import math
+import random
 import sys
-import psycopg2
-from dotenv import load_dotenv
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
-from flask_bcrypt import Bcrypt
+
+import bcrypt
+from sqlalchemy import create_engine, func, insert, select, text
 
 # Add the parent directory to sys.path to import from app
 sys.path.append(str(Path(__file__).parent.parent))
 
-# Load environment variables
-load_dotenv()
-
-# Initialize Bcrypt
-bcrypt = Bcrypt()
-
-# Database connection parameters
-DB_USER = os.getenv('DB_USER', 'postgres')
-DB_PASSWORD = os.getenv('DB_PASSWORD', '')
-DB_HOST = os.getenv('DB_HOST', 'localhost')
-DB_PORT = os.getenv('DB_PORT', '5432')
-DB_NAME = os.getenv('DB_NAME', 'blog_site')
-
-def seed_data():
-    """Seed the database with initial test data"""
-    # Connect to our application database
-    conn = psycopg2.connect(
-        user=DB_USER,
-        password=DB_PASSWORD,
-        host=DB_HOST,
-        port=DB_PORT,
-        database=DB_NAME
-    )
-    conn.autocommit = True
-    cursor = conn.cursor()
-    
-    # Check if users already exist
-    cursor.execute("SELECT COUNT(*) FROM \"user\"")
-    user_count = cursor.fetchone()[0]
-    
-    if user_count == 0:
-        # Create test users
-        test_users = [
-            ('admin', 'admin@example.com', bcrypt.generate_password_hash('admin123').decode('utf-8')),
-            ('testuser', 'test@example.com', bcrypt.generate_password_hash('test123').decode('utf-8')),
-            ('johndoe', 'john@example.com', bcrypt.generate_password_hash('john123').decode('utf-8'))
-        ]
-        
-        for username, email, password in test_users:
-            cursor.execute(
-                'INSERT INTO "user" (username, email, password) VALUES (%s, %s, %s) RETURNING id',
-                (username, email, password)
-            )
-            print(f"Created user: {username}")
-    else:
-        print(f"Users already exist, skipping user creation.")
-    
-    # Check if posts already exist
-    cursor.execute("SELECT COUNT(*) FROM post")
-    post_count = cursor.fetchone()[0]
-    
-    if post_count == 0:
-        # Get user IDs
-        cursor.execute('SELECT id FROM "user" LIMIT 3')
-        user_ids = [row[0] for row in cursor.fetchall()]
-        
-        # Create test posts
-        test_posts = [
-            ('Getting Started with Flask', 'Flask is a lightweight WSGI web application framework in Python. It is designed to make getting started quick and easy, with the ability to scale up to complex applications.', None, user_ids[0]),
-            ('PostgreSQL Best Practices', 'PostgreSQL is a powerful, open source object-relational database system with over 30 years of active development that has earned it a strong reputation for reliability, feature robustness, and performance.', None, user_ids[0]),
-            ('Web Development in 2025', 'The landscape of web development continues to evolve rapidly. This post explores the latest trends and technologies that are shaping the future of web development.', None, user_ids[1]),
-            ('Building RESTful APIs', 'REST APIs provide a flexible, lightweight way to integrate applications and have emerged as the most common method for connecting components in microservices architectures.', None, user_ids[1]),
-            ('User Authentication Best Practices', 'Implementing secure user authentication is critical for protecting user data and preventing unauthorized access to your application.', None, user_ids[2])
-        ]
-        
-        for title, content, image_url, user_id in test_posts:
-            cursor.execute(
-                'INSERT INTO post (title, content, image_url, user_id) VALUES (%s, %s, %s, %s)',
-                (title, content, image_url, user_id)
-            )
-            print(f"Created post: {title}")
-    else:
-        print(f"Posts already exist, skipping post creation.")
-    
-    cursor.close()
-    conn.close()
-    print("Seed data added successfully!")
+from app.config import Config
+from app.models import User, Post
+from app.services.post_service import make_excerpt, EXCERPT_LENGTH
+
+# Synthetic data generator for local load testing.
+# Users and posts are produced lazily by the generate_* functions below, so
+# millions of rows never sit in memory, and are loaded in batches: COPY on
+# PostgreSQL, multi-row INSERTs elsewhere. The same --seed (and --end) always
+# produces the same data.
+#
+#   python scripts/seed_data.py                          # small demo data set
+#   python scripts/seed_data.py --users 100000 --posts 5000000 --seed 7
+
+DEFAULT_PASSWORD = 'password123'
+
+WORDS = (
+    'the of and to in is that for it as with was on be by this are or from at which but not have an they '
+    'you were all one their has there been if more when will would who so no data system time user post '
+    'code design team product build test api server query index cache page web app model request response '
+    'performance latency database table column row python flask postgres deploy release feature bug fix '
+    'review change service client network memory disk thread process worker queue job batch stream file '
+    'image content author reader blog story idea plan week year day people work project note guide start '
+    'simple fast slow large small better best first last new old good great real local remote open secure'
+).split()
+
+# Median post is about 250 words; the long tail reaches several thousand
+CONTENT_WORDS_MU = math.log(250)
+CONTENT_WORDS_SIGMA = 0.9
+MIN_CONTENT_WORDS = 20
+MAX_CONTENT_WORDS = 8000
+PARAGRAPH_WORDS = 60
+
+# Posts per author follow a Zipf-like law: author k writes ~ 1 / k**s of the posts
+AUTHOR_ZIPF_S = 1.1
+
+IMAGE_RATIO = 0.3
+EDITED_RATIO = 0.1
+
+
+# Function to precompute one password hash shared by every generated user
+# Hashing once instead of per user keeps seeding fast at any cost setting
+def make_password_hash(password=DEFAULT_PASSWORD, rounds=None):
+    rounds = rounds or Config.BCRYPT_LOG_ROUNDS
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds, prefix=b'2b')).decode('utf-8')
+
+
+# Function to generate user rows; `start` keeps usernames unique across runs
+def generate_users(count, password_hash, rng, start=1, end=None):
+    end = end or datetime.utcnow()
+    for n in range(start, start + count):
+        yield {
+            'username': f'user{n}',
+            'email': f'user{n}@example.com',
+            'password': password_hash,
+            'created_at': end - timedelta(seconds=rng.randrange(3 * 365 * 24 * 3600)),
+        }
+
+
+def _sentence_case(words):
+    return ' '.join(words).capitalize()
+
+
+# Function to generate post content with a lognormal length in words
+def generate_content(rng):
+    length = int(rng.lognormvariate(CONTENT_WORDS_MU, CONTENT_WORDS_SIGMA))
+    length = min(max(length, MIN_CONTENT_WORDS), MAX_CONTENT_WORDS)
+    words = rng.choices(WORDS, k=length)
+    paragraphs = [_sentence_case(words[i:i + PARAGRAPH_WORDS]) + '.' for i in range(0, length, PARAGRAPH_WORDS)]
+    return '\n\n'.join(paragraphs)
+
+
+def generate_title(rng):
+    return _sentence_case(rng.choices(WORDS, k=rng.randint(3, 10)))[:100]
+
+
+# Function to build a sampler that picks authors with a Zipf-like skew
+# Which users are prolific is shuffled, so it does not follow user ids
+def make_author_sampler(user_ids, rng, s=AUTHOR_ZIPF_S):
+    ranked = list(user_ids)
+    rng.shuffle(ranked)
+    cum_weights = list(itertools.accumulate(1.0 / (rank ** s) for rank in range(1, len(ranked) + 1)))
+
+    def sample(k):
+        return rng.choices(ranked, cum_weights=cum_weights, k=k)
+    return sample
+
+
+# Function to generate post rows spread over `days` days up to `end`
+# Timestamps increase with insertion order (with jitter), like real traffic,
+# so ids and created_at stay roughly correlated
+def generate_posts(count, user_ids, rng, days=730, end=None, chunk=1000):
+    if not user_ids:
+        raise ValueError('Posts need at least one user')
+    end = end or datetime.utcnow()
+    start = end - timedelta(days=days)
+    step = (end - start).total_seconds() / max(count, 1)
+    sample_authors = make_author_sampler(user_ids, rng)
+
+    for offset in range(0, count, chunk):
+        authors = sample_authors(min(chunk, count - offset))
+        for i, user_id in enumerate(authors, offset):
+            created_at = start + timedelta(seconds=step * i + rng.random() * step)
+            updated_at = created_at
+            if rng.random() < EDITED_RATIO:
+                updated_at = min(created_at + timedelta(seconds=rng.randrange(30 * 24 * 3600)), end)
+            content = generate_content(rng)
+            yield {
+                'title': generate_title(rng),
+                'content': content,
+                # Generated text has no whitespace runs longer than two, so this
+                # prefix yields the same excerpt without scanning the whole post
+                'excerpt': make_excerpt(content[:2 * EXCERPT_LENGTH + 2]),
+                'image_url': f'https://picsum.photos/seed/{i}/800/400' if rng.random() < IMAGE_RATIO else None,
+                'created_at': created_at,
+                'updated_at': updated_at,
+                'user_id': user_id,
+            }
+
+
+# Function to COPY a batch of row dicts into a table (PostgreSQL)
+def _copy_batch(engine, table, columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([row[column] for column in columns])
+    buffer.seek(0)
+
+    target = engine.dialect.identifier_preparer.format_table(table)
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            # An unquoted empty CSV field is NULL
+            cursor.copy_expert(f"COPY {target} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def _insert_batch(engine, table, columns, rows):
+    with engine.begin() as conn:
+        conn.execute(insert(table), rows)
+
+
+# Function to load rows in batches, reporting progress
+def load_rows(engine, table, rows, batch_size, label):
+    load_batch = _copy_batch if engine.dialect.name == 'postgresql' else _insert_batch
+    columns = None
+    loaded = 0
+    started = time.perf_counter()
+    while True:
+        batch = list(itertools.islice(rows, batch_size))
+        if not batch:
+            break
+        columns = columns or list(batch[0])
+        load_batch(engine, table, columns, batch)
+        loaded += len(batch)
+        elapsed = time.perf_counter() - started
+        print(f"Loaded {loaded} {label} ({loaded / elapsed:.0f} rows/s)")
+    return loaded
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed the database with synthetic users and posts')
+    parser.add_argument('--users', type=int, default=3, help='users to create (default: 3)')
+    parser.add_argument('--posts', type=int, default=20, help='posts to create (default: 20)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed (default: 42)')
+    parser.add_argument('--batch-size', type=int, default=10000, help='rows per COPY/INSERT batch (default: 10000)')
+    parser.add_argument('--days', type=int, default=730, help='spread posts over this many days (default: 730)')
+    parser.add_argument('--end', type=datetime.fromisoformat,
+                        help='timestamp of the newest post, ISO 8601 (default: today 00:00 UTC)')
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help=f'password of every user (default: {DEFAULT_PASSWORD})')
+    parser.add_argument('--append', action='store_true', help='add data even if the database already has users')
+    parser.add_argument('--database-url', default=Config.SQLALCHEMY_DATABASE_URI,
+                        help='database to seed (default: from DB_* environment variables)')
+    return parser.parse_args()
+
+
+def seed_data(options):
+    """Seed the database with generated users and posts"""
+    rng = random.Random(options.seed)
+    end = options.end or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    engine = create_engine(options.database_url)
+
+    try:
+        with engine.connect() as conn:
+            existing_users = conn.execute(select(func.count()).select_from(User.__table__)).scalar()
+            last_user_id = conn.execute(select(func.max(User.id))).scalar() or 0
+        if existing_users and not options.append:
+            print(f"Database already has {existing_users} users, skipping (use --append to add more).")
+            return
+
+        if options.users:
+            password_hash = make_password_hash(options.password)
+            users = generate_users(options.users, password_hash, rng, start=last_user_id + 1, end=end)
+            load_rows(engine, User.__table__, users, options.batch_size, 'users')
+
+        if options.posts:
+            with engine.connect() as conn:
+                user_ids = conn.execute(select(User.id).order_by(User.id)).scalars().all()
+            posts = generate_posts(options.posts, user_ids, rng, days=options.days, end=end)
+            load_rows(engine, Post.__table__, posts, options.batch_size, 'posts')
+
+        if engine.dialect.name == 'postgresql':
+            # Refresh planner statistics after the bulk load
+            with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+                conn.execute(text('ANALYZE "user", post'))
+    finally:
+        engine.dispose()
+
+    print(f"Seed data added successfully! Every user's password is '{options.password}'.")
+
 
 if __name__ == "__main__":
     try:
-        seed_data()
+        seed_data(parse_args())
         print("Database seeding completed successfully!")
     except Exception as e:
         print(f"Error: {e}")
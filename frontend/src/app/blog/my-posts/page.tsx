@@ -28,7 +28,7 @@ import { toast } from 'sonner';
 interface Post {
   id: number;
   title: string;
-  content: string;
+  excerpt: string | null;
   author_id: number;
   author_name: string;
   image_url?: string;
@@ -206,7 +206,7 @@ export default function MyPostsPage() {
 
               <CardContent className="pt-2">
                 <div className="text-gray-600 dark:text-gray-300 mb-4">
-                  {truncateContent(post.content)}
+                  {truncateContent(post.excerpt || '')}
                 </div>
 
                 {post.image_url && (
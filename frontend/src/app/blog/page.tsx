@@ -11,7 +11,7 @@ import { BookmarkIcon, MoreHorizontal, ThumbsDown } from "lucide-react";
 interface Post {
   id: number;
   title: string;
-  content: string;
+  excerpt: string | null;
   image_url: string;
   created_at: string;
   updated_at: string;
@@ -28,7 +28,7 @@ export default function BlogPage() {
       .then((res) => res.json())
       .then((data) => {
         console.log("Posts data:", data);
-        setPosts(data);
+        setPosts(data.posts || []);
       })
       .catch((error) => console.error("Error fetching posts:", error));
   }, []);
@@ -76,7 +76,7 @@ export default function BlogPage() {
 
               {/* Description */}
               <p className="text-xs text-muted-foreground dark:text-gray-300 flex-1 line-clamp-3">
-                {post.content}
+                {post.excerpt}
               </p>
             </CardContent>
 